@@ -0,0 +1,130 @@
+"""
+Punto de entrada ASGI: `uvicorn asgi:app` (SERVIDOR_MODO=asgi en el Dockerfile).
+
+Todas las rutas las atiende la app Flask de servidor.py a través de
+asgiref.wsgi.WsgiToAsgi, así los dos modos responden exactamente lo mismo.
+Cada pedido corre en su propio hilo (un ThreadSensitiveContext por pedido),
+con hasta ASGI_HILOS pedidos a la vez por proceso: un upstream lento ocupa un
+hilo y no el proceso entero. Los correos (outbox) y los borrados en Cloudinary
+ya van por sus propios hilos, y las subidas usan el pool de subida_imagenes.
+
+Lo único propio de este modo es GET /api/stream/stock (SSE), que corre en el
+event loop, una tarea por cliente: Flask responde el pedido (cabeceras, CORS,
+métricas) con un 204 y acá se reemplaza por el stream.
+"""
+import asyncio
+import contextvars
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+import servidor
+
+ASGI_HILOS = int(os.getenv("ASGI_HILOS", "64"))
+
+flask_asgi = WsgiToAsgi(servidor.app)
+_hilos = asyncio.Semaphore(ASGI_HILOS)
+
+
+async def _flask(scope, receive, send):
+    contexto = contextvars.copy_context()
+
+    async def enviar(mensaje):
+        # WsgiToAsgi llama a `send` desde el hilo de Flask (AsyncToSync) con el
+        # contexto de ese hilo, y uvicorn registra ahí los callbacks de la
+        # conexión: el próximo pedido heredaría un executor de asgiref ya
+        # cerrado. Se envía con el contexto original del pedido.
+        return await contexto.run(asyncio.ensure_future, send(mensaje))
+
+    # Sin un ThreadSensitiveContext propio, asgiref corre todos los pedidos
+    # WSGI en un único hilo compartido.
+    async with _hilos:
+        async with ThreadSensitiveContext():
+            await flask_asgi(scope, receive, enviar)
+
+
+# --- STOCK EN VIVO ---
+
+def _sin_cuerpo(cabeceras):
+    """Cabeceras de la respuesta de Flask que siguen valiendo para el stream."""
+    return [(nombre, valor) for nombre, valor in cabeceras
+            if nombre.lower() not in (b'content-length', b'content-type')]
+
+
+async def _stream_stock(scope, receive, send):
+    """GET /api/stream/stock en el event loop: una tarea por cliente en lugar de un hilo."""
+    inicio = {}
+
+    async def capturar(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            inicio.update(mensaje)
+        if inicio['status'] != 204:
+            await send(mensaje)
+
+    await _flask(scope, receive, capturar)
+    if inicio['status'] != 204:
+        return  # Flask no atendió el pedido (p. ej. un error); ya se reenvió su respuesta
+
+    difusor = servidor.difusor_stock
+    cabeceras = _sin_cuerpo(inicio['headers'])
+    if not difusor.entrar(servidor.STOCK_STREAM_MAX_CLIENTES):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': cabeceras + [(b'content-type', b'text/event-stream')]})
+        await send({'type': 'http.response.body',
+                    'body': f"retry: {int(servidor.STOCK_STREAM_REINTENTO * 1000)}\n\n".encode()})
+        return
+    try:
+        try:
+            # Fija el estado inicial del difusor; si la caché venció, la recarga corre en un hilo.
+            servidor.cache_catalogo.vigente() or await asyncio.to_thread(servidor.cache_catalogo.obtener)
+        except Exception as e:
+            print(f"Error al consultar productos en Supabase: {e}")
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cabeceras + [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+        ]})
+        ultimo_id = dict(scope['headers']).get(b'last-event-id', b'').decode('latin-1')
+
+        async def transmitir():
+            async for evento in difusor.flujo_async(ultimo_id):
+                await send({'type': 'http.response.body', 'body': evento, 'more_body': True})
+
+        async def esperar_desconexion():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tareas = [asyncio.ensure_future(transmitir()), asyncio.ensure_future(esperar_desconexion())]
+        try:
+            await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+    finally:
+        difusor.salir()
+
+
+# --- APLICACIÓN ---
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensaje['type'] == 'lifespan.shutdown':
+            if servidor.suscripcion_stock is not None:
+                servidor.suscripcion_stock.detener()
+            servidor.outbox.detener()
+            servidor.limpieza_cloudinary.detener()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/api/stream/stock':
+        await _stream_stock(scope, receive, send)
+        return
+    await _flask(scope, receive, send)
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+# Algoritmos que Supabase usa para firmar los access tokens: HS256 con el
+# "JWT secret" del proyecto, o claves asimétricas publicadas en el JWKS.
+ALGORITMOS_ASIMETRICOS = ['RS256', 'ES256', 'EdDSA']
+
+
+class VerificadorJWT:
+    """
+    Valida localmente los access tokens emitidos por Supabase Auth.
+
+    Los tokens HS256 se validan con `secreto` (SUPABASE_JWT_SECRET). Los
+    firmados con claves asimétricas se validan contra el JWKS del proyecto,
+    que PyJWKClient descarga una vez y mantiene en memoria.
+    """
+
+    def __init__(self, supabase_url, secreto=None, audiencia='authenticated'):
+        self._secreto = secreto
+        self._audiencia = audiencia
+        # Supabase Auth firma con `iss` = <SUPABASE_URL>/auth/v1; un token de
+        # otro proyecto que comparta el secreto no debe pasar.
+        self._emisor = f"{supabase_url.rstrip('/')}/auth/v1"
+        self._jwks = jwt.PyJWKClient(
+            f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+            lifespan=3600
+        )
+
+    def puede_verificar(self, token):
+        """True si el token puede validarse sin consultar a Supabase."""
+        try:
+            alg = jwt.get_unverified_header(token).get('alg')
+        except jwt.InvalidTokenError:
+            return False
+        return alg in ALGORITMOS_ASIMETRICOS or (alg == 'HS256' and bool(self._secreto))
+
+    def verificar(self, token):
+        """Devuelve los claims del token. Lanza jwt.InvalidTokenError si no es válido."""
+        alg = jwt.get_unverified_header(token).get('alg')
+        if alg == 'HS256':
+            if not self._secreto:
+                raise jwt.InvalidTokenError("No hay SUPABASE_JWT_SECRET para validar tokens HS256.")
+            clave, algoritmos = self._secreto, ['HS256']
+        elif alg in ALGORITMOS_ASIMETRICOS:
+            clave, algoritmos = self._jwks.get_signing_key_from_jwt(token).key, ALGORITMOS_ASIMETRICOS
+        else:
+            raise jwt.InvalidTokenError(f"Algoritmo de firma no soportado: {alg}")
+
+        return jwt.decode(
+            token, clave, algorithms=algoritmos, audience=self._audiencia, issuer=self._emisor,
+            options={"require": ["exp", "sub", "iss"]}
+        )
+
+
+class CacheRoles:
+    """Caché acotada (LRU + TTL) de id de usuario -> rol, segura entre hilos."""
+
+    def __init__(self, ttl=300, max_entradas=1024):
+        self._ttl = ttl
+        self._max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id):
+        """Devuelve el rol cacheado o None si no está o ya venció."""
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is None:
+                return None
+            rol, vence = entrada
+            if time.monotonic() >= vence:
+                del self._entradas[user_id]
+                return None
+            self._entradas.move_to_end(user_id)
+            return rol
+
+    def guardar(self, user_id, rol):
+        with self._lock:
+            self._entradas[user_id] = (rol, time.monotonic() + self._ttl)
+            self._entradas.move_to_end(user_id)
+            while len(self._entradas) > self._max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, user_id=None):
+        """Olvida el rol de un usuario, o el de todos si no se indica ninguno."""
+        with self._lock:
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
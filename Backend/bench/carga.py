@@ -0,0 +1,394 @@
+"""
+Pruebas de carga de servidor.py contra servicios falsos (ver servicios_falsos.py).
+
+Levanta Supabase/Cloudinary/SMTP falsos, arranca servidor.py con gunicorn
+(o uvicorn con --modo asgi) apuntando a ellos y corre los escenarios:
+
+    catalogo   navegación del catálogo: listado, filtros, revalidación con ETag, sugerencias
+    detalle    ficha de producto
+    admin      edición de productos y subida de imágenes con token de admin
+    checkout   ráfagas de checkouts simultáneos con Idempotency-Key
+    contacto   avalancha de formularios de contacto
+
+Uso (desde Backend/):
+
+    python bench/carga.py
+    python bench/carga.py --escenarios catalogo checkout --duracion 20 --latencia-postgrest 40
+    python bench/carga.py --guardar-base
+
+Informa throughput y p50/p95/p99 por endpoint y guarda los resultados en
+bench/resultados/ultima.json. Si existe bench/resultados/base.json los
+compara contra esa línea base y termina con código 1 si algún endpoint
+empeoró más que --tolerancia.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from servicios_falsos import CATEGORIAS, agregar_argumentos_latencia, entorno_para, levantar
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+SECRETO_JWT = "bench-secreto-jwt-de-al-menos-32-bytes"
+# JPEG mínimo válido para las subidas (Cloudinary falso no lo decodifica).
+IMAGEN = bytes.fromhex("ffd8ffe000104a46494600010100000100010000ffdb004300") + b"\x08" * 64 + bytes.fromhex("ffd9")
+
+
+# --- ESCENARIOS ---
+
+class Escenario:
+    """
+    Cada trabajador elige una operación al azar (según su peso) y la ejecuta
+    en bucle. Con `rafaga`, los trabajadores se sincronizan y disparan todos
+    a la vez, como una ola de checkouts al abrir una venta.
+    """
+
+    def __init__(self, nombre, concurrencia, operaciones, rafaga=False):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.operaciones = operaciones  # [(peso, función(contexto, cliente) -> [(etiqueta, respuesta)])]
+        self.rafaga = rafaga
+
+    def elegir(self, azar):
+        return azar.choices([op for _, op in self.operaciones], weights=[peso for peso, _ in self.operaciones])[0]
+
+
+def _listado(ctx, cliente):
+    return [("GET /api/productos", cliente.get("/api/productos"))]
+
+
+def _listado_revalidado(ctx, cliente):
+    # Un navegador que vuelve al catálogo manda el ETag que ya tiene.
+    cabeceras = {"If-None-Match": ctx.etag} if ctx.etag else {}
+    respuesta = cliente.get("/api/productos", headers=cabeceras)
+    if respuesta.headers.get("etag"):
+        ctx.etag = respuesta.headers["etag"]
+    return [("GET /api/productos (If-None-Match)", respuesta)]
+
+
+def _listado_filtrado(ctx, cliente):
+    parametros = {"categoria": ctx.azar.choice(CATEGORIAS), "limit": 24}
+    if ctx.azar.random() < 0.5:
+        parametros["sort"] = ctx.azar.choice(("precio", "-precio", "nombre"))
+    if ctx.azar.random() < 0.3:
+        parametros["precio_min"] = ctx.azar.randint(20, 200) * 100
+    return [("GET /api/productos?categoria=", cliente.get("/api/productos", params=parametros))]
+
+
+def _sugerencias(ctx, cliente):
+    nombre = ctx.azar.choice(ctx.nombres)
+    return [("GET /api/sugerencias", cliente.get("/api/sugerencias", params={"q": nombre[:ctx.azar.randint(2, 5)]}))]
+
+
+def _detalle(ctx, cliente):
+    return [("GET /api/productos/<id>", cliente.get(f"/api/productos/{ctx.azar.choice(ctx.ids)}"))]
+
+
+def _datos_producto(ctx, producto_id=None):
+    return {
+        "nombre": f"Bench {producto_id or uuid.uuid4().hex[:6]}", "descripcion": "Editado por la prueba de carga.",
+        "precio": ctx.azar.randint(20, 400) * 100, "stock": 1_000_000, "categoria": ctx.azar.choice(CATEGORIAS),
+    }
+
+
+def _editar(ctx, cliente):
+    producto_id = ctx.azar.choice(ctx.ids)
+    return [("PUT /api/productos/<id>", cliente.put(
+        f"/api/productos/{producto_id}", json=_datos_producto(ctx, producto_id), headers=ctx.admin
+    ))]
+
+
+def _crear_y_borrar(ctx, cliente):
+    datos = dict(_datos_producto(ctx), imagenes_urls=[])
+    creado = cliente.post("/api/productos", json=datos, headers=ctx.admin)
+    resultados = [("POST /api/productos", creado)]
+    if creado.status_code == 201:
+        producto_id = creado.json()["producto_id"]
+        resultados.append(("DELETE /api/productos/<id>", cliente.delete(f"/api/productos/{producto_id}", headers=ctx.admin)))
+    return resultados
+
+
+def _subir_lote(ctx, cliente):
+    archivos = [("files", (f"bench{i}.jpg", io.BytesIO(IMAGEN), "image/jpeg")) for i in range(3)]
+    return [("POST /api/productos/<id>/imagenes/lote", cliente.post(
+        f"/api/productos/{ctx.azar.choice(ctx.ids)}/imagenes/lote", files=archivos, headers=ctx.admin
+    ))]
+
+
+def _checkout(ctx, cliente):
+    carrito = [
+        {"id": producto_id, "cantidad": ctx.azar.randint(1, 2)}
+        for producto_id in ctx.azar.sample(ctx.ids, ctx.azar.randint(1, 3))
+    ]
+    return [("POST /api/actualizar-stock", cliente.post(
+        "/api/actualizar-stock", json=carrito, headers={"Idempotency-Key": str(uuid.uuid4())}
+    ))]
+
+
+def _contacto(ctx, cliente):
+    return [("POST /contacto", cliente.post("/contacto", json={
+        "nombre": "Bench", "email": "bench@bench.local", "mensaje": f"Consulta {uuid.uuid4().hex}",
+    }))]
+
+
+ESCENARIOS = {
+    "catalogo": Escenario("catalogo", 16, [(4, _listado), (2, _listado_revalidado), (3, _listado_filtrado), (3, _sugerencias)]),
+    "detalle": Escenario("detalle", 16, [(1, _detalle)]),
+    "admin": Escenario("admin", 4, [(5, _editar), (2, _crear_y_borrar), (2, _subir_lote), (3, _listado)]),
+    "checkout": Escenario("checkout", 32, [(1, _checkout)], rafaga=True),
+    "contacto": Escenario("contacto", 16, [(1, _contacto)]),
+}
+
+
+# --- EJECUCIÓN ---
+
+class _Contexto:
+    """Estado de un trabajador: su generador aleatorio y lo que un cliente real recordaría."""
+
+    def __init__(self, semilla, ids, nombres, admin):
+        self.azar = random.Random(semilla)
+        self.ids = ids
+        self.nombres = nombres
+        self.admin = admin
+        self.etag = None
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[min(indice, len(valores_ordenados) - 1)]
+
+
+def correr_escenario(escenario, url_base, datos, duracion, concurrencia, semilla, calentamiento=0):
+    """Devuelve {etiqueta: [(segundos, codigo)]} de las operaciones terminadas después del calentamiento."""
+    muestras = defaultdict(list)
+    lock = threading.Lock()
+    barrera = threading.Barrier(concurrencia) if escenario.rafaga else None
+    fin_calentamiento = time.monotonic() + calentamiento
+    fin = fin_calentamiento + duracion
+
+    def trabajar(numero):
+        ctx = _Contexto(semilla * 1000 + numero, *datos)
+        with httpx.Client(base_url=url_base, timeout=60) as cliente:
+            while True:
+                if barrera is not None:
+                    try:
+                        barrera.wait(timeout=60)
+                    except threading.BrokenBarrierError:
+                        return
+                if time.monotonic() >= fin:
+                    if barrera is not None:
+                        barrera.abort()
+                    return
+                operacion = escenario.elegir(ctx.azar)
+                inicio = time.perf_counter()
+                try:
+                    # Cada pedido se mide solo: `elapsed` va del envío hasta
+                    # terminar de leer su respuesta.
+                    resultados = [
+                        (etiqueta, r.elapsed.total_seconds(), r.status_code)
+                        for etiqueta, r in operacion(ctx, cliente)
+                    ]
+                except httpx.HTTPError as e:
+                    resultados = [(f"{operacion.__name__} ({type(e).__name__})", time.perf_counter() - inicio, 0)]
+                if time.monotonic() < fin_calentamiento:
+                    continue
+                with lock:
+                    for etiqueta, segundos, codigo in resultados:
+                        muestras[etiqueta].append((segundos, codigo))
+
+    hilos = [threading.Thread(target=trabajar, args=(i,), daemon=True) for i in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return muestras
+
+
+def resumir(muestras, duracion):
+    resumen = {}
+    for etiqueta, valores in sorted(muestras.items()):
+        tiempos = sorted(segundos for segundos, _ in valores)
+        errores = sum(1 for _, codigo in valores if not 200 <= codigo < 400)
+        resumen[etiqueta] = {
+            "pedidos": len(valores),
+            "errores": errores,
+            "rps": round(len(valores) / duracion, 2),
+            "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+            "p95_ms": round(percentil(tiempos, 95) * 1000, 2),
+            "p99_ms": round(percentil(tiempos, 99) * 1000, 2),
+        }
+    return resumen
+
+
+def imprimir(nombre, resumen, llamadas):
+    total = sum(d["rps"] for d in resumen.values())
+    print(f"\n== {nombre}  ({total:.1f} pedidos/s)")
+    print(f"{'endpoint':42} {'pedidos':>8} {'errores':>8} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for etiqueta, d in resumen.items():
+        print(f"{etiqueta:42} {d['pedidos']:8} {d['errores']:8} {d['rps']:8.1f} "
+              f"{d['p50_ms']:7.1f}ms {d['p95_ms']:7.1f}ms {d['p99_ms']:7.1f}ms")
+    if llamadas:
+        print("   upstreams: " + ", ".join(f"{op} x{n}" for op, n in sorted(llamadas.items())))
+
+
+def comparar(actual, base, tolerancia):
+    """Imprime las diferencias contra la línea base. Devuelve la lista de regresiones."""
+    regresiones = []
+    if base.get("configuracion") != actual["configuracion"]:
+        print("\nAVISO: la línea base se tomó con otra configuración; la comparación es orientativa.")
+    print(f"\n== Comparación con la línea base del {base.get('fecha', '?')} (tolerancia {tolerancia:.0%})")
+    for escenario, endpoints in actual["escenarios"].items():
+        for etiqueta, d in endpoints.items():
+            previo = base.get("escenarios", {}).get(escenario, {}).get(etiqueta)
+            if not previo:
+                continue
+            cambio_p95 = d["p95_ms"] / previo["p95_ms"] - 1 if previo["p95_ms"] else 0
+            cambio_rps = d["rps"] / previo["rps"] - 1 if previo["rps"] else 0
+            peor = cambio_p95 > tolerancia or cambio_rps < -tolerancia or d["errores"] > previo["errores"]
+            marca = "REGRESIÓN" if peor else ""
+            print(f"{escenario:9} {etiqueta:42} p95 {previo['p95_ms']:7.1f} -> {d['p95_ms']:7.1f} ms ({cambio_p95:+.0%})  "
+                  f"rps {previo['rps']:7.1f} -> {d['rps']:7.1f} ({cambio_rps:+.0%})  {marca}")
+            if peor:
+                regresiones.append((escenario, etiqueta))
+    return regresiones
+
+
+# --- SERVIDOR BAJO PRUEBA ---
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def arrancar_servidor(modo, hilos, entorno, registro):
+    puerto = _puerto_libre()
+    if modo == "asgi":
+        comando = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(puerto), "--no-access-log"]
+    else:
+        comando = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{puerto}", "--threads", str(hilos), "servidor:app"]
+    proceso = subprocess.Popen(comando, cwd=DIRECTORIO_BACKEND, env={**os.environ, **entorno},
+                               stdout=registro, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"servidor.py terminó al arrancar (ver {registro.name}).")
+        try:
+            if httpx.get(f"{url}/api/productos", timeout=2).status_code == 200:
+                return proceso, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError(f"servidor.py no respondió en 30 s (ver {registro.name}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de carga de servidor.py contra servicios falsos.")
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--duracion", type=float, default=15, help="Segundos medidos por escenario.")
+    parser.add_argument("--calentamiento", type=float, default=2, help="Segundos descartados al inicio de cada escenario.")
+    parser.add_argument("--concurrencia", type=int, help="Trabajadores por escenario (por defecto, el de cada escenario).")
+    parser.add_argument("--modo", choices=("wsgi", "asgi"), default="wsgi", help="Igual que SERVIDOR_MODO.")
+    parser.add_argument("--hilos", type=int, default=8, help="--threads de gunicorn (modo wsgi).")
+    parser.add_argument("--productos", type=int, default=200)
+    parser.add_argument("--sin-rpc-lote", action="store_true", help="Simula una base sin actualizar_stock_venta_lote.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--entorno", action="append", default=[], metavar="NOMBRE=VALOR",
+                        help="Variable extra para servidor.py (p. ej. CHECKOUT_VENTANA_MS=0). Repetible.")
+    parser.add_argument("--base", default=os.path.join(DIRECTORIO_RESULTADOS, "base.json"))
+    parser.add_argument("--guardar-base", action="store_true", help="Guarda esta corrida como línea base.")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento admitido de p95 / rps (0.2 = 20%%).")
+    agregar_argumentos_latencia(parser)
+    args = parser.parse_args()
+
+    supabase, cloudinary, smtp = levantar(args, SECRETO_JWT, rpc_lote=not args.sin_rpc_lote)
+    productos = supabase.sembrar(args.productos, semilla=args.semilla)
+    admin = supabase.agregar_usuario("admin@bench.local", "bench", "Admin", rol="admin")
+    datos = (
+        [p["ProductoID"] for p in productos], [p["Nombre"] for p in productos],
+        {"Authorization": f"Bearer {supabase.emitir_token(admin, vigencia=24 * 3600)}"},
+    )
+
+    temporal = tempfile.mkdtemp(prefix="bench-")
+    entorno = entorno_para(supabase, cloudinary, smtp)
+    entorno.update({
+        "OUTBOX_DB": os.path.join(temporal, "outbox.db"),
+        "LIMPIEZA_DB": os.path.join(temporal, "limpieza.db"),
+        "IDEMPOTENCIA_DB": os.path.join(temporal, "idempotencia.db"),
+        "LIMITADOR_DB": os.path.join(temporal, "limitador.db"),
+        # Toda la carga sale de una sola IP: con el limitador se mediría solo
+        # el 429. Para medirlo a él, --entorno LIMITADOR=1.
+        "LIMITADOR": "0",
+    })
+    for asignacion in args.entorno:
+        nombre, _, valor = asignacion.partition("=")
+        entorno[nombre] = valor
+
+    registro = open(os.path.join(temporal, "servidor.log"), "w")
+    proceso, url_base = arrancar_servidor(args.modo, args.hilos, entorno, registro)
+    print(f"servidor.py ({args.modo}) en {url_base}; registro en {registro.name}")
+
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "configuracion": {
+            "modo": args.modo, "hilos": args.hilos, "duracion": args.duracion, "concurrencia": args.concurrencia,
+            "productos": args.productos, "entorno": sorted(args.entorno), "rpc_lote": not args.sin_rpc_lote,
+            "latencias": {s: [getattr(args, f"latencia_{s}"), getattr(args, f"variacion_{s}")]
+                          for s in ("postgrest", "cloudinary", "smtp")},
+        },
+        "escenarios": {},
+    }
+    try:
+        for nombre in args.escenarios:
+            escenario = ESCENARIOS[nombre]
+            antes = supabase.instantanea() + cloudinary.instantanea() + smtp.instantanea()
+            muestras = correr_escenario(escenario, url_base, datos, args.duracion,
+                                        args.concurrencia or escenario.concurrencia, args.semilla, args.calentamiento)
+            llamadas = (supabase.instantanea() + cloudinary.instantanea() + smtp.instantanea()) - antes
+            resumen = resumir(muestras, args.duracion)
+            resultados["escenarios"][nombre] = resumen
+            imprimir(nombre, resumen, llamadas)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+        registro.close()
+        for servicio in (supabase, cloudinary, smtp):
+            servicio.detener()
+
+    os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+    with open(os.path.join(DIRECTORIO_RESULTADOS, "ultima.json"), "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {args.base}")
+        return 0
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} endpoint(s) empeoraron más de {args.tolerancia:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
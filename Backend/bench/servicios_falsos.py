@@ -0,0 +1,574 @@
+"""
+Servicios falsos para medir servidor.py sin tocar Supabase, Cloudinary ni Gmail.
+
+- SupabaseFalso: el subconjunto de PostgREST (/rest/v1) y Auth (/auth/v1)
+  que usa la tienda, sobre tablas en memoria (Productos, ImagenesProducto,
+  profiles) y las funciones actualizar_stock_venta / actualizar_stock_venta_lote.
+- CloudinaryFalso: upload, destroy y la Admin API (resources, delete_resources).
+- SmtpFalso: sumidero SMTP que acepta los correos y los descarta.
+
+Cada servicio agrega a cada respuesta `latencia` ms (+ hasta `variacion` ms
+al azar) y cuenta sus llamadas por operación en `contador`.
+
+    python bench/servicios_falsos.py --latencia-postgrest 40
+
+los levanta solos e imprime las variables de entorno para apuntar
+servidor.py a ellos.
+"""
+import base64
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit, unquote
+
+import jwt
+
+CATEGORIAS = ('cuchillos', 'personalizados', 'navajas', 'accesorios')
+ACEROS = ('Acero 1095', 'Acero 440C', 'Damasco', 'Acero N690', 'Acero SAE 5160')
+MODELOS = ('Bowie', 'Facón', 'Verijero', 'Hunter', 'Skinner', 'Puukko', 'Tanto', 'Chef', 'Santoku', 'Clip')
+
+
+class Latencia:
+    def __init__(self, ms=0, variacion=0):
+        self.ms = ms
+        self.variacion = variacion
+
+    def esperar(self):
+        demora = self.ms + (random.uniform(0, self.variacion) if self.variacion else 0)
+        if demora > 0:
+            time.sleep(demora / 1000)
+
+
+# --- BASE HTTP ---
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como los clientes reales
+
+    def _atender(self):
+        partes = urlsplit(self.path)
+        largo = int(self.headers.get('Content-Length') or 0)
+        cuerpo = self.rfile.read(largo) if largo else b''
+        servicio = self.server.servicio
+        try:
+            codigo, datos, cabeceras = servicio.atender(
+                self.command, unquote(partes.path), parse_qsl(partes.query, keep_blank_values=True),
+                self.headers, cuerpo
+            )
+        except Exception as e:
+            codigo, datos, cabeceras = 500, {"message": f"{type(e).__name__}: {e}"}, {}
+        servicio.latencia.esperar()
+
+        salida = b'' if datos is None else json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        for nombre, valor in cabeceras.items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(salida)))
+        self.end_headers()
+        self.wfile.write(salida)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _atender
+
+    def log_message(self, *args):
+        pass
+
+
+class _ServicioHttp:
+    """Servidor HTTP en un hilo, en un puerto libre de 127.0.0.1."""
+
+    def __init__(self, latencia=0, variacion=0):
+        self.latencia = Latencia(latencia, variacion)
+        self.contador = Counter()
+        self._lock = threading.Lock()
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+        self._http.daemon_threads = True
+        self._http.servicio = self
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def contar(self, operacion):
+        with self._lock:
+            self.contador[operacion] += 1
+
+    def instantanea(self):
+        with self._lock:
+            return Counter(self.contador)
+
+    def atender(self, metodo, ruta, parametros, cabeceras, cuerpo):
+        raise NotImplementedError
+
+
+# --- SUPABASE (POSTGREST + AUTH) ---
+
+def _ahora_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _dividir_select(select):
+    """'*, ImagenesProducto(URL)' -> ['*', 'ImagenesProducto(URL)'] (respeta paréntesis)."""
+    partes, actual, nivel = [], '', 0
+    for caracter in select:
+        if caracter == ',' and nivel == 0:
+            partes.append(actual.strip())
+            actual = ''
+            continue
+        nivel += caracter == '('
+        nivel -= caracter == ')'
+        actual += caracter
+    if actual.strip():
+        partes.append(actual.strip())
+    return partes
+
+
+def _valor(texto):
+    for tipo in (int, float):
+        try:
+            return tipo(texto)
+        except ValueError:
+            pass
+    return texto
+
+
+def _cumple(fila, columna, filtro):
+    operador, _, esperado = filtro.partition('.')
+    actual = fila.get(columna)
+    if operador == 'in':
+        return str(actual) in {v.strip().strip('"') for v in esperado.strip('()').split(',')}
+    if operador == 'is':
+        return actual is None if esperado == 'null' else str(actual).lower() == esperado
+    if operador in ('eq', 'neq'):
+        return (str(actual) == esperado) == (operador == 'eq')
+    if actual is None:
+        return False
+    esperado = _valor(esperado)
+    if isinstance(esperado, str):
+        actual = str(actual)
+    return {
+        'gt': actual > esperado, 'gte': actual >= esperado,
+        'lt': actual < esperado, 'lte': actual <= esperado,
+    }.get(operador, False)
+
+
+class SupabaseFalso(_ServicioHttp):
+    """
+    PostgREST + Auth en memoria. Entiende select con embebidos, filtros
+    (eq, neq, gt, gte, lt, lte, in, is), order, limit/offset, .single(),
+    insert/upsert, update, delete y las funciones RPC de checkout. Los tokens
+    se firman con `secreto_jwt` (HS256), el mismo SUPABASE_JWT_SECRET que se
+    le pasa a servidor.py.
+    """
+
+    CLAVES = {'Productos': 'ProductoID', 'ImagenesProducto': 'ImagenID', 'profiles': 'id'}
+    # tabla -> {tabla embebible: columna que las une}
+    RELACIONES = {'Productos': {'ImagenesProducto': 'ProductoID'}}
+
+    def __init__(self, secreto_jwt, latencia=0, variacion=0, rpc_lote=True):
+        super().__init__(latencia, variacion)
+        self.secreto_jwt = secreto_jwt
+        self.rpc_lote = rpc_lote
+        self.tablas = {tabla: [] for tabla in self.CLAVES}
+        self._secuencias = {tabla: 0 for tabla in self.CLAVES}
+        self._usuarios = {}  # email -> (password, usuario)
+
+    # --- Datos ---
+
+    def sembrar(self, productos=200, imagenes_por_producto=3, stock=1_000_000, nube='bench', semilla=0):
+        azar = random.Random(semilla)
+        filas, imagenes = [], []
+        for _ in range(productos):
+            modelo, acero = azar.choice(MODELOS), azar.choice(ACEROS)
+            filas.append({
+                'Nombre': f"{modelo} {acero.split()[-1]} {azar.randint(100, 999)}",
+                'Descripcion': f"{acero}, hoja de {azar.randint(8, 25)} cm, mango de {azar.choice(('ciervo', 'guayubira', 'micarta', 'G10'))}.",
+                'Precio': azar.randint(20, 400) * 100,
+                'Stock': stock,
+                'Categoria': azar.choice(CATEGORIAS),
+            })
+        creados = self.insertar('Productos', filas)
+        for producto in creados:
+            for _ in range(imagenes_por_producto):
+                public_id = f"bench/{uuid.UUID(int=azar.getrandbits(128)).hex}"
+                imagenes.append({
+                    'ProductoID': producto['ProductoID'],
+                    'URL': f"https://res.cloudinary.com/{nube}/image/upload/v1/{public_id}.jpg",
+                })
+        self.insertar('ImagenesProducto', imagenes)
+        return creados
+
+    def agregar_usuario(self, email, password, nombre='Bench', rol='cliente'):
+        usuario = {
+            'id': str(uuid.uuid4()), 'aud': 'authenticated', 'role': 'authenticated', 'email': email,
+            'app_metadata': {'provider': 'email'}, 'user_metadata': {'nombre': nombre},
+            'created_at': _ahora_iso(),
+        }
+        self._usuarios[email] = (password, usuario)
+        self.insertar('profiles', [{'id': usuario['id'], 'nombre': nombre, 'role': rol}])
+        return usuario
+
+    def emitir_token(self, usuario, vigencia=3600):
+        ahora = int(time.time())
+        return jwt.encode({
+            'sub': usuario['id'], 'email': usuario['email'], 'aud': 'authenticated', 'iss': f"{self.url}/auth/v1",
+            'role': 'authenticated', 'iat': ahora, 'exp': ahora + vigencia,
+        }, self.secreto_jwt, algorithm='HS256')
+
+    def insertar(self, tabla, filas, columna_conflicto=None):
+        clave = self.CLAVES[tabla]
+        resultado = []
+        with self._lock:
+            existentes = self.tablas[tabla]
+            for fila in filas:
+                fila = dict(fila)
+                if columna_conflicto and fila.get(columna_conflicto) is not None:
+                    actual = next((f for f in existentes if f.get(columna_conflicto) == fila[columna_conflicto]), None)
+                    if actual is not None:
+                        actual.update(fila)
+                        resultado.append(dict(actual))
+                        continue
+                if fila.get(clave) is None:
+                    self._secuencias[tabla] += 1
+                    fila[clave] = self._secuencias[tabla]
+                existentes.append(fila)
+                resultado.append(dict(fila))
+        return resultado
+
+    # --- HTTP ---
+
+    def atender(self, metodo, ruta, parametros, cabeceras, cuerpo):
+        if ruta.startswith('/rest/v1/rpc/'):
+            return self._rpc(ruta.rsplit('/', 1)[1], json.loads(cuerpo or b'{}'))
+        if ruta.startswith('/rest/v1/'):
+            return self._rest(metodo, ruta.split('/', 3)[3], parametros, cabeceras, cuerpo)
+        if ruta.startswith('/auth/v1/'):
+            return self._auth(metodo, ruta.split('/', 3)[3], cabeceras, cuerpo)
+        return 404, {"message": "Ruta desconocida"}, {}
+
+    def _rest(self, metodo, tabla, parametros, cabeceras, cuerpo):
+        if tabla not in self.CLAVES:
+            return 404, {"code": "42P01", "message": f'relation "public.{tabla}" does not exist'}, {}
+        operacion = {'GET': 'select', 'HEAD': 'select', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}[metodo]
+        prefer = cabeceras.get('Prefer', '')
+        if operacion == 'insert' and 'merge-duplicates' in prefer:
+            operacion = 'upsert'
+        self.contar(f"{tabla}.{operacion}")
+
+        especiales = {}
+        filtros = []
+        for nombre, valor in parametros:
+            if nombre in ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns'):
+                especiales[nombre] = valor
+            else:
+                filtros.append((nombre, valor))
+
+        if operacion in ('insert', 'upsert'):
+            datos = json.loads(cuerpo or b'[]')
+            filas = self.insertar(tabla, datos if isinstance(datos, list) else [datos],
+                                  especiales.get('on_conflict') if operacion == 'upsert' else None)
+            return 201, (filas if 'return=representation' in prefer else None), {}
+
+        with self._lock:
+            filas = [f for f in self.tablas[tabla] if all(_cumple(f, c, v) for c, v in filtros)]
+            if operacion == 'update':
+                cambios = json.loads(cuerpo or b'{}')
+                for fila in filas:
+                    fila.update(cambios)
+            elif operacion == 'delete':
+                ids = {id(f) for f in filas}
+                self.tablas[tabla] = [f for f in self.tablas[tabla] if id(f) not in ids]
+                for hija, columna in self.RELACIONES.get(tabla, {}).items():  # ON DELETE CASCADE
+                    claves = {f[self.CLAVES[tabla]] for f in filas}
+                    self.tablas[hija] = [f for f in self.tablas[hija] if f.get(columna) not in claves]
+            filas = [self._proyectar(tabla, f, especiales.get('select', '*')) for f in filas]
+
+        if operacion != 'select':
+            return (200, filas, {}) if 'return=representation' in prefer else (204, None, {})
+
+        for orden in reversed(especiales.get('order', '').split(',') if especiales.get('order') else []):
+            columna, *modificadores = orden.split('.')
+            filas.sort(key=lambda f: (f.get(columna) is None, f.get(columna)), reverse='desc' in modificadores)
+        total = str(len(filas)) if 'count=exact' in prefer else '*'
+        desde = int(especiales.get('offset', 0))
+        filas = filas[desde:desde + int(especiales['limit'])] if 'limit' in especiales else filas[desde:]
+
+        if 'vnd.pgrst.object' in cabeceras.get('Accept', ''):
+            if len(filas) != 1:
+                return 406, {
+                    "code": "PGRST116", "details": f"The result contains {len(filas)} rows",
+                    "hint": None, "message": "JSON object requested, multiple (or no) rows returned",
+                }, {}
+            return 200, filas[0], {}
+        return 200, filas, {'Content-Range': f"{desde}-{desde + len(filas) - 1}/{total}" if filas else f"*/{total}"}
+
+    def _proyectar(self, tabla, fila, select):
+        resultado = {}
+        for parte in _dividir_select(select):
+            if '(' in parte:
+                hija, columnas = parte[:-1].split('(', 1)
+                columna = self.RELACIONES[tabla][hija]
+                resultado[hija] = [
+                    self._proyectar(hija, f, columnas) for f in self.tablas[hija]
+                    if f.get(columna) == fila[self.CLAVES[tabla]]
+                ]
+            elif parte == '*':
+                resultado.update(fila)
+            else:
+                resultado[parte] = fila.get(parte)
+        return resultado
+
+    def _rpc(self, funcion, argumentos):
+        self.contar(f"rpc.{funcion}")
+        if funcion == 'actualizar_stock_venta':
+            with self._lock:
+                return 200, self._vender(argumentos['items_json']), {}
+        if funcion == 'actualizar_stock_venta_lote' and self.rpc_lote:
+            resultados = []
+            with self._lock:
+                for carrito in argumentos['carritos_json']:
+                    mensaje = self._vender(carrito)
+                    resultados.append({'ok': 'Error' not in mensaje, 'mensaje': mensaje})
+            return 200, resultados, {}
+        return 404, {
+            "code": "PGRST202", "details": None, "hint": None,
+            "message": f"Could not find the function public.{funcion} in the schema cache",
+        }, {}
+
+    def _vender(self, carrito):
+        """Igual que la función SQL: todo o nada. Llamar con el lock tomado."""
+        por_id = {f['ProductoID']: f for f in self.tablas['Productos']}
+        pedidos = Counter()
+        for item in carrito:
+            pedidos[int(item['id'])] += int(item.get('cantidad', 1))
+        for producto_id, cantidad in pedidos.items():
+            producto = por_id.get(producto_id)
+            if producto is None:
+                return f"Error: el producto {producto_id} no existe."
+            if producto['Stock'] < cantidad:
+                return f"Error: stock insuficiente para '{producto['Nombre']}'."
+        for producto_id, cantidad in pedidos.items():
+            por_id[producto_id]['Stock'] -= cantidad
+        return "Stock actualizado correctamente."
+
+    def _auth(self, metodo, ruta, cabeceras, cuerpo):
+        self.contar(f"auth.{ruta}")
+        datos = json.loads(cuerpo or b'{}')
+        if ruta == 'user':
+            token = cabeceras.get('Authorization', '').removeprefix('Bearer ')
+            try:
+                claims = jwt.decode(token, self.secreto_jwt, algorithms=['HS256'], audience='authenticated')
+            except jwt.InvalidTokenError:
+                return 401, {"code": 401, "error_code": "bad_jwt", "msg": "invalid JWT"}, {}
+            usuario = next((u for _, u in self._usuarios.values() if u['id'] == claims['sub']), None)
+            return (200, usuario, {}) if usuario else (404, {"code": 404, "msg": "User not found"}, {})
+        if ruta == 'token':
+            password, usuario = self._usuarios.get(datos.get('email'), (None, None))
+            if usuario is None or password != datos.get('password'):
+                return 400, {"code": 400, "error_code": "invalid_credentials", "msg": "Invalid login credentials"}, {}
+            return 200, {
+                'access_token': self.emitir_token(usuario), 'token_type': 'bearer', 'expires_in': 3600,
+                'expires_at': int(time.time()) + 3600, 'refresh_token': uuid.uuid4().hex, 'user': usuario,
+            }, {}
+        if ruta == 'signup':
+            if datos.get('email') in self._usuarios:
+                return 422, {"code": 422, "error_code": "user_already_exists", "msg": "User already registered"}, {}
+            nombre = (datos.get('data') or {}).get('nombre', '')
+            return 200, self.agregar_usuario(datos['email'], datos.get('password'), nombre), {}
+        if ruta == 'logout':
+            return 204, None, {}
+        return 404, {"code": 404, "msg": "Ruta de auth desconocida"}, {}
+
+
+# --- CLOUDINARY ---
+
+class CloudinaryFalso(_ServicioHttp):
+    """Upload API (upload, destroy) y Admin API (resources, delete_resources) de una nube `nube`."""
+
+    def __init__(self, nube='bench', latencia=0, variacion=0):
+        super().__init__(latencia, variacion)
+        self.nube = nube
+        self.recursos = {}  # public_id -> secure_url
+
+    @property
+    def cloudinary_url(self):
+        """Valor de CLOUDINARY_URL que apunta el SDK a este servicio."""
+        return f"cloudinary://clave:secreto@{self.nube}?upload_prefix={self.url}"
+
+    def atender(self, metodo, ruta, parametros, cabeceras, cuerpo):
+        partes = [p for p in ruta.split('/') if p]  # v1_1, nube, ...
+        accion = '/'.join(partes[2:])
+        if accion == 'image/upload' and metodo == 'POST':
+            self.contar('uploader.upload')
+            public_id = f"bench/{uuid.uuid4().hex}"
+            url = f"https://res.cloudinary.com/{self.nube}/image/upload/v1/{public_id}.jpg"
+            with self._lock:
+                self.recursos[public_id] = url
+            return 200, {
+                'public_id': public_id, 'version': 1, 'resource_type': 'image', 'type': 'upload',
+                'format': 'jpg', 'width': 1200, 'height': 800, 'bytes': len(cuerpo),
+                'url': url.replace('https://', 'http://'), 'secure_url': url, 'created_at': _ahora_iso(),
+            }, {}
+        if accion == 'image/destroy':
+            self.contar('uploader.destroy')
+            public_id = dict(parse_qsl(cuerpo.decode('utf-8', 'replace'))).get('public_id')
+            with self._lock:
+                existia = self.recursos.pop(public_id, None) is not None
+            return 200, {'result': 'ok' if existia else 'not found'}, {}
+        if accion.startswith('resources/image') and metodo == 'DELETE':
+            self.contar('api.delete_resources')
+            ids = [v for k, v in parametros + self._parametros_cuerpo(cabeceras, cuerpo) if k.startswith('public_ids')]
+            with self._lock:
+                borrados = {pid: 'deleted' if self.recursos.pop(pid, None) else 'not_found' for pid in ids}
+            return 200, {'deleted': borrados, 'partial': False}, {}
+        if accion.startswith('resources/image') and metodo == 'GET':
+            self.contar('api.resources')
+            with self._lock:
+                recursos = [{'public_id': pid, 'secure_url': url} for pid, url in self.recursos.items()]
+            return 200, {'resources': recursos}, {}
+        return 404, {'error': {'message': f"Acción desconocida: {accion}"}}, {}
+
+    @staticmethod
+    def _parametros_cuerpo(cabeceras, cuerpo):
+        if not cuerpo:
+            return []
+        if 'json' in cabeceras.get('Content-Type', ''):
+            datos = json.loads(cuerpo)
+            return [(k, v) for k, valores in datos.items() for v in (valores if isinstance(valores, list) else [valores])]
+        return parse_qsl(cuerpo.decode('utf-8', 'replace'))
+
+
+# --- SMTP ---
+
+class _ManejadorSmtp(socketserver.StreamRequestHandler):
+    def handle(self):
+        servicio = self.server.servicio
+        self.wfile.write(b"220 bench ESMTP\r\n")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea[:4].upper()
+            if comando == b'EHLO':
+                self.wfile.write(b"250-bench\r\n250 8BITMIME\r\n")
+            elif comando == b'AUTH':
+                self.wfile.write(b"235 2.7.0 Authentication successful\r\n")
+            elif comando == b'DATA':
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                servicio.latencia.esperar()
+                servicio.contar('sendmail')
+                self.wfile.write(b"250 2.0.0 OK\r\n")
+            elif comando == b'QUIT':
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            elif comando in (b'HELO', b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.wfile.write(b"250 OK\r\n")
+            else:
+                self.wfile.write(b"502 5.5.2 Command not recognized\r\n")
+
+
+class SmtpFalso:
+    """Sumidero SMTP (sin STARTTLS; acepta cualquier AUTH). Usar SMTP_STARTTLS=0."""
+
+    def __init__(self, latencia=0, variacion=0):
+        self.latencia = Latencia(latencia, variacion)
+        self.contador = Counter()
+        self._lock = threading.Lock()
+        self._servidor = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _ManejadorSmtp)
+        self._servidor.daemon_threads = True
+        self._servidor.servicio = self
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def puerto(self):
+        return self._servidor.server_address[1]
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def contar(self, operacion):
+        with self._lock:
+            self.contador[operacion] += 1
+
+    def instantanea(self):
+        with self._lock:
+            return Counter(self.contador)
+
+
+# --- ENTORNO ---
+
+def clave_anonima(secreto_jwt):
+    """SUPABASE_KEY falsa: un JWT con rol anon firmado con el mismo secreto."""
+    return jwt.encode({'role': 'anon', 'iss': 'supabase'}, secreto_jwt, algorithm='HS256')
+
+
+def entorno_para(supabase, cloudinary, smtp):
+    """Variables de entorno que apuntan servidor.py a los servicios falsos."""
+    return {
+        'SUPABASE_URL': supabase.url,
+        'SUPABASE_KEY': clave_anonima(supabase.secreto_jwt),
+        'SUPABASE_JWT_SECRET': supabase.secreto_jwt,
+        'CLOUDINARY_URL': cloudinary.cloudinary_url,
+        'CLOUD_NAME': cloudinary.nube, 'API_KEY': 'clave', 'API_SECRET': 'secreto',
+        'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(smtp.puerto), 'SMTP_STARTTLS': '0',
+        'EMAIL_FROM': 'tienda@bench.local', 'EMAIL_TO': 'ventas@bench.local', 'EMAIL_PASS': '',
+    }
+
+
+def agregar_argumentos_latencia(parser):
+    for servicio in ('postgrest', 'cloudinary', 'smtp'):
+        parser.add_argument(f"--latencia-{servicio}", type=float, default=0, metavar="MS",
+                            help=f"Latencia agregada a cada respuesta de {servicio} (ms).")
+        parser.add_argument(f"--variacion-{servicio}", type=float, default=0, metavar="MS",
+                            help=f"Variación aleatoria extra (0..MS) para {servicio}.")
+
+
+def levantar(args, secreto_jwt, rpc_lote=True):
+    """Inicia los tres servicios con las latencias de `args`. Devuelve (supabase, cloudinary, smtp)."""
+    supabase = SupabaseFalso(secreto_jwt, args.latencia_postgrest, args.variacion_postgrest, rpc_lote=rpc_lote).iniciar()
+    cloudinary = CloudinaryFalso('bench', args.latencia_cloudinary, args.variacion_cloudinary).iniciar()
+    smtp = SmtpFalso(args.latencia_smtp, args.variacion_smtp).iniciar()
+    return supabase, cloudinary, smtp
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Levanta los servicios falsos e imprime el entorno para servidor.py.")
+    agregar_argumentos_latencia(parser)
+    parser.add_argument("--productos", type=int, default=200)
+    parser.add_argument("--secreto-jwt", default=base64.urlsafe_b64encode(b"bench" * 8).decode())
+    args = parser.parse_args()
+
+    supabase, cloudinary, smtp = levantar(args, args.secreto_jwt)
+    supabase.sembrar(args.productos)
+    admin = supabase.agregar_usuario('admin@bench.local', 'bench', 'Admin', rol='admin')
+    for nombre, valor in entorno_para(supabase, cloudinary, smtp).items():
+        print(f"export {nombre}='{valor}'")
+    print(f"# Token de admin: {supabase.emitir_token(admin, vigencia=24 * 3600)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
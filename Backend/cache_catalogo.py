@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+
+from compresion import CuerpoComprimible
+from indice_catalogo import IndiceCatalogo
+from serializacion import serializar
+
+# Campos de un producto que pueden pedirse con ?fields=, en el orden en que se devuelven.
+CAMPOS_PRODUCTO = ('id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria', 'imagenes', 'variantes')
+
+
+def serializar_catalogo(productos):
+    """Serializa productos (o cualquier valor JSON) a JSON compacto en UTF-8."""
+    return serializar(productos)
+
+
+def proyectar(producto, campos):
+    """El producto con solo `campos` (None = todos)."""
+    if campos is None:
+        return producto
+    return {campo: producto[campo] for campo in campos if campo in producto}
+
+
+@dataclass
+class VistaCatalogo:
+    """El catálogo completo (o una proyección) serializado, con su ETag y sus versiones comprimidas."""
+    cuerpo: CuerpoComprimible
+    etag: str
+
+
+@dataclass
+class EntradaCatalogo:
+    """Una foto del catálogo ya formateada y serializada, lista para responder."""
+    productos: list
+    cuerpo: bytes
+    etag: str
+    indice: IndiceCatalogo
+    creado: float = field(default_factory=time.monotonic)
+    _vistas: dict = field(default_factory=dict, repr=False)
+
+    def vista(self, campos=None):
+        """
+        Vista del catálogo completo proyectada a `campos` (una tupla en el orden
+        de CAMPOS_PRODUCTO, o None para todos). Se serializa una vez por versión.
+        """
+        vista = self._vistas.get(campos)
+        if vista is None:
+            if campos is None:
+                cuerpo, etag = self.cuerpo, self.etag
+            else:
+                cuerpo = serializar_catalogo([proyectar(p, campos) for p in self.productos])
+                etag = hashlib.sha256(cuerpo).hexdigest()[:32]
+            vista = self._vistas[campos] = VistaCatalogo(CuerpoComprimible(cuerpo), etag)
+        return vista
+
+
+class CacheCatalogo:
+    """
+    Caché en memoria (por proceso) del catálogo completo.
+
+    Guarda la lista de productos junto con el cuerpo JSON ya serializado y un
+    ETag fuerte calculado sobre ese cuerpo. La entrada vence tras `ttl` segundos
+    o cuando alguna ruta de escritura llama a `invalidar()`. Solo un hilo a la
+    vez consulta a Supabase; el resto espera y reutiliza el resultado.
+    `al_cargar`, si se indica, recibe la lista de productos tras cada carga;
+    `al_invalidar` se llama (sin argumentos) en cada `invalidar()`.
+    """
+
+    def __init__(self, cargador, ttl=60, al_cargar=None, al_invalidar=None):
+        self._cargador = cargador
+        self._al_cargar = al_cargar
+        self._al_invalidar = al_invalidar
+        self._ttl = ttl
+        self._entrada = None
+        self._generacion = 0
+        self._lock_carga = threading.Lock()
+
+    def obtener(self):
+        """Devuelve la entrada vigente, recargando desde el origen si hace falta."""
+        entrada = self._entrada
+        if entrada is not None and self._vigente(entrada):
+            return entrada
+
+        with self._lock_carga:
+            # Otro hilo pudo haber recargado mientras esperábamos el lock.
+            entrada = self._entrada
+            if entrada is not None and self._vigente(entrada):
+                return entrada
+
+            for _ in range(3):
+                generacion = self._generacion
+                try:
+                    productos = self._cargador()
+                except Exception:
+                    # Si el origen falla, preferimos servir la última copia conocida.
+                    if self._entrada is not None:
+                        return self._entrada
+                    raise
+
+                cuerpo = serializar_catalogo(productos)
+                nueva = EntradaCatalogo(
+                    productos=productos,
+                    cuerpo=cuerpo,
+                    etag=hashlib.sha256(cuerpo).hexdigest()[:32],
+                    indice=IndiceCatalogo(productos),
+                )
+                if generacion == self._generacion:
+                    self._entrada = nueva
+                    if self._al_cargar is not None:
+                        self._al_cargar(productos)
+                    return nueva
+                # Hubo una invalidación durante la carga: lo leído pudo ser
+                # anterior a la escritura, así que no se guarda ni se avisa a
+                # `al_cargar`; se vuelve a leer.
+            # Con escrituras sin pausa se responde la última lectura sin guardarla.
+            return nueva
+
+    def vigente(self, max_edad=None):
+        """
+        Devuelve la entrada si está vigente (y, con `max_edad`, si tiene menos
+        de esos segundos), o None. Nunca bloquea ni consulta el origen.
+        """
+        entrada = self._entrada
+        if entrada is not None and self._vigente(entrada):
+            if max_edad is None or time.monotonic() - entrada.creado < max_edad:
+                return entrada
+        return None
+
+    def invalidar(self):
+        """Descarta la entrada actual; la próxima lectura consultará el origen."""
+        self._generacion += 1
+        self._entrada = None
+        if self._al_invalidar is not None:
+            self._al_invalidar()
+
+    def _vigente(self, entrada):
+        return time.monotonic() - entrada.creado < self._ttl
@@ -0,0 +1,282 @@
+import csv
+import io
+import json
+
+from variantes_imagen import fila_imagen
+
+TAMANO_LOTE = 200
+COLUMNAS_CSV = ['id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria', 'imagenes']
+CAMPOS_OBLIGATORIOS = ('nombre', 'precio', 'stock', 'categoria')
+# Campo de la API -> columna de la tabla Productos
+COLUMNAS_PRODUCTO = {
+    'nombre': 'Nombre', 'descripcion': 'Descripcion', 'precio': 'Precio',
+    'stock': 'Stock', 'categoria': 'Categoria',
+}
+SEPARADOR_IMAGENES = '|'
+
+
+# --- LECTURA INCREMENTAL ---
+
+class ErrorDeLectura(ValueError):
+    """El resto del archivo no se puede leer (CSV mal formado o bytes que no son UTF-8)."""
+
+
+def leer_ndjson(stream):
+    """Genera (numero_de_fila, dict | Exception) leyendo un stream NDJSON línea a línea."""
+    for numero, linea in enumerate(stream, start=1):
+        try:
+            # Se decodifica por línea: un byte inválido es un error de esa fila
+            # (UnicodeDecodeError es un ValueError) y no corta la importación.
+            linea = linea.decode('utf-8')
+            if not linea.strip():
+                continue
+            fila = json.loads(linea)
+            if not isinstance(fila, dict):
+                raise ValueError("Cada línea debe ser un objeto JSON.")
+            yield numero, fila
+        except ValueError as e:
+            yield numero, e
+
+
+def leer_csv(stream):
+    """
+    Genera (numero_de_fila, dict | Exception) leyendo un CSV con encabezado,
+    fila a fila. Si el archivo deja de poder leerse genera un ErrorDeLectura
+    y termina.
+    """
+    lector = csv.DictReader(linea.decode('utf-8') for linea in stream)
+    while True:
+        try:
+            fila = next(lector)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as e:
+            yield lector.line_num + 1, ErrorDeLectura(f"No se pudo seguir leyendo el CSV: {e}")
+            return
+        fila = {clave: valor for clave, valor in fila.items() if clave and valor not in (None, '')}
+        if 'imagenes' in fila:
+            fila['imagenes'] = [url.strip() for url in fila['imagenes'].split(SEPARADOR_IMAGENES) if url.strip()]
+        yield lector.line_num, fila
+
+
+def validar_fila(fila):
+    """
+    Normaliza una fila de importación. Lanza ValueError si es inválida.
+    Las filas sin 'id' crean productos y deben traer todos los campos obligatorios;
+    las filas con 'id' actualizan solo los campos presentes.
+    """
+    datos = {}
+    if fila.get('id') not in (None, ''):
+        try:
+            datos['id'] = int(fila['id'])
+        except (TypeError, ValueError):
+            raise ValueError("'id' debe ser un entero.")
+    else:
+        faltantes = [campo for campo in CAMPOS_OBLIGATORIOS if fila.get(campo) in (None, '')]
+        if faltantes:
+            raise ValueError(f"Faltan campos obligatorios: {', '.join(faltantes)}.")
+
+    try:
+        if 'precio' in fila:
+            datos['precio'] = float(fila['precio'])
+            if datos['precio'] < 0:
+                raise ValueError
+        if 'stock' in fila:
+            datos['stock'] = int(fila['stock'])
+            if datos['stock'] < 0:
+                raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError("'precio' y 'stock' deben ser números no negativos.")
+
+    for campo in ('nombre', 'descripcion', 'categoria'):
+        if campo in fila:
+            datos[campo] = str(fila[campo])
+
+    if 'imagenes' in fila:
+        if not isinstance(fila['imagenes'], list) or not all(isinstance(url, str) for url in fila['imagenes']):
+            raise ValueError("'imagenes' debe ser una lista de URLs.")
+        datos['imagenes'] = fila['imagenes']
+
+    if len(datos) == (1 if 'id' in datos else 0):
+        raise ValueError("La fila no tiene campos para actualizar.")
+    return datos
+
+
+# --- IMPORTACIÓN ---
+
+class ImportadorProductos:
+    """
+    Aplica filas ya validadas a Supabase en lotes.
+
+    Por lote hace, como mucho: una lectura de los productos existentes, un
+    update por cada conjunto distinto de cambios, un insert de los nuevos,
+    una lectura de las URLs ya registradas y un insert de las imágenes
+    nuevas. Si una de esas sentencias falla, solo esa etapa se reintenta fila
+    por fila para aislar el error (las etapas ya aplicadas no se repiten).
+    """
+
+    def __init__(self, supabase, tamano_lote=TAMANO_LOTE):
+        self._supabase = supabase
+        self._tamano_lote = tamano_lote
+        self.resumen = {"procesadas": 0, "creadas": 0, "actualizadas": 0, "imagenes_agregadas": 0, "errores": []}
+
+    def importar(self, filas):
+        """Consume un iterable de (numero_de_fila, dict | Exception) y devuelve el resumen."""
+        lote = []
+        for numero, fila in filas:
+            self.resumen["procesadas"] += 1
+            try:
+                if isinstance(fila, Exception):
+                    raise fila
+                lote.append((numero, validar_fila(fila)))
+            except ValueError as e:
+                self._error(numero, e)
+                if isinstance(e, ErrorDeLectura):
+                    break  # se aplica lo leído hasta acá y se corta
+                continue
+            if len(lote) >= self._tamano_lote:
+                self._aplicar_lote(lote)
+                lote = []
+        if lote:
+            self._aplicar_lote(lote)
+        return self.resumen
+
+    def _error(self, numero, error):
+        self.resumen["errores"].append({"fila": numero, "error": str(error)})
+
+    def _aplicar_lote(self, lote):
+        actualizaciones = [(numero, datos) for numero, datos in lote if 'id' in datos]
+        nuevos = [(numero, datos) for numero, datos in lote if 'id' not in datos]
+        imagenes = []  # (numero_de_fila, producto_id, urls)
+
+        if actualizaciones:
+            self._por_partes(actualizaciones, lambda items: imagenes.extend(self._actualizar(items)))
+        if nuevos:
+            self._por_partes(nuevos, lambda items: imagenes.extend(self._crear(items)))
+        if imagenes:
+            self._por_partes(imagenes, self._agregar_imagenes)
+
+    def _por_partes(self, items, aplicar):
+        """
+        Aplica `items` con una sola sentencia. Si la base la rechaza, reintenta
+        de a un item para reportar exactamente qué filas tienen problemas.
+        """
+        try:
+            aplicar(items)
+            return
+        except Exception as e:
+            if len(items) == 1:
+                self._error(items[0][0], e)
+                return
+        for item in items:
+            try:
+                aplicar([item])
+            except Exception as e:
+                self._error(item[0], e)
+
+    def _actualizar(self, actualizaciones):
+        """Actualiza solo las columnas que trae cada fila. Devuelve las imágenes a agregar."""
+        ids = [datos['id'] for _, datos in actualizaciones]
+        existentes = {
+            fila['ProductoID'] for fila in
+            self._supabase.table('Productos').select('ProductoID').in_('ProductoID', ids).execute().data
+        }
+        cambios = {}  # ProductoID -> {columna: valor}
+        imagenes = []
+        faltantes = []
+        for numero, datos in actualizaciones:
+            if datos['id'] not in existentes:
+                faltantes.append((numero, datos['id']))
+                continue
+            cambios.setdefault(datos['id'], {}).update(
+                {COLUMNAS_PRODUCTO[campo]: valor for campo, valor in datos.items() if campo in COLUMNAS_PRODUCTO}
+            )
+            if 'imagenes' in datos:
+                imagenes.append((numero, datos['id'], datos['imagenes']))
+
+        # Nunca se reescriben columnas que la fila no trae (p. ej. el Stock que
+        # una compra acaba de descontar). Los productos con exactamente los
+        # mismos cambios comparten un UPDATE ... WHERE ProductoID IN (...).
+        grupos = {}
+        for producto_id, columnas in cambios.items():
+            if columnas:
+                grupos.setdefault(tuple(sorted(columnas.items())), []).append(producto_id)
+        for columnas, ids_grupo in grupos.items():
+            self._supabase.table('Productos').update(dict(columnas)).in_('ProductoID', ids_grupo).execute()
+        self.resumen["actualizadas"] += len(cambios)
+        # Recién ahora: si un UPDATE falla, _por_partes reintenta de a una fila
+        # y cada faltante (o actualizada) se contaría dos veces.
+        for numero, producto_id in faltantes:
+            self._error(numero, f"No existe un producto con id {producto_id}.")
+        return imagenes
+
+    def _crear(self, nuevos):
+        """Insert de productos nuevos. Devuelve las imágenes a agregar."""
+        filas_insert = [
+            {COLUMNAS_PRODUCTO[campo]: datos.get(campo, '' if campo == 'descripcion' else None) for campo in COLUMNAS_PRODUCTO}
+            for _, datos in nuevos
+        ]
+        creados = self._supabase.table('Productos').insert(filas_insert).execute().data
+        self.resumen["creadas"] += len(creados)
+        # PostgREST devuelve las filas insertadas en el mismo orden en que se enviaron.
+        return [
+            (numero, creado['ProductoID'], datos['imagenes'])
+            for (numero, datos), creado in zip(nuevos, creados) if datos.get('imagenes')
+        ]
+
+    def _agregar_imagenes(self, imagenes):
+        """Inserta en una sola sentencia las URLs que cada producto todavía no tiene."""
+        registradas = {
+            (fila['ProductoID'], fila['URL']) for fila in
+            self._supabase.table('ImagenesProducto').select('ProductoID, URL')
+            .in_('ProductoID', list({producto_id for _, producto_id, _ in imagenes})).execute().data
+        }
+        nuevas = []
+        for _, producto_id, urls in imagenes:
+            for url in urls:
+                if (producto_id, url) not in registradas:
+                    registradas.add((producto_id, url))
+                    nuevas.append(fila_imagen(producto_id, url))
+        if nuevas:
+            self._supabase.table('ImagenesProducto').insert(nuevas).execute()
+            self.resumen["imagenes_agregadas"] += len(nuevas)
+
+
+# --- EXPORTACIÓN ---
+
+def recorrer_productos(supabase, tamano_pagina=500):
+    """Genera los productos (formato de la API) paginando por ProductoID, sin cargar todo el catálogo."""
+    ultimo_id = 0
+    while True:
+        pagina = supabase.table('Productos').select('*, ImagenesProducto(URL)') \
+            .gt('ProductoID', ultimo_id).order('ProductoID').limit(tamano_pagina).execute().data
+        for prod in pagina:
+            yield {
+                "id": prod['ProductoID'],
+                "nombre": prod['Nombre'],
+                "descripcion": prod['Descripcion'],
+                "precio": float(prod['Precio']),
+                "stock": prod['Stock'],
+                "categoria": prod['Categoria'],
+                "imagenes": [img['URL'] for img in prod.get('ImagenesProducto', [])]
+            }
+        if len(pagina) < tamano_pagina:
+            return
+        ultimo_id = pagina[-1]['ProductoID']
+
+
+def exportar_ndjson(productos):
+    for producto in productos:
+        yield json.dumps(producto, ensure_ascii=False) + '\n'
+
+
+def exportar_csv(productos):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS_CSV)
+    escritor.writeheader()
+    for producto in productos:
+        escritor.writerow({**producto, "imagenes": SEPARADOR_IMAGENES.join(producto["imagenes"])})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,124 @@
+import threading
+
+VENTANA = 0.005  # segundos que el primer checkout espera a que lleguen otros
+MAX_LOTE = 50
+
+
+class FuncionLoteNoDisponible(Exception):
+    """La función por lotes no existe en la base (todavía no se aplicó el SQL)."""
+
+
+def validar_carrito(carrito, productos):
+    """
+    Rechazo rápido contra la foto del catálogo en memoria. Devuelve un mensaje
+    de error si el carrito es imposible, o None si vale la pena intentarlo.
+
+    La base sigue siendo la que decide: un producto que la foto no conoce
+    (p. ej. recién creado en otro worker) se deja pasar.
+    """
+    if not isinstance(carrito, list) or not carrito:
+        return "El carrito está vacío o tiene un formato inválido."
+
+    pedidos = {}
+    for item in carrito:
+        try:
+            producto_id = int(item['id'])
+            cantidad = int(item.get('cantidad', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return "Cada producto del carrito debe tener 'id' y 'cantidad'."
+        if cantidad <= 0:
+            return "Las cantidades deben ser mayores a cero."
+        pedidos[producto_id] = pedidos.get(producto_id, 0) + cantidad
+
+    por_id = {producto['id']: producto for producto in productos}
+    for producto_id, cantidad in pedidos.items():
+        producto = por_id.get(producto_id)
+        if producto is not None and producto['stock'] < cantidad:
+            return f"Error: stock insuficiente para '{producto['nombre']}' (disponible: {producto['stock']})."
+    return None
+
+
+class _Pedido:
+    __slots__ = ('carrito', 'resultado', 'error', 'listo')
+
+    def __init__(self, carrito):
+        self.carrito = carrito
+        self.resultado = None
+        self.error = None
+        self.listo = threading.Event()
+
+
+class AgrupadorCheckout:
+    """
+    Group commit de checkouts concurrentes.
+
+    El primer pedido que llega abre una ventana de `ventana` segundos (o hasta
+    juntar `max_lote`); los que llegan mientras tanto se suman al lote y ese
+    primer hilo los confirma todos con una sola llamada a
+    `confirmar_lote(carritos) -> [(ok, mensaje)]`. Cada pedido recibe su
+    propio resultado.
+
+    Si `confirmar_lote` lanza FuncionLoteNoDisponible, el lote se confirma
+    carrito por carrito con `confirmar_uno` y el agrupador queda inactivo.
+    """
+
+    def __init__(self, confirmar_lote, confirmar_uno, ventana=VENTANA, max_lote=MAX_LOTE):
+        self._confirmar_lote = confirmar_lote
+        self._confirmar_uno = confirmar_uno
+        self._ventana = ventana
+        self._max_lote = max_lote
+        self._lock = threading.Lock()
+        self._lleno = threading.Event()
+        self._pendientes = []
+        self._hay_lider = False
+        self.activo = True
+
+    def confirmar(self, carrito):
+        """Confirma un carrito (bloquea hasta tener el resultado). Devuelve (ok, mensaje)."""
+        pedido = _Pedido(carrito)
+        with self._lock:
+            self._pendientes.append(pedido)
+            lider = not self._hay_lider
+            self._hay_lider = True
+            if len(self._pendientes) >= self._max_lote:
+                self._lleno.set()
+
+        if lider:
+            self._lleno.wait(self._ventana)
+            with self._lock:
+                lote, self._pendientes = self._pendientes, []
+                self._hay_lider = False
+                self._lleno.clear()
+            self._ejecutar(lote)
+
+        pedido.listo.wait()
+        if pedido.error is not None:
+            raise pedido.error
+        return pedido.resultado
+
+    def _ejecutar(self, lote):
+        try:
+            carritos = [pedido.carrito for pedido in lote]
+            try:
+                resultados = self._confirmar_lote(carritos)
+            except FuncionLoteNoDisponible:
+                self.activo = False
+                self._ejecutar_de_a_uno(lote)
+                return
+            if len(resultados) != len(lote):
+                raise RuntimeError("La confirmación por lotes devolvió una cantidad de resultados inesperada.")
+            for pedido, resultado in zip(lote, resultados):
+                pedido.resultado = resultado
+        except Exception as e:
+            for pedido in lote:
+                pedido.error = e
+        finally:
+            for pedido in lote:
+                pedido.listo.set()
+
+    def _ejecutar_de_a_uno(self, lote):
+        for pedido in lote:
+            try:
+                pedido.resultado = self._confirmar_uno(pedido.carrito)
+            except Exception as e:
+                pedido.error = e
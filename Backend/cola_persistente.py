@@ -0,0 +1,193 @@
+import abc
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ColaPersistente:
+    """
+    Cola de trabajos durable sobre un archivo SQLite local.
+
+    Cada trabajo es un dict serializado a JSON. Los consumidores "reclaman"
+    un lote por un tiempo (`lease`); si el proceso muere antes de completarlo,
+    el lote vuelve a estar disponible al vencer el reclamo. Como el estado vive
+    en el archivo, varios workers de gunicorn pueden compartir la misma cola.
+    """
+
+    def __init__(self, ruta, tabla, max_intentos=8):
+        self._ruta = ruta
+        self._tabla = tabla
+        self._max_intentos = max_intentos
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    datos TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    disponible_desde REAL NOT NULL,
+                    reclamado_hasta REAL NOT NULL DEFAULT 0,
+                    ultimo_error TEXT,
+                    creado REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {tabla}_pendientes ON {tabla} (estado, disponible_desde)")
+
+    @contextmanager
+    def _conectar(self, transaccion=False):
+        # Una conexión por operación: sqlite3 no comparte conexiones entre hilos.
+        conn = sqlite3.connect(self._ruta, timeout=10, isolation_level=None)
+        try:
+            if transaccion:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                yield conn
+        finally:
+            conn.close()
+
+    def encolar(self, datos, demora=0):
+        """Agrega un trabajo y devuelve su id."""
+        ahora = time.time()
+        with self._conectar() as conn:
+            cur = conn.execute(
+                f"INSERT INTO {self._tabla} (datos, disponible_desde, creado) VALUES (?, ?, ?)",
+                (json.dumps(datos), ahora + demora, ahora)
+            )
+            return cur.lastrowid
+
+    def encolar_varios(self, lista_datos):
+        """Agrega varios trabajos en una sola transacción."""
+        ahora = time.time()
+        with self._conectar(transaccion=True) as conn:
+            conn.executemany(
+                f"INSERT INTO {self._tabla} (datos, disponible_desde, creado) VALUES (?, ?, ?)",
+                [(json.dumps(datos), ahora, ahora) for datos in lista_datos]
+            )
+
+    def reclamar(self, cantidad, lease=120):
+        """Reserva hasta `cantidad` trabajos listos. Devuelve [(id, datos, intentos)]."""
+        ahora = time.time()
+        with self._conectar(transaccion=True) as conn:
+            filas = conn.execute(
+                f"""SELECT id, datos, intentos FROM {self._tabla}
+                    WHERE estado = 'pendiente' AND disponible_desde <= ? AND reclamado_hasta <= ?
+                    ORDER BY id LIMIT ?""",
+                (ahora, ahora, cantidad)
+            ).fetchall()
+            if filas:
+                conn.executemany(
+                    f"UPDATE {self._tabla} SET reclamado_hasta = ? WHERE id = ?",
+                    [(ahora + lease, fila[0]) for fila in filas]
+                )
+        return [(id_, json.loads(datos), intentos) for id_, datos, intentos in filas]
+
+    def renovar(self, ids, lease):
+        """Extiende el reclamo de trabajos que todavía se están procesando."""
+        if not ids:
+            return
+        hasta = time.time() + lease
+        with self._conectar(transaccion=True) as conn:
+            conn.executemany(
+                f"UPDATE {self._tabla} SET reclamado_hasta = ? WHERE id = ? AND estado = 'pendiente'",
+                [(hasta, id_) for id_ in ids]
+            )
+
+    def completar(self, ids):
+        """Elimina de la cola los trabajos terminados."""
+        if not ids:
+            return
+        with self._conectar(transaccion=True) as conn:
+            conn.executemany(f"DELETE FROM {self._tabla} WHERE id = ?", [(id_,) for id_ in ids])
+
+    def reintentar(self, id_, error, intentos_previos, demora_base=5, demora_max=3600):
+        """
+        Registra un fallo. El trabajo vuelve a estar disponible tras un backoff
+        exponencial, o queda como 'fallido' si agotó los intentos.
+        """
+        intentos = intentos_previos + 1
+        estado = 'fallido' if intentos >= self._max_intentos else 'pendiente'
+        demora = min(demora_base * (2 ** intentos_previos), demora_max)
+        with self._conectar() as conn:
+            conn.execute(
+                f"""UPDATE {self._tabla}
+                    SET estado = ?, intentos = ?, disponible_desde = ?, reclamado_hasta = 0, ultimo_error = ?
+                    WHERE id = ?""",
+                (estado, intentos, time.time() + demora, str(error)[:500], id_)
+            )
+
+    def contar(self):
+        """Devuelve {'pendiente': n, 'fallido': m} con la profundidad de la cola."""
+        with self._conectar() as conn:
+            filas = conn.execute(f"SELECT estado, COUNT(*) FROM {self._tabla} GROUP BY estado").fetchall()
+        conteo = {'pendiente': 0, 'fallido': 0}
+        conteo.update(dict(filas))
+        return conteo
+
+
+class TrabajadorCola(abc.ABC):
+    """
+    Hilo en segundo plano que procesa una cola por lotes.
+
+    Las subclases implementan `procesar_pendientes()` (devuelve cuántos
+    trabajos procesó) y, opcionalmente, `_en_reposo()`, que se llama cada vez
+    que la cola queda vacía.
+    """
+
+    nombre_hilo = "trabajador-cola"
+    espera_sin_trabajo = 5  # segundos entre revisiones de la cola cuando está vacía
+
+    def __init__(self):
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """Arranca el hilo (idempotente)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name=self.nombre_hilo, daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=10):
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def despertar(self):
+        """Avisa al hilo que hay trabajo nuevo, sin esperar a la próxima revisión."""
+        self._despertar.set()
+
+    @abc.abstractmethod
+    def procesar_pendientes(self):
+        """Procesa un lote de la cola y devuelve cuántos trabajos procesó."""
+
+    def _en_reposo(self):
+        pass
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                procesados = self.procesar_pendientes()
+            except Exception as e:
+                print(f"Error en {self.nombre_hilo}: {e}")
+                procesados = 0
+
+            if procesados:
+                continue
+            try:
+                self._en_reposo()
+            except Exception as e:
+                print(f"Error en {self.nombre_hilo}: {e}")
+            self._despertar.wait(self.espera_sin_trabajo)
+            self._despertar.clear()
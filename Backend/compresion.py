@@ -0,0 +1,61 @@
+"""
+Compresión de respuestas negociada por Accept-Encoding (br si está
+instalado `brotli`, si no gzip).
+
+Los cuerpos que se repiten (el catálogo en caché) se comprimen una sola vez
+por versión con `CuerpoComprimible`; el resto se comprime al vuelo con un
+nivel más bajo.
+"""
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo se ofrece gzip
+    brotli = None
+
+MINIMO_BYTES = 1024  # por debajo no vale la pena comprimir
+CODIFICACIONES = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def elegir_codificacion(accept_encoding):
+    """La codificación soportada con mayor q en Accept-Encoding (br ante empate), o None."""
+    aceptadas = {}
+    for parte in (accept_encoding or '').split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    comodin = aceptadas.get('*', 0.0)
+    candidatas = [(aceptadas.get(c, comodin), c) for c in CODIFICACIONES]
+    q, mejor = max(candidatas, key=lambda candidata: candidata[0])
+    return mejor if q > 0 else None
+
+
+def comprimir(datos, codificacion, rapido=True):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=5 if rapido else 9)
+    return gzip.compress(datos, compresslevel=6 if rapido else 9, mtime=0)
+
+
+class CuerpoComprimible:
+    """Un cuerpo fijo con sus versiones comprimidas, calculadas una vez cuando se piden."""
+
+    def __init__(self, cuerpo):
+        self.cuerpo = cuerpo
+        self._comprimidos = {}
+        self._lock = threading.Lock()
+
+    def en(self, codificacion):
+        comprimido = self._comprimidos.get(codificacion)
+        if comprimido is None:
+            with self._lock:
+                comprimido = self._comprimidos.get(codificacion)
+                if comprimido is None:
+                    comprimido = self._comprimidos[codificacion] = comprimir(self.cuerpo, codificacion, rapido=False)
+        return comprimido
@@ -0,0 +1,248 @@
+"""
+Cambios de stock y precio en vivo para los navegadores, por Server-Sent Events
+(GET /api/stream/stock).
+
+Un `DifusorStock` por proceso guarda el último stock y precio conocidos de
+cada producto y publica solo lo que cambió, como eventos numerados en un
+buffer circular:
+
+    id: <época>-<n>
+    event: stock
+    data: [{"id": 3, "stock": 2, "precio": 45000.0}, {"id": 9, "eliminado": true}]
+
+Un cliente que se reconecta con Last-Event-ID recibe los eventos que se
+perdió; si ese ID ya salió del buffer (o es de otro proceso: la época cambia
+con cada proceso) recibe un único evento con el estado de todo el catálogo.
+
+Los cambios llegan por `actualizar`, que descarta lo que ya se conocía, así
+que pueden alimentarlo varias fuentes a la vez sin duplicar eventos:
+  - cada recarga de la caché del catálogo (servidor.py la adelanta después de
+    las escrituras propias si hay clientes conectados);
+  - opcionalmente Supabase Realtime (`SuscripcionRealtime`, una sola
+    suscripción por proceso), que ve también las escrituras de otros procesos.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from serializacion import serializar
+
+try:
+    from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+except ImportError:  # Opcional: sin realtime solo se usan las recargas del catálogo
+    AsyncRealtimeClient = RealtimeSubscribeStates = None
+
+REINTENTO_MS = 3000  # cuánto espera el navegador antes de reconectarse
+LATIDO = b": latido\n\n"
+
+
+class DifusorStock:
+    """
+    Reparte los cambios de stock/precio a los clientes conectados (tareas de
+    asyncio con `flujo_async`). Thread-safe: las fuentes publican desde otros
+    hilos.
+    """
+
+    def __init__(self, capacidad=1000, latido=15):
+        self.epoca = format(time.time_ns() // 1_000_000, 'x')
+        self.latido = latido
+        self.clientes = 0
+        self._eventos = deque(maxlen=capacidad)  # (número, evento SSE en bytes)
+        self._numero = 0
+        self._estado = {}  # id -> {"id", "stock", "precio"}
+        self._iniciado = False
+        self._lock = threading.Lock()
+        self._esperas_async = set()  # (loop, asyncio.Event) de cada cliente asíncrono
+
+    # --- Fuentes ---
+
+    def actualizar(self, productos, completo=True):
+        """
+        Compara `productos` (dicts con id, stock y precio) con el estado conocido
+        y publica las diferencias. Con `completo` es el catálogo entero: los que
+        ya no están se publican como eliminados. La primera carga completa solo
+        fija el estado.
+        """
+        with self._lock:
+            cambios = []
+            for prod in productos:
+                valor = {"id": prod['id'], "stock": prod['stock'], "precio": prod['precio']}
+                if self._estado.get(prod['id']) != valor:
+                    self._estado[prod['id']] = valor
+                    cambios.append(valor)
+            if completo:
+                vigentes = {prod['id'] for prod in productos}
+                for producto_id in [i for i in self._estado if i not in vigentes]:
+                    del self._estado[producto_id]
+                    cambios.append({"id": producto_id, "eliminado": True})
+                if not self._iniciado:
+                    self._iniciado = True
+                    return
+            if cambios:
+                self._publicar(cambios)
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            if self._estado.pop(producto_id, None) is not None:
+                self._publicar([{"id": producto_id, "eliminado": True}])
+
+    # --- Clientes ---
+
+    def entrar(self, maximo):
+        """Reserva un lugar para un cliente. False si ya hay `maximo` conectados."""
+        with self._lock:
+            if self.clientes >= maximo:
+                return False
+            self.clientes += 1
+            return True
+
+    def salir(self):
+        with self._lock:
+            self.clientes -= 1
+
+    async def flujo_async(self, ultimo_id=None):
+        """
+        Eventos SSE (bytes) para un cliente, desde `ultimo_id` (Last-Event-ID),
+        en el event loop (sin ocupar un hilo por cliente).
+        """
+        espera = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._esperas_async.add(espera)
+            pendientes, numero = self._inicio(ultimo_id)
+        try:
+            yield f"retry: {REINTENTO_MS}\n\n".encode()
+            for evento in pendientes:
+                yield evento
+            while True:
+                try:
+                    await asyncio.wait_for(espera[1].wait(), self.latido)
+                except asyncio.TimeoutError:
+                    yield LATIDO
+                espera[1].clear()
+                with self._lock:
+                    nuevos, numero = self._siguientes(numero)
+                for evento in nuevos:
+                    yield evento
+        finally:
+            with self._lock:
+                self._esperas_async.discard(espera)
+
+    # --- Internos (con self._lock tomado) ---
+
+    def _publicar(self, cambios):
+        self._numero += 1
+        self._eventos.append((self._numero, self._evento(self._numero, cambios)))
+        for loop, evento in list(self._esperas_async):
+            try:
+                loop.call_soon_threadsafe(evento.set)
+            except RuntimeError:  # el loop ya se cerró
+                self._esperas_async.discard((loop, evento))
+
+    def _evento(self, numero, cambios):
+        return b"id: %s-%d\nevent: stock\ndata: %s\n\n" % (self.epoca.encode(), numero, serializar(cambios))
+
+    def _inicio(self, ultimo_id):
+        """(eventos a mandar al conectarse, número desde el que sigue el cliente)."""
+        if not ultimo_id:
+            return [], self._numero
+        epoca, _, numero = ultimo_id.partition('-')
+        try:
+            numero = int(numero)
+        except ValueError:
+            numero = -1
+        if epoca != self.epoca or not 0 <= numero <= self._numero:
+            return [self._evento(self._numero, list(self._estado.values()))], self._numero
+        return self._siguientes(numero)
+
+    def _siguientes(self, numero):
+        """Eventos posteriores a `numero`; el estado completo si alguno ya salió del buffer."""
+        if numero == self._numero:
+            return [], numero
+        if not self._eventos or self._eventos[0][0] > numero + 1:
+            return [self._evento(self._numero, list(self._estado.values()))], self._numero
+        return [evento for n, evento in self._eventos if n > numero], self._numero
+
+
+class SuscripcionRealtime:
+    """
+    Suscripción a los cambios de una tabla por Supabase Realtime, en un hilo
+    propio con su event loop. La tabla tiene que estar en la publicación
+    supabase_realtime (ver sql/realtime_productos.sql).
+
+    `al_cambiar(tipo, fila)` recibe cada INSERT/UPDATE/DELETE (en DELETE,
+    la fila vieja); `al_conectar()` se llama tras cada (re)suscripción, para
+    recuperar lo que haya cambiado mientras no había conexión.
+
+    Los cortes de red los reintenta el propio cliente (auto_reconnect, que
+    vuelve a unir el canal); si el canal informa un error, vence o se cierra,
+    o el cliente queda desconectado, se descarta y se arma uno nuevo tras
+    `reintento` segundos. Solo se usa la API pública de realtime.
+    """
+
+    def __init__(self, url, key, al_cambiar, al_conectar=None, tabla='Productos', reintento=5):
+        self._url = f"{url.rstrip('/')}/realtime/v1"
+        self._key = key
+        self._al_cambiar = al_cambiar
+        self._al_conectar = al_conectar
+        self._tabla = tabla
+        self._reintento = reintento
+        self._detenido = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if AsyncRealtimeClient is None:
+            print("AVISO: no está instalado 'realtime'; el stock en vivo sigue solo las recargas del catálogo.")
+            return self
+        self._hilo = threading.Thread(target=asyncio.run, args=(self._mantener(),), name="stock-realtime", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detenido.set()
+
+    async def _mantener(self):
+        while not self._detenido.is_set():
+            cliente = AsyncRealtimeClient(
+                self._url, token=self._key, auto_reconnect=True,
+                max_retries=1_000_000, initial_backoff=self._reintento
+            )
+            caido = asyncio.Event()
+            pendientes = set()  # tareas de al_conectar en curso
+
+            def al_cambiar_estado(estado, error):
+                if estado == RealtimeSubscribeStates.SUBSCRIBED:
+                    print(f"Supabase Realtime: suscripto a los cambios de {self._tabla}.")
+                    if self._al_conectar is not None:
+                        tarea = asyncio.ensure_future(asyncio.to_thread(self._al_conectar))
+                        pendientes.add(tarea)
+                        tarea.add_done_callback(pendientes.discard)
+                else:
+                    print(f"Supabase Realtime: canal {estado.value}{f' ({error})' if error else ''}.")
+                    caido.set()
+
+            try:
+                canal = cliente.channel(f"stock-{self._tabla}")
+                canal.on_postgres_changes('*', table=self._tabla, callback=self._recibir)
+                await canal.subscribe(al_cambiar_estado)
+                while not self._detenido.is_set() and not caido.is_set() and cliente.is_connected:
+                    await asyncio.sleep(1)
+            except Exception as e:
+                print(f"Supabase Realtime: {e}")
+            finally:
+                try:
+                    await cliente.close()
+                except Exception:
+                    pass
+            if not self._detenido.is_set():
+                await asyncio.sleep(self._reintento)
+
+    def _recibir(self, payload):
+        datos = payload.get('data', {})
+        fila = datos.get('old_record') if datos.get('type') == 'DELETE' else datos.get('record')
+        if not fila:
+            return
+        try:
+            self._al_cambiar(datos['type'], fila)
+        except Exception as e:
+            print(f"Error al procesar un cambio de Supabase Realtime: {e}")
@@ -0,0 +1,92 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+
+VIGENCIA = 24 * 3600  # segundos que se recuerda la respuesta de una clave
+LEASE = 60  # una clave 'en_curso' más vieja que esto se considera abandonada
+
+
+class RegistroIdempotencia:
+    """
+    Respuestas ya dadas por clave de idempotencia (header Idempotency-Key).
+
+    `reservar` marca la clave como en curso o devuelve la respuesta guardada
+    si la operación ya terminó; `guardar` fija la respuesta definitiva y
+    `liberar` la borra (p. ej. tras un error transitorio, para permitir el
+    reintento). Cada clave guarda la huella (hash) del cuerpo con que se usó,
+    para no devolver la respuesta de otro pedido. Vive en SQLite para que
+    todos los workers de gunicorn vean las mismas claves.
+    """
+
+    def __init__(self, ruta, tabla='idempotencia'):
+        self._ruta = ruta
+        self._tabla = tabla
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla} (
+                    clave TEXT PRIMARY KEY,
+                    estado TEXT NOT NULL,
+                    respuesta TEXT,
+                    codigo INTEGER,
+                    creado REAL NOT NULL,
+                    huella TEXT
+                )
+            """)
+
+    @contextmanager
+    def _conectar(self, transaccion=False):
+        conn = sqlite3.connect(self._ruta, timeout=10, isolation_level=None)
+        try:
+            if transaccion:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                yield conn
+        finally:
+            conn.close()
+
+    def reservar(self, clave, huella=None):
+        """
+        Devuelve ('nueva', None) si la clave quedó reservada para este pedido,
+        ('en_curso', None) si otro pedido con la misma clave sigue procesándose,
+        ('completa', (respuesta, codigo)) si ya hay una respuesta guardada, o
+        ('distinta', None) si la clave se usó con otra `huella` (otro cuerpo).
+        """
+        ahora = time.time()
+        with self._conectar(transaccion=True) as conn:
+            conn.execute(f"DELETE FROM {self._tabla} WHERE creado < ?", (ahora - VIGENCIA,))
+            fila = conn.execute(
+                f"SELECT estado, respuesta, codigo, creado, huella FROM {self._tabla} WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is not None:
+                estado, respuesta, codigo, creado, huella_guardada = fila
+                vigente = estado == 'completa' or ahora - creado < LEASE
+                if vigente and huella_guardada != huella:
+                    return 'distinta', None
+                if estado == 'completa':
+                    return 'completa', (json.loads(respuesta), codigo)
+                if vigente:
+                    return 'en_curso', None
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self._tabla} (clave, estado, creado, huella) VALUES (?, 'en_curso', ?, ?)",
+                (clave, ahora, huella)
+            )
+            return 'nueva', None
+
+    def guardar(self, clave, respuesta, codigo):
+        with self._conectar() as conn:
+            conn.execute(
+                f"UPDATE {self._tabla} SET estado = 'completa', respuesta = ?, codigo = ?, creado = ? WHERE clave = ?",
+                (json.dumps(respuesta), codigo, time.time(), clave)
+            )
+
+    def liberar(self, clave):
+        with self._conectar() as conn:
+            conn.execute(f"DELETE FROM {self._tabla} WHERE clave = ?", (clave,))
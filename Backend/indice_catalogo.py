@@ -0,0 +1,100 @@
+import bisect
+import unicodedata
+
+# Órdenes aceptados en el parámetro `sort` (un '-' adelante invierte el orden).
+ORDENES_VALIDOS = ('precio', '-precio', 'nombre', '-nombre', 'categoria')
+LIMITE_POR_DEFECTO = 24
+LIMITE_MAXIMO = 100
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y quita tildes, para comparar 'Facón' con 'facon'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+class IndiceCatalogo:
+    """
+    Índice en memoria sobre la lista de productos ya formateada.
+
+    Se construye una sola vez por cada versión del catálogo en caché:
+    - un balde de posiciones por categoría,
+    - un arreglo de posiciones ordenado por precio (para rangos con bisect),
+    - el rango de cada producto en cada orden soportado,
+    - el texto normalizado (nombre + descripción) para el filtro `q`.
+    """
+
+    def __init__(self, productos):
+        self.productos = productos
+        self.por_categoria = {}
+        for pos, prod in enumerate(productos):
+            self.por_categoria.setdefault(normalizar(prod['categoria']), []).append(pos)
+
+        self.por_precio = sorted(range(len(productos)), key=lambda pos: productos[pos]['precio'])
+        self.precios = [productos[pos]['precio'] for pos in self.por_precio]
+
+        por_nombre = sorted(range(len(productos)), key=lambda pos: normalizar(productos[pos]['nombre']))
+        por_categoria_nombre = sorted(
+            range(len(productos)),
+            key=lambda pos: (normalizar(productos[pos]['categoria']), normalizar(productos[pos]['nombre']))
+        )
+        self._ordenes = {
+            'precio': self.por_precio,
+            'nombre': por_nombre,
+            'categoria': por_categoria_nombre,
+        }
+        self._rangos = {clave: self._rangos_de(orden) for clave, orden in self._ordenes.items()}
+        self._textos = [normalizar(f"{p['nombre']} {p.get('descripcion') or ''}") for p in productos]
+
+    @staticmethod
+    def _rangos_de(orden):
+        rangos = [0] * len(orden)
+        for rango, pos in enumerate(orden):
+            rangos[pos] = rango
+        return rangos
+
+    def _posiciones_en_rango(self, precio_min, precio_max):
+        """Posiciones cuyo precio cae en [precio_min, precio_max], ya ordenadas por precio."""
+        desde = 0 if precio_min is None else bisect.bisect_left(self.precios, precio_min)
+        hasta = len(self.precios) if precio_max is None else bisect.bisect_right(self.precios, precio_max)
+        return self.por_precio[desde:hasta]
+
+    def consultar(self, categoria=None, precio_min=None, precio_max=None, q=None,
+                  sort=None, cursor=0, limit=LIMITE_POR_DEFECTO):
+        """
+        Filtra, ordena y pagina el catálogo.
+        Devuelve (productos_de_la_pagina, total_filtrado, siguiente_cursor).
+        """
+        hay_rango = precio_min is not None or precio_max is not None
+
+        if sort and categoria is None and not hay_rango and not q:
+            # Sin filtros, el orden precalculado ya es la respuesta.
+            orden = self._ordenes[sort.lstrip('-')]
+            candidatos = orden[::-1] if sort.startswith('-') else orden
+            return self._paginar(candidatos, cursor, limit)
+
+        if categoria is not None:
+            candidatos = self.por_categoria.get(normalizar(categoria), [])
+            if hay_rango:
+                minimo = float('-inf') if precio_min is None else precio_min
+                maximo = float('inf') if precio_max is None else precio_max
+                candidatos = [pos for pos in candidatos if minimo <= self.productos[pos]['precio'] <= maximo]
+        elif hay_rango:
+            candidatos = self._posiciones_en_rango(precio_min, precio_max)
+        else:
+            candidatos = range(len(self.productos))
+
+        if q:
+            termino = normalizar(q.strip())
+            candidatos = [pos for pos in candidatos if termino in self._textos[pos]]
+
+        if sort:
+            rangos = self._rangos[sort.lstrip('-')]
+            candidatos = sorted(candidatos, key=rangos.__getitem__, reverse=sort.startswith('-'))
+
+        return self._paginar(candidatos, cursor, limit)
+
+    def _paginar(self, candidatos, cursor, limit):
+        pagina = candidatos[cursor:cursor + limit]
+        siguiente = cursor + limit if cursor + limit < len(candidatos) else None
+        return [self.productos[pos] for pos in pagina], len(candidatos), siguiente
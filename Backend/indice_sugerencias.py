@@ -0,0 +1,154 @@
+import bisect
+import re
+import threading
+
+from indice_catalogo import normalizar
+from variantes_imagen import calcular_variantes
+
+MAX_SUGERENCIAS = 5
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenizar(texto):
+    """Divide un texto en tokens normalizados (sin tildes, en minúsculas)."""
+    return _PATRON_TOKEN.findall(normalizar(texto))
+
+
+class _IndiceTokens:
+    """Mapa token -> ids de producto, con la lista de tokens ordenada para buscar por prefijo."""
+
+    def __init__(self):
+        self._ids_por_token = {}
+        self._tokens = []
+
+    def agregar(self, producto_id, tokens):
+        for token in tokens:
+            ids = self._ids_por_token.get(token)
+            if ids is None:
+                self._ids_por_token[token] = ids = set()
+                bisect.insort(self._tokens, token)
+            ids.add(producto_id)
+
+    def quitar(self, producto_id, tokens):
+        for token in tokens:
+            ids = self._ids_por_token.get(token)
+            if ids is None:
+                continue
+            ids.discard(producto_id)
+            if not ids:
+                del self._ids_por_token[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def con_prefijo(self, prefijo):
+        """Ids de los productos que tienen algún token que empieza con `prefijo`."""
+        encontrados = set()
+        pos = bisect.bisect_left(self._tokens, prefijo)
+        while pos < len(self._tokens) and self._tokens[pos].startswith(prefijo):
+            encontrados |= self._ids_por_token[self._tokens[pos]]
+            pos += 1
+        return encontrados
+
+
+class IndiceSugerencias:
+    """
+    Índice de autocompletado por tokens y prefijos, insensible a tildes.
+
+    Mantiene dos índices separados (nombre y descripción) para poder rankear
+    primero las coincidencias en el nombre. Se actualiza de a un producto con
+    `actualizar`/`eliminar` desde las rutas de escritura, y `sincronizar`
+    solo re-indexa los productos cuyo texto cambió.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nombres = _IndiceTokens()
+        self._descripciones = _IndiceTokens()
+        self._productos = {}
+
+    def actualizar(self, producto):
+        """
+        Indexa (o re-indexa) un producto con el formato de la API. Si el dict
+        no trae 'imagenes' se conserva la imagen ya indexada.
+        """
+        with self._lock:
+            self._actualizar(producto)
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            self._quitar(producto_id)
+
+    def sincronizar(self, productos):
+        """Alinea el índice con el catálogo completo, tocando solo lo que cambió."""
+        with self._lock:
+            vigentes = {prod['id'] for prod in productos}
+            for producto_id in list(self._productos):
+                if producto_id not in vigentes:
+                    self._quitar(producto_id)
+            for prod in productos:
+                self._actualizar(prod)
+
+    def buscar(self, q, limite=MAX_SUGERENCIAS):
+        """Devuelve hasta `limite` sugerencias {id, nombre, imagen} para el texto `q`."""
+        terminos = tokenizar(q)
+        if not terminos:
+            return []
+        frase = ' '.join(terminos)
+
+        with self._lock:
+            candidatos = None
+            puntajes = {}
+            for termino in terminos:
+                en_nombre = self._nombres.con_prefijo(termino)
+                coincidentes = en_nombre | self._descripciones.con_prefijo(termino)
+                candidatos = coincidentes if candidatos is None else candidatos & coincidentes
+                if not candidatos:
+                    return []
+                for producto_id in coincidentes:
+                    puntajes[producto_id] = puntajes.get(producto_id, 0) + (2 if producto_id in en_nombre else 1)
+
+            def ranking(producto_id):
+                entrada = self._productos[producto_id]
+                return (
+                    -puntajes[producto_id],
+                    not entrada['nombre_normalizado'].startswith(frase),
+                    len(entrada['nombre_normalizado']),
+                    entrada['nombre_normalizado'],
+                )
+
+            mejores = sorted(candidatos, key=ranking)[:limite]
+            return [dict(self._productos[producto_id]['sugerencia']) for producto_id in mejores]
+
+    def _actualizar(self, producto):
+        producto_id = producto['id']
+        nombre = producto.get('nombre') or ''
+        descripcion = producto.get('descripcion') or ''
+        anterior = self._productos.get(producto_id)
+        if 'imagenes' in producto:
+            # Las sugerencias muestran la miniatura, no el original.
+            imagen = calcular_variantes(producto['imagenes'][0])['thumb'] if producto['imagenes'] else None
+        else:
+            # Las rutas que no tocan imágenes conservan la miniatura conocida.
+            imagen = anterior['sugerencia']['imagen'] if anterior else None
+
+        if anterior is not None and anterior['texto'] == (nombre, descripcion):
+            anterior['sugerencia']['imagen'] = imagen
+            return
+        self._quitar(producto_id)
+
+        tokens_nombre = set(tokenizar(nombre))
+        tokens_descripcion = set(tokenizar(descripcion))
+        self._nombres.agregar(producto_id, tokens_nombre)
+        self._descripciones.agregar(producto_id, tokens_descripcion)
+        self._productos[producto_id] = {
+            'texto': (nombre, descripcion),
+            'tokens_nombre': tokens_nombre,
+            'tokens_descripcion': tokens_descripcion,
+            'nombre_normalizado': ' '.join(tokenizar(nombre)),
+            'sugerencia': {'id': producto_id, 'nombre': nombre, 'imagen': imagen},
+        }
+
+    def _quitar(self, producto_id):
+        anterior = self._productos.pop(producto_id, None)
+        if anterior is not None:
+            self._nombres.quitar(producto_id, anterior['tokens_nombre'])
+            self._descripciones.quitar(producto_id, anterior['tokens_descripcion'])
@@ -0,0 +1,188 @@
+"""
+Lecturas calientes directo contra Postgres (sin pasar por PostgREST).
+
+Solo lectura: las escrituras siguen por el cliente de Supabase. Devuelve las
+filas con la misma forma que PostgREST (`ProductoID`, ..., `ImagenesProducto`)
+para que el formateo de servidor.py sea el mismo por ambos caminos.
+
+Usa sentencias preparadas por conexión, así que necesita una conexión de
+sesión (directa o pooler en modo session, puerto 5432); el pooler en modo
+transaction (6543) no las admite: en ese caso usar LECTURA_PG_PREPARADAS=0.
+"""
+import os
+import threading
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from metricas import medir_upstream
+
+CONSULTAS = ('catalogo', 'producto', 'lote', 'rol')
+
+# Cada producto con sus imágenes en una sola fila: json_agg arma la lista y
+# to_jsonb(i) incluye las columnas que existan (p. ej. Variantes).
+_SELECT_PRODUCTOS = """
+    SELECT p."ProductoID", p."Nombre", p."Descripcion", p."Precio", p."Stock", p."Categoria",
+           COALESCE(
+               json_agg(to_jsonb(i) ORDER BY i."ImagenID") FILTER (WHERE i."ImagenID" IS NOT NULL),
+               '[]'
+           ) AS "ImagenesProducto"
+    FROM "Productos" p
+    LEFT JOIN "ImagenesProducto" i ON i."ProductoID" = p."ProductoID"
+"""
+SENTENCIAS = {
+    'catalogo': (
+        '',
+        _SELECT_PRODUCTOS + ' GROUP BY p."ProductoID" ORDER BY p."ProductoID"',
+    ),
+    'producto': (
+        '(integer)',
+        _SELECT_PRODUCTOS + ' WHERE p."ProductoID" = $1 GROUP BY p."ProductoID"',
+    ),
+    'lote': (
+        '(integer[])',
+        _SELECT_PRODUCTOS + ' WHERE p."ProductoID" = ANY($1) GROUP BY p."ProductoID"',
+    ),
+    'rol': (
+        '(uuid)',
+        'SELECT role FROM profiles WHERE id = $1',
+    ),
+}
+COLUMNAS_PRODUCTO = ('ProductoID', 'Nombre', 'Descripcion', 'Precio', 'Stock', 'Categoria', 'ImagenesProducto')
+
+
+class _Conexion(psycopg2.extensions.connection):
+    """Conexión que recuerda si ya tiene las sentencias preparadas."""
+    preparada = False
+
+
+class LectorPostgres:
+    """
+    Pool de conexiones de solo lectura (thread-safe) con sentencias preparadas.
+
+    Las conexiones se abren a demanda hasta `maximo`; una conexión que falla
+    se descarta y la consulta se reintenta una vez con otra.
+    """
+
+    def __init__(self, dsn, maximo=10, preparadas=True):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(0, maximo, dsn, connection_factory=_Conexion)
+        self._preparadas = preparadas
+        # ThreadedConnectionPool falla si se pide una conexión con el pool lleno;
+        # el semáforo hace esperar en lugar de fallar.
+        self._cupos = threading.BoundedSemaphore(maximo)
+
+    # --- Consultas ---
+
+    def catalogo(self):
+        """Todas las filas de Productos con sus ImagenesProducto."""
+        return [dict(zip(COLUMNAS_PRODUCTO, fila)) for fila in self._ejecutar('catalogo')]
+
+    def producto(self, producto_id):
+        """Un producto con sus imágenes, o None si no existe."""
+        filas = self._ejecutar('producto', (producto_id,))
+        return dict(zip(COLUMNAS_PRODUCTO, filas[0])) if filas else None
+
+    def productos(self, ids):
+        """Los productos (con sus imágenes) de `ids` que existen, en una sola consulta."""
+        return [dict(zip(COLUMNAS_PRODUCTO, fila)) for fila in self._ejecutar('lote', (list(ids),))]
+
+    def rol(self, user_id):
+        """Rol del perfil del usuario, o None."""
+        filas = self._ejecutar('rol', (user_id,))
+        return filas[0][0] if filas else None
+
+    def cerrar(self):
+        self._pool.closeall()
+
+    # --- Internos ---
+
+    def _ejecutar(self, nombre, parametros=()):
+        for intento in (1, 2):
+            with self._cupos:
+                conn = self._pool.getconn()
+                try:
+                    with medir_upstream('postgres', nombre):
+                        filas = self._consultar(conn, nombre, parametros)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Conexión rota (reinicio del servidor, timeout de red...): se descarta.
+                    self._pool.putconn(conn, close=True)
+                    if intento == 2:
+                        raise
+                    continue
+                except Exception:
+                    self._pool.putconn(conn, close=conn.closed != 0)
+                    raise
+                self._pool.putconn(conn)
+                return filas
+
+    def _consultar(self, conn, nombre, parametros):
+        if not conn.preparada:
+            conn.set_session(readonly=True, autocommit=True)
+            if self._preparadas:
+                with conn.cursor() as cur:
+                    for sentencia, (tipos, sql) in SENTENCIAS.items():
+                        cur.execute(f"PREPARE {sentencia}{tipos} AS {sql}")
+            conn.preparada = True
+
+        tipos, sql = SENTENCIAS[nombre]
+        with conn.cursor() as cur:
+            if self._preparadas:
+                marcadores = f" ({', '.join(['%s'] * len(parametros))})" if parametros else ''
+                cur.execute(f"EXECUTE {nombre}{marcadores}", parametros)
+            else:
+                cur.execute(sql.replace('$1', '%s'), parametros)
+            return cur.fetchall()
+
+
+if __name__ == "__main__":
+    # Compara la latencia de cada consulta por PostgREST y por Postgres directo.
+    import argparse
+    import time
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compara latencias PostgREST vs. Postgres directo.")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--producto", type=int, required=True, help="ProductoID a consultar.")
+    parser.add_argument("--usuario", help="UUID de un perfil para medir la consulta de rol.")
+    args = parser.parse_args()
+
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    lector = LectorPostgres(
+        os.getenv("LECTURA_PG_DSN") or os.getenv("SUPABASE_CONNECTION_STRING"),
+        preparadas=os.getenv("LECTURA_PG_PREPARADAS", "1") == "1"
+    )
+    pruebas = {
+        'catalogo': (
+            lambda: supabase.table('Productos').select('*, ImagenesProducto(*)').execute(),
+            lector.catalogo,
+        ),
+        'producto': (
+            lambda: supabase.table('Productos').select('*, ImagenesProducto(*)').eq('ProductoID', args.producto).single().execute(),
+            lambda: lector.producto(args.producto),
+        ),
+    }
+    if args.usuario:
+        pruebas['rol'] = (
+            lambda: supabase.table('profiles').select('role').eq('id', args.usuario).single().execute(),
+            lambda: lector.rol(args.usuario),
+        )
+
+    def medir(funcion):
+        funcion()  # calentamiento (conexión, PREPARE)
+        tiempos = []
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return tiempos[len(tiempos) // 2], tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+
+    for nombre, (por_postgrest, por_postgres) in pruebas.items():
+        p50_rest, p95_rest = medir(por_postgrest)
+        p50_pg, p95_pg = medir(por_postgres)
+        print(f"{nombre:9} PostgREST p50 {p50_rest:7.1f} ms  p95 {p95_rest:7.1f} ms | "
+              f"Postgres p50 {p50_pg:7.1f} ms  p95 {p95_pg:7.1f} ms")
+    lector.cerrar()
@@ -0,0 +1,221 @@
+"""
+Control de admisión para las rutas públicas costosas (login, registro,
+contacto, checkout). Cada una dispara trabajo caro río arriba (Supabase Auth,
+la RPC de stock...), y una ráfaga de bots puede ocupar todos los hilos de
+gunicorn y tirar también la navegación del catálogo.
+
+Cada regla combina:
+  - un balde de fichas por IP y otro para la ruta en total (429 al vaciarse);
+  - un tope de pedidos en curso por upstream, para todos los workers (503);
+  - un tope de pedidos costosos en curso por proceso (503), así siempre quedan
+    hilos libres para las lecturas baratas (catálogo, sugerencias), que no
+    pasan por el limitador.
+Los rechazos llevan Retry-After y no tocan el upstream.
+
+Los baldes y los cupos viven en SQLite (como idempotencia.py) para que todos
+los workers compartan el mismo estado. Si el archivo está bloqueado más de
+`espera` segundos (otro worker con la escritura tomada) se responde 503; si
+falla por otra razón se deja pasar el pedido: mejor atender de más que
+rechazar todo.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+LEASE = 120  # un cupo más viejo que esto es de un proceso que murió sin liberarlo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Cuota:
+    """`capacidad` pedidos de ráfaga, recargados de a `capacidad` cada `periodo` segundos."""
+    capacidad: int
+    periodo: float
+
+    @classmethod
+    def leer(cls, texto):
+        """'10/60' -> Cuota(10, 60). Vacío o '0' -> None (sin límite)."""
+        if not texto or texto.strip() == '0':
+            return None
+        capacidad, _, periodo = texto.partition('/')
+        return cls(int(capacidad), float(periodo or 1))
+
+    @property
+    def tasa(self):
+        return self.capacidad / self.periodo
+
+
+@dataclass(frozen=True)
+class Regla:
+    por_ip: Optional[Cuota] = None
+    total: Optional[Cuota] = None
+    upstream: Optional[str] = None  # nombre del cupo de concurrencia (ver Limitador.cupos)
+
+
+@dataclass(frozen=True)
+class Rechazo:
+    codigo: int  # 429 (cuota) o 503 (sin cupo, sin hilo o estado bloqueado)
+    motivo: str
+    reintentar: int  # segundos, para Retry-After
+
+
+class Limitador:
+    """
+    `entrar(nombre, regla, ip)` devuelve un `Rechazo` o un pase (str) que hay
+    que devolver con `salir(pase)` al terminar el pedido.
+    """
+
+    def __init__(self, ruta, cupos=None, max_por_proceso=None, tabla='limitador', espera=5):
+        self._ruta = ruta
+        self._tabla = tabla
+        self._espera = espera
+        self.cupos = dict(cupos or {})
+        self._hilos = threading.BoundedSemaphore(max_por_proceso) if max_por_proceso else None
+        # Claves ya vacías en este proceso: mientras no se recarguen se
+        # rechaza sin abrir el archivo (lo más común durante una ráfaga).
+        self._bloqueadas = {}
+        self._pases = {}  # pase -> (upstream o None, tomó hilo)
+        self._lock = threading.Lock()
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla}_baldes (
+                    clave TEXT PRIMARY KEY,
+                    fichas REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla}_cupos (
+                    pase TEXT PRIMARY KEY,
+                    upstream TEXT NOT NULL,
+                    vence REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {tabla}_cupos_upstream ON {tabla}_cupos (upstream)")
+
+    @contextmanager
+    def _conectar(self, transaccion=False):
+        conn = sqlite3.connect(self._ruta, timeout=self._espera, isolation_level=None)
+        try:
+            if transaccion:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                yield conn
+        finally:
+            conn.close()
+
+    def entrar(self, nombre, regla, ip):
+        ahora = time.time()
+        baldes = []
+        if regla.por_ip is not None:
+            baldes.append((f"{nombre}|{ip}", regla.por_ip))
+        if regla.total is not None:
+            baldes.append((nombre, regla.total))
+
+        with self._lock:
+            if len(self._bloqueadas) > 10000:
+                self._bloqueadas = {c: hasta for c, hasta in self._bloqueadas.items() if hasta > ahora}
+            for clave, _ in baldes:
+                hasta = self._bloqueadas.get(clave)
+                if hasta is not None:
+                    if hasta > ahora:
+                        return Rechazo(429, 'cuota', _segundos(hasta - ahora))
+                    del self._bloqueadas[clave]
+
+        if self._hilos is not None and not self._hilos.acquire(blocking=False):
+            return Rechazo(503, 'proceso', 1)
+        pase = uuid.uuid4().hex
+        try:
+            rechazo = self._reservar(pase, baldes, regla.upstream, ahora)
+        except sqlite3.Error as e:
+            if _bloqueado(e):
+                # Otro worker retiene el archivo: el sistema ya está saturado.
+                logger.warning("Limitador: estado compartido bloqueado (%s); se responde 503.", e)
+                rechazo = Rechazo(503, 'bloqueo', 1)
+            else:
+                logger.error("Limitador: no se pudo leer el estado compartido (%s); se deja pasar.", e)
+                rechazo = None
+                regla = Regla()  # sin cupo registrado que liberar
+        if rechazo is not None:
+            if self._hilos is not None:
+                self._hilos.release()
+            return rechazo
+        with self._lock:
+            self._pases[pase] = (regla.upstream if regla.upstream in self.cupos else None, self._hilos is not None)
+        return pase
+
+    def salir(self, pase):
+        with self._lock:
+            upstream, hilo = self._pases.pop(pase, (None, False))
+        if hilo:
+            self._hilos.release()
+        if upstream is not None:
+            try:
+                with self._conectar() as conn:
+                    conn.execute(f"DELETE FROM {self._tabla}_cupos WHERE pase = ?", (pase,))
+            except sqlite3.Error as e:
+                logger.warning("Limitador: no se pudo liberar un cupo de %s (%s); vence solo en %ss.", upstream, e, LEASE)
+
+    def _reservar(self, pase, baldes, upstream, ahora):
+        with self._conectar(transaccion=True) as conn:
+            if random.random() < 0.01:
+                # Un balde sin uso por una hora ya está lleno: no hace falta guardarlo.
+                conn.execute(f"DELETE FROM {self._tabla}_baldes WHERE actualizado < ?", (ahora - 3600,))
+
+            nuevos = []
+            for clave, cuota in baldes:
+                fila = conn.execute(
+                    f"SELECT fichas, actualizado FROM {self._tabla}_baldes WHERE clave = ?", (clave,)
+                ).fetchone()
+                fichas = cuota.capacidad if fila is None else min(
+                    cuota.capacidad, fila[0] + (ahora - fila[1]) * cuota.tasa
+                )
+                if fichas < 1:
+                    espera = (1 - fichas) / cuota.tasa
+                    with self._lock:
+                        self._bloqueadas[clave] = ahora + espera
+                    return Rechazo(429, 'cuota', _segundos(espera))
+                nuevos.append((clave, fichas - 1))
+
+            maximo = self.cupos.get(upstream)
+            if maximo is not None:
+                conn.execute(f"DELETE FROM {self._tabla}_cupos WHERE vence < ?", (ahora,))
+                (en_curso,) = conn.execute(
+                    f"SELECT COUNT(*) FROM {self._tabla}_cupos WHERE upstream = ?", (upstream,)
+                ).fetchone()
+                if en_curso >= maximo:
+                    return Rechazo(503, upstream, 1)
+                conn.execute(
+                    f"INSERT INTO {self._tabla}_cupos (pase, upstream, vence) VALUES (?, ?, ?)",
+                    (pase, upstream, ahora + LEASE)
+                )
+
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self._tabla}_baldes (clave, fichas, actualizado) VALUES (?, ?, ?)",
+                [(clave, fichas, ahora) for clave, fichas in nuevos]
+            )
+        return None
+
+
+def _segundos(espera):
+    return max(1, int(espera + 0.999))
+
+
+def _bloqueado(error):
+    """True si sqlite3 se rindió esperando el lock ("database is locked" / SQLITE_BUSY)."""
+    mensaje = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in mensaje or 'busy' in mensaje)
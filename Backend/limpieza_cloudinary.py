@@ -0,0 +1,212 @@
+import calendar
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import cloudinary
+import cloudinary.api
+
+from cola_persistente import ColaPersistente, TrabajadorCola
+from metricas import medir_upstream
+
+# Cloudinary acepta hasta 100 public_ids por llamada a delete_resources.
+TAMANO_LOTE = 100
+# Resultados de delete_resources que cuentan como "ya no existe".
+ESTADOS_BORRADO = ('deleted', 'not_found')
+
+
+def extraer_public_id_de_url(url):
+    """Extrae el public_id de una URL de Cloudinary para poder eliminar la imagen."""
+    try:
+        parte_esencial = url.split('/upload/')[1]
+        sin_version = parte_esencial.split('/', 1)[1]
+        public_id = os.path.splitext(sin_version)[0]
+        return public_id
+    except IndexError:
+        return None
+
+
+def urls_registradas_en_supabase(supabase, tamano_pagina=1000):
+    """
+    Devuelve todas las URLs de ImagenesProducto, paginando para no chocar con
+    el límite de PostgREST.
+
+    El servidor puede devolver menos filas que `tamano_pagina` (su max-rows
+    manda), así que se avanza por lo recibido y se corta con una página vacía.
+    Como lo que falte acá se toma por huérfano y se borra, si al final no se
+    leyeron exactamente las filas que informa `count=exact` se lanza
+    RuntimeError en lugar de devolver una lista incompleta.
+    """
+    urls = []
+    total = None
+    while True:
+        respuesta = supabase.table('ImagenesProducto').select('URL', count='exact').order('ImagenID') \
+            .range(len(urls), len(urls) + tamano_pagina - 1).execute()
+        if total is None:
+            total = respuesta.count
+        if not respuesta.data:
+            break
+        urls.extend(fila['URL'] for fila in respuesta.data)
+    if total is None or len(urls) != total:
+        raise RuntimeError(
+            f"Se leyeron {len(urls)} imágenes de ImagenesProducto pero la tabla informa {total}; "
+            "no se buscan huérfanos con una lista incompleta."
+        )
+    return urls
+
+
+class LimpiezaCloudinary(TrabajadorCola):
+    """
+    Borrado diferido de imágenes en Cloudinary.
+
+    Las rutas encolan los public_id a borrar y responden sin esperar a
+    Cloudinary; este hilo los borra en lotes de hasta 100 con
+    `delete_resources` y reintenta con backoff los que fallen.
+
+    Si `intervalo_barrido` es mayor a cero, cada tanto compara los assets de
+    Cloudinary con las URLs registradas en ImagenesProducto y encola los
+    huérfanos (más viejos que `gracia` segundos, para no tocar imágenes recién
+    subidas que todavía no se asociaron a un producto).
+    """
+
+    nombre_hilo = "limpieza-cloudinary"
+
+    def __init__(self, ruta_db, obtener_urls_registradas, intervalo_barrido=0,
+                 gracia=24 * 3600, prefijo=None):
+        super().__init__()
+        self._ruta_db = ruta_db
+        self._cola = ColaPersistente(ruta_db, 'limpieza_cloudinary')
+        self._obtener_urls_registradas = obtener_urls_registradas
+        self._intervalo_barrido = intervalo_barrido
+        self._gracia = gracia
+        self._prefijo = prefijo
+        with closing(sqlite3.connect(ruta_db, timeout=10)) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS limpieza_barridos (id INTEGER PRIMARY KEY CHECK (id = 1), ultimo REAL NOT NULL)")
+
+    def programar(self, public_ids):
+        """Encola public_ids para borrarlos en segundo plano."""
+        public_ids = [pid for pid in public_ids if pid]
+        if not public_ids:
+            return
+        self._cola.encolar_varios([{"public_id": pid} for pid in public_ids])
+        self.despertar()
+
+    def procesar_pendientes(self):
+        """Borra un lote de la cola con una sola llamada a Cloudinary."""
+        trabajos = self._cola.reclamar(TAMANO_LOTE)
+        if not trabajos:
+            return 0
+
+        ids_por_public_id = {}
+        for id_, datos, intentos in trabajos:
+            ids_por_public_id.setdefault(datos["public_id"], []).append((id_, intentos))
+
+        try:
+            with medir_upstream('cloudinary', 'api.delete_resources'):
+                resultado = cloudinary.api.delete_resources(list(ids_por_public_id))
+        except Exception as e:
+            print(f"Error al borrar imágenes en Cloudinary: {e}")
+            for id_, _, intentos in trabajos:
+                self._cola.reintentar(id_, e, intentos)
+            return len(trabajos)
+
+        borrados = resultado.get('deleted', {})
+        completados = []
+        for public_id, trabajos_del_id in ids_por_public_id.items():
+            estado = borrados.get(public_id)
+            for id_, intentos in trabajos_del_id:
+                if estado in ESTADOS_BORRADO:
+                    completados.append(id_)
+                else:
+                    self._cola.reintentar(id_, f"Cloudinary respondió '{estado}'", intentos)
+        self._cola.completar(completados)
+        return len(trabajos)
+
+    def pendientes(self):
+        return self._cola.contar()
+
+    def buscar_huerfanos(self):
+        """Devuelve los public_id que existen en Cloudinary pero no en ImagenesProducto."""
+        registrados = {extraer_public_id_de_url(url) for url in self._obtener_urls_registradas()}
+        limite = time.time() - self._gracia
+        huerfanos = []
+
+        parametros = {"type": "upload", "resource_type": "image", "max_results": 500}
+        if self._prefijo:
+            parametros["prefix"] = self._prefijo
+        while True:
+            with medir_upstream('cloudinary', 'api.resources'):
+                pagina = cloudinary.api.resources(**parametros)
+            for recurso in pagina.get('resources', []):
+                creado = calendar.timegm(time.strptime(recurso['created_at'], "%Y-%m-%dT%H:%M:%SZ"))
+                if recurso['public_id'] not in registrados and creado < limite:
+                    huerfanos.append(recurso['public_id'])
+            if not pagina.get('next_cursor'):
+                return huerfanos
+            parametros["next_cursor"] = pagina['next_cursor']
+
+    def barrer(self, aplicar=True):
+        """Busca huérfanos y, si `aplicar`, los encola para borrarlos. Devuelve la lista."""
+        huerfanos = self.buscar_huerfanos()
+        if aplicar:
+            self.programar(huerfanos)
+        return huerfanos
+
+    def _en_reposo(self):
+        if self._intervalo_barrido > 0 and self._reservar_barrido():
+            huerfanos = self.barrer()
+            if huerfanos:
+                print(f"Barrido de Cloudinary: {len(huerfanos)} imágenes huérfanas encoladas para borrar.")
+
+    def _reservar_barrido(self):
+        """
+        Marca el inicio de un barrido si ya pasó el intervalo. Con varios
+        workers compartiendo el archivo, solo uno gana la reserva.
+        """
+        ahora = time.time()
+        conn = sqlite3.connect(self._ruta_db, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            fila = conn.execute("SELECT ultimo FROM limpieza_barridos WHERE id = 1").fetchone()
+            if fila and ahora - fila[0] < self._intervalo_barrido:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT OR REPLACE INTO limpieza_barridos (id, ultimo) VALUES (1, ?)", (ahora,))
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Busca (y opcionalmente borra) imágenes huérfanas en Cloudinary.")
+    parser.add_argument("--aplicar", action="store_true", help="Borra los huérfanos encontrados en lugar de solo listarlos.")
+    parser.add_argument("--prefijo", default=os.getenv("CLOUDINARY_PREFIJO_BARRIDO"), help="Limita el barrido a un prefijo de public_id.")
+    args = parser.parse_args()
+
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUD_NAME"),
+        api_key=os.getenv("API_KEY"),
+        api_secret=os.getenv("API_SECRET"),
+        secure=True
+    )
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    limpieza = LimpiezaCloudinary(
+        os.getenv("LIMPIEZA_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "limpieza.db")),
+        lambda: urls_registradas_en_supabase(supabase), prefijo=args.prefijo
+    )
+    huerfanos = limpieza.barrer(aplicar=args.aplicar)
+    for public_id in huerfanos:
+        print(public_id)
+    print(f"\n{len(huerfanos)} imágenes huérfanas encontradas.")
+    if args.aplicar:
+        while limpieza.procesar_pendientes():
+            pass
+        print(f"Pendientes tras el borrado: {limpieza.pendientes()}")
@@ -0,0 +1,298 @@
+"""
+Métricas de latencia en formato Prometheus (sin dependencias externas).
+
+- Por ruta: histograma de duración, contador por código y pedidos en curso.
+- Por upstream: histograma de duración y errores por servicio y operación
+  (p. ej. postgrest / table('Productos').select, auth / auth.get_user,
+  cloudinary / uploader.upload, smtp / sendmail).
+
+Las llamadas a Supabase se miden en el transporte httpx (ver
+`OpcionesSupabaseMedidas`); Cloudinary y SMTP se envuelven con
+`medir_upstream`. Cada pedido acumula su propio desglose por upstream, que se
+imprime si el pedido supera el umbral de lentitud.
+
+Las métricas son por proceso: con varios workers, Prometheus debe raspar
+cada uno (o sumar por instancia).
+"""
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import unquote
+
+import httpx
+from supabase import ClientOptions
+
+PREFIJO = "magknives"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Desglose de upstreams del pedido en curso: lista de (servicio, operacion, segundos).
+_desglose = contextvars.ContextVar("desglose_upstreams", default=None)
+
+
+# --- REGISTRO ---
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = f"{PREFIJO}_{nombre}"
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for valores, dato in series:
+            lineas.extend(self._lineas(valores, dato))
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def sumar(self, *valores, cantidad=1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def _lineas(self, valores, dato):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {dato}"]
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._buckets = tuple(buckets)
+
+    def observar(self, segundos, *valores):
+        with self._lock:
+            dato = self._series.get(valores)
+            if dato is None:
+                dato = self._series[valores] = [[0] * len(self._buckets), 0.0, 0]
+            for i, limite in enumerate(self._buckets):
+                if segundos <= limite:
+                    dato[0][i] += 1
+            dato[1] += segundos
+            dato[2] += 1
+
+    def _lineas(self, valores, dato):
+        conteos, suma, total = dato
+        nombres = self.etiquetas + ("le",)
+        lineas = [
+            f"{self.nombre}_bucket{_etiquetas(nombres, valores + (limite,))} {conteo}"
+            for limite, conteo in zip(self._buckets, conteos)
+        ]
+        lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, valores + ('+Inf',))} {total}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {suma}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+duracion_solicitudes = Histograma("http_duracion_segundos", "Duración de los pedidos HTTP por ruta.", ("ruta", "metodo"))
+solicitudes = Contador("http_solicitudes_total", "Pedidos HTTP por ruta y código de respuesta.", ("ruta", "metodo", "codigo"))
+en_curso = Medidor("http_en_curso", "Pedidos HTTP en curso.")
+duracion_upstreams = Histograma("upstream_duracion_segundos", "Duración de las llamadas a servicios externos.", ("servicio", "operacion"))
+errores_upstreams = Contador("upstream_errores_total", "Llamadas a servicios externos que fallaron.", ("servicio", "operacion"))
+rechazos_limitador = Contador("limitador_rechazos_total", "Pedidos rechazados por el limitador (ver limitador.py).", ("regla", "motivo"))
+
+METRICAS = (duracion_solicitudes, solicitudes, en_curso, duracion_upstreams, errores_upstreams, rechazos_limitador)
+
+
+def exponer():
+    """Todas las métricas en formato de texto de Prometheus."""
+    lineas = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+# --- PEDIDOS ---
+
+def iniciar_solicitud():
+    """Marca el inicio de un pedido. Devuelve el token para `terminar_solicitud`."""
+    en_curso.sumar()
+    return time.perf_counter(), _desglose.set([])
+
+
+def terminar_solicitud(token, ruta, metodo, codigo, umbral_lento=None):
+    """Registra el pedido y, si superó `umbral_lento` segundos, imprime su desglose por upstream."""
+    inicio, token_desglose = token
+    duracion = time.perf_counter() - inicio
+    desglose = _desglose.get() or []
+    _desglose.reset(token_desglose)
+    en_curso.sumar(cantidad=-1)
+    duracion_solicitudes.observar(duracion, ruta, metodo)
+    solicitudes.sumar(ruta, metodo, str(codigo))
+
+    if umbral_lento is not None and duracion >= umbral_lento:
+        print(f"Pedido lento: {metodo} {ruta} -> {codigo} en {duracion * 1000:.0f} ms | {resumir_desglose(desglose, duracion)}")
+
+
+def resumir_desglose(desglose, duracion):
+    if not desglose:
+        return "sin llamadas externas"
+    por_operacion = {}
+    for servicio, operacion, segundos in desglose:
+        total, veces = por_operacion.get((servicio, operacion), (0.0, 0))
+        por_operacion[(servicio, operacion)] = (total + segundos, veces + 1)
+    partes = [
+        f"{servicio} {operacion} {total * 1000:.0f} ms x{veces}"
+        for (servicio, operacion), (total, veces) in sorted(por_operacion.items(), key=lambda x: -x[1][0])
+    ]
+    externo = sum(total for total, _ in por_operacion.values())
+    partes.append(f"resto {max(0.0, duracion - externo) * 1000:.0f} ms")
+    return ", ".join(partes)
+
+
+# --- UPSTREAMS ---
+
+def registrar_upstream(servicio, operacion, segundos, error=False):
+    duracion_upstreams.observar(segundos, servicio, operacion)
+    if error:
+        errores_upstreams.sumar(servicio, operacion)
+    desglose = _desglose.get()
+    if desglose is not None:
+        desglose.append((servicio, operacion, segundos))
+
+
+@contextmanager
+def medir_upstream(servicio, operacion):
+    """Mide una llamada a un servicio externo (cuenta como error si lanza)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registrar_upstream(servicio, operacion, time.perf_counter() - inicio, error=True)
+        raise
+    registrar_upstream(servicio, operacion, time.perf_counter() - inicio)
+
+
+_OPERACIONES_POSTGREST = {'GET': 'select', 'HEAD': 'select', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+
+
+def clasificar(request):
+    """(servicio, operacion) de un pedido httpx hacia Supabase."""
+    partes = [unquote(p) for p in request.url.path.split('/') if p]
+    if partes[:2] == ['rest', 'v1'] and len(partes) >= 3:
+        if partes[2] == 'rpc' and len(partes) >= 4:
+            return 'postgrest', f"rpc('{partes[3]}')"
+        operacion = _OPERACIONES_POSTGREST.get(request.method, request.method.lower())
+        if operacion == 'insert' and 'merge-duplicates' in request.headers.get('prefer', ''):
+            operacion = 'upsert'
+        return 'postgrest', f"table('{partes[2]}').{operacion}"
+    if partes[:2] == ['auth', 'v1'] and len(partes) >= 3:
+        operacion = {'user': 'get_user', 'token': 'sign_in', 'signup': 'sign_up', 'logout': 'sign_out'}.get(partes[2], partes[2])
+        return 'auth', f"auth.{operacion}"
+    return request.url.host, request.method.lower()
+
+
+class _CuerpoMedido(httpx.SyncByteStream):
+    """Registra la llamada cuando termina de leerse (y cerrarse) el cuerpo de la respuesta."""
+
+    def __init__(self, stream, al_cerrar):
+        self._stream = stream
+        self._al_cerrar = al_cerrar
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._al_cerrar()
+
+
+def _al_cerrar(servicio, operacion, inicio, codigo):
+    registrado = []
+
+    def registrar():
+        if not registrado:  # close() puede llamarse más de una vez
+            registrado.append(True)
+            registrar_upstream(servicio, operacion, time.perf_counter() - inicio, error=codigo >= 500)
+    return registrar
+
+
+class TransporteMedido(httpx.BaseTransport):
+    def __init__(self, transporte):
+        self._transporte = transporte
+
+    def handle_request(self, request):
+        servicio, operacion = clasificar(request)
+        inicio = time.perf_counter()
+        try:
+            response = self._transporte.handle_request(request)
+        except Exception:
+            registrar_upstream(servicio, operacion, time.perf_counter() - inicio, error=True)
+            raise
+        response.stream = _CuerpoMedido(response.stream, _al_cerrar(servicio, operacion, inicio, response.status_code))
+        return response
+
+    def close(self):
+        self._transporte.close()
+
+
+def cliente_httpx(timeout=120):
+    """httpx.Client con cada llamada medida."""
+    return httpx.Client(transport=TransporteMedido(httpx.HTTPTransport(http2=True)), timeout=timeout, follow_redirects=True)
+
+
+class OpcionesSupabaseMedidas(ClientOptions):
+    """
+    ClientOptions que le da a cada subcliente de Supabase (auth, postgrest,
+    storage, functions) su propio httpx.Client medido. Con un único
+    `httpx_client` compartido, postgrest le cambia base_url y headers al
+    cliente que también usa auth.
+
+    Supabase lee `options.httpx_client` al armar cada subcliente (postgrest se
+    vuelve a armar tras cada login); quien lo lee identifica al subcliente, así
+    cada uno recibe siempre el mismo cliente y no se crea uno por lectura.
+    """
+
+    _lock_clientes = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Supabase trabaja sobre una copia superficial de las opciones: el
+        # dict se comparte, así `cerrar()` alcanza a los clientes que creó.
+        self._clientes = {}
+
+    @property
+    def httpx_client(self):
+        subcliente = sys._getframe(1).f_code.co_name
+        with self._lock_clientes:
+            if subcliente not in self._clientes:
+                self._clientes[subcliente] = cliente_httpx()
+            return self._clientes[subcliente]
+
+    @httpx_client.setter
+    def httpx_client(self, valor):
+        pass  # lo que ClientOptions asigne se ignora
+
+    def cerrar(self):
+        """Cierra los clientes httpx de los subclientes (al terminar el proceso)."""
+        with self._lock_clientes:
+            clientes = list(self._clientes.values())
+            self._clientes.clear()
+        for cliente in clientes:
+            cliente.close()
@@ -1,6 +1,15 @@
 import os
+import io
+import json
+import hashlib
+import argparse
+import threading
+from decimal import Decimal
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
 import pyodbc
 import psycopg2
+import psycopg2.extras
 from dotenv import load_dotenv
 from pathlib import Path # Importamos la librería Path
 
@@ -11,7 +20,231 @@ load_dotenv(dotenv_path=dotenv_path)
 AZURE_CONN_STR = os.getenv("DATABASE_CONNECTION_STRING")
 SUPABASE_CONN_STR = os.getenv("SUPABASE_CONNECTION_STRING")
 
-def migrar_datos():
+# Tablas a copiar, con su clave (para paginar y reanudar) y sus dependencias de FK.
+# Las tablas sin dependencias entre sí se copian en paralelo.
+TABLAS = [
+    {
+        "nombre": "Productos",
+        "clave": "ProductoID",
+        "columnas": ["ProductoID", "Nombre", "Descripcion", "Precio", "Stock", "Categoria"],
+        "depende_de": [],
+    },
+    {
+        "nombre": "ImagenesProducto",
+        "clave": "ImagenID",
+        "columnas": ["ImagenID", "ProductoID", "URL"],
+        "depende_de": ["Productos"],
+    },
+]
+TAMANO_LOTE = 5000
+RUTA_CHECKPOINT = Path(__file__).resolve().parent / 'migracion_datos.json'
+
+
+# --- CHECKPOINT ---
+
+class Checkpoint:
+    """Avance por tabla (última clave copiada y filas), persistido en JSON tras cada lote."""
+
+    def __init__(self, ruta):
+        self._ruta = Path(ruta)
+        self._lock = threading.Lock()
+        self._estado = json.loads(self._ruta.read_text(encoding='utf-8')) if self._ruta.exists() else {}
+
+    def de_tabla(self, tabla):
+        with self._lock:
+            return dict(self._estado.get(tabla, {"ultima_clave": None, "filas": 0, "completa": False}))
+
+    def actualizar(self, tabla, **cambios):
+        with self._lock:
+            self._estado.setdefault(tabla, {"ultima_clave": None, "filas": 0, "completa": False}).update(cambios)
+            temporal = self._ruta.with_suffix('.tmp')
+            temporal.write_text(json.dumps(self._estado, indent=1, default=str), encoding='utf-8')
+            os.replace(temporal, self._ruta)
+
+
+# --- UTILIDADES ---
+
+def _ident(nombre):
+    """Cita un identificador para Postgres (las tablas de Supabase usan mayúsculas)."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _valor_csv(valor):
+    """Formatea un valor para COPY ... (FORMAT csv): sin comillas = NULL, con comillas = texto."""
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    if isinstance(valor, (int, float, Decimal)):
+        return str(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+def _normalizar(valor):
+    """Representación canónica de un valor para comparar checksums entre motores."""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, (Decimal, float)):
+        return format(Decimal(str(valor)).normalize(), 'f')
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _niveles(tablas):
+    """Agrupa las tablas en niveles según sus FK: cada nivel solo depende de los anteriores."""
+    pendientes = {t["nombre"]: t for t in tablas}
+    nombres = set(pendientes)
+    listas, niveles = set(), []
+    while pendientes:
+        # Una dependencia fuera de la selección (--tablas) se da por ya migrada.
+        nivel = [t for t in pendientes.values() if all(d in listas or d not in nombres for d in t["depende_de"])]
+        if not nivel:
+            raise ValueError(f"Dependencias circulares o faltantes entre: {', '.join(pendientes)}")
+        niveles.append(nivel)
+        for t in nivel:
+            listas.add(t["nombre"])
+            del pendientes[t["nombre"]]
+    return niveles
+
+
+# --- COPIA ---
+
+def _escribir_lote(cursor_pg, tabla, filas):
+    """Escribe un lote con COPY FROM STDIN; si falla, cae a execute_values con ON CONFLICT DO NOTHING."""
+    columnas = ', '.join(_ident(c) for c in tabla["columnas"])
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write(','.join(_valor_csv(v) for v in fila))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    cursor_pg.execute("SAVEPOINT lote")
+    try:
+        cursor_pg.copy_expert(f"COPY {_ident(tabla['nombre'])} ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor_pg.execute("RELEASE SAVEPOINT lote")
+        return "copy"
+    except psycopg2.Error:
+        # Típicamente una clave duplicada al reanudar tras un corte entre el
+        # commit y la escritura del checkpoint.
+        cursor_pg.execute("ROLLBACK TO SAVEPOINT lote")
+        psycopg2.extras.execute_values(
+            cursor_pg,
+            f"INSERT INTO {_ident(tabla['nombre'])} ({columnas}) VALUES %s "
+            f"ON CONFLICT ({_ident(tabla['clave'])}) DO NOTHING",
+            filas, page_size=1000
+        )
+        return "execute_values"
+
+
+def copiar_tabla(tabla, checkpoint, tamano_lote=TAMANO_LOTE):
+    """Copia una tabla de Azure a Supabase en lotes, reanudando desde el checkpoint."""
+    nombre = tabla["nombre"]
+    avance = checkpoint.de_tabla(nombre)
+    if avance["completa"]:
+        print(f"[{nombre}] Ya copiada ({avance['filas']} filas). Se omite.")
+        return
+
+    conn_azure = pyodbc.connect(AZURE_CONN_STR)
+    conn_supabase = psycopg2.connect(SUPABASE_CONN_STR)
+    try:
+        cursor_azure = conn_azure.cursor()
+        cursor_supabase = conn_supabase.cursor()
+
+        columnas = ', '.join(f"[{c}]" for c in tabla["columnas"])
+        consulta = f"SELECT {columnas} FROM [{nombre}]"
+        parametros = []
+        if avance["ultima_clave"] is not None:
+            consulta += f" WHERE [{tabla['clave']}] > ?"
+            parametros.append(avance["ultima_clave"])
+            print(f"[{nombre}] Reanudando después de {tabla['clave']} = {avance['ultima_clave']}.")
+        cursor_azure.execute(consulta + f" ORDER BY [{tabla['clave']}]", *parametros)
+
+        posicion_clave = tabla["columnas"].index(tabla["clave"])
+        filas_copiadas = avance["filas"]
+        while True:
+            filas = [tuple(fila) for fila in cursor_azure.fetchmany(tamano_lote)]
+            if not filas:
+                break
+            metodo = _escribir_lote(cursor_supabase, tabla, filas)
+            conn_supabase.commit()
+            filas_copiadas += len(filas)
+            checkpoint.actualizar(nombre, ultima_clave=filas[-1][posicion_clave], filas=filas_copiadas)
+            print(f"[{nombre}] {filas_copiadas} filas copiadas (lote vía {metodo}).")
+
+        # Alineamos la secuencia de la clave para que los próximos INSERT no choquen.
+        cursor_supabase.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({_ident(tabla['clave'])}), 1)) "
+            f"FROM {_ident(nombre)} WHERE pg_get_serial_sequence(%s, %s) IS NOT NULL",
+            (_ident(nombre), tabla["clave"], _ident(nombre), tabla["clave"])
+        )
+        conn_supabase.commit()
+        checkpoint.actualizar(nombre, completa=True)
+        print(f"[{nombre}] Copia terminada: {filas_copiadas} filas.")
+    except Exception:
+        conn_supabase.rollback()
+        raise
+    finally:
+        conn_azure.close()
+        conn_supabase.close()
+
+
+# --- VERIFICACIÓN ---
+
+def _checksum(filas_por_lote):
+    """Cuenta filas y calcula un MD5 sobre su representación canónica, sin acumularlas en memoria."""
+    md5, total = hashlib.md5(), 0
+    for filas in filas_por_lote:
+        for fila in filas:
+            md5.update('\x1f'.join(_normalizar(v) for v in fila).encode('utf-8'))
+            md5.update(b'\x1e')
+            total += 1
+    return total, md5.hexdigest()
+
+
+def _lotes(cursor, tamano_lote):
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            return
+        yield filas
+
+
+def verificar_tabla(tabla, tamano_lote=TAMANO_LOTE):
+    """Compara cantidad de filas y checksum de una tabla entre Azure y Supabase."""
+    nombre = tabla["nombre"]
+    conn_azure = pyodbc.connect(AZURE_CONN_STR)
+    conn_supabase = psycopg2.connect(SUPABASE_CONN_STR)
+    try:
+        cursor_azure = conn_azure.cursor()
+        cursor_azure.execute(
+            f"SELECT {', '.join(f'[{c}]' for c in tabla['columnas'])} FROM [{nombre}] ORDER BY [{tabla['clave']}]"
+        )
+        origen = _checksum(_lotes(cursor_azure, tamano_lote))
+
+        # Cursor con nombre = cursor del lado del servidor: Postgres entrega las filas por partes.
+        cursor_supabase = conn_supabase.cursor(name=f"verificar_{nombre.lower()}")
+        cursor_supabase.itersize = tamano_lote
+        cursor_supabase.execute(
+            f"SELECT {', '.join(_ident(c) for c in tabla['columnas'])} FROM {_ident(nombre)} "
+            f"ORDER BY {_ident(tabla['clave'])}"
+        )
+        destino = _checksum(_lotes(cursor_supabase, tamano_lote))
+    finally:
+        conn_azure.close()
+        conn_supabase.close()
+
+    coincide = origen == destino
+    estado = "OK" if coincide else "DIFERENCIA"
+    print(f"[{nombre}] {estado}: Azure {origen[0]} filas ({origen[1]}) | Supabase {destino[0]} filas ({destino[1]})")
+    return coincide
+
+
+# --- ORQUESTACIÓN ---
+
+def migrar_datos(tablas=TABLAS, paralelo=4, solo_verificar=False, ruta_checkpoint=RUTA_CHECKPOINT):
     # --- INICIO DEL CAMBIO: Verificación de las variables de entorno ---
     if not AZURE_CONN_STR or not SUPABASE_CONN_STR:
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
@@ -20,31 +253,42 @@ def migrar_datos():
         print("1. DATABASE_CONNECTION_STRING (para Azure)")
         print("2. SUPABASE_CONNECTION_STRING (para Supabase)")
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-        return
+        return False
     # --- FIN DEL CAMBIO ---
 
     try:
-        print("Conectando a las bases de datos...")
-        conn_azure = pyodbc.connect(AZURE_CONN_STR)
-        conn_supabase = psycopg2.connect(SUPABASE_CONN_STR)
-        
-        cursor_azure = conn_azure.cursor()
-        cursor_supabase = conn_supabase.cursor()
-        print("Conexión exitosa.")
+        checkpoint = Checkpoint(ruta_checkpoint)
+        with ThreadPoolExecutor(max_workers=paralelo) as pool:
+            if not solo_verificar:
+                # Cada nivel espera al anterior, así las FK siempre encuentran a su padre.
+                for nivel in _niveles(tablas):
+                    print(f"Copiando en paralelo: {', '.join(t['nombre'] for t in nivel)}")
+                    for futuro in [pool.submit(copiar_tabla, t, checkpoint) for t in nivel]:
+                        futuro.result()
 
-        # ... (el resto del script de migración no cambia) ...
+            print("\nVerificando cantidades y checksums...")
+            resultados = list(pool.map(verificar_tabla, tablas))
+        if all(resultados):
+            print("\nMigración verificada: todas las tablas coinciden.")
+        else:
+            print("\nATENCIÓN: hay tablas con diferencias entre origen y destino.")
+        return all(resultados)
 
     except Exception as e:
         print(f"\nERROR: Ocurrió un error durante la migración.")
         print(e)
-        if 'conn_supabase' in locals() and conn_supabase:
-            conn_supabase.rollback()
-    finally:
-        if 'conn_azure' in locals() and conn_azure:
-            conn_azure.close()
-        if 'conn_supabase' in locals() and conn_supabase:
-            conn_supabase.close()
-        print("Conexiones cerradas.")
+        print("Puedes volver a ejecutar el script: continuará desde el último lote confirmado.")
+        return False
 
 if __name__ == '__main__':
-    migrar_datos()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Copia las tablas de Azure SQL a Supabase (Postgres) por lotes.")
+    parser.add_argument("--tablas", nargs="*", help="Limita la migración a estas tablas (por defecto, todas).")
+    parser.add_argument("--paralelo", type=int, default=4, help="Cantidad máxima de tablas copiadas a la vez.")
+    parser.add_argument("--solo-verificar", action="store_true", help="No copia; solo compara cantidades y checksums.")
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta el checkpoint y empieza de cero.")
+    args = parser.parse_args()
+
+    if args.reiniciar and RUTA_CHECKPOINT.exists():
+        RUTA_CHECKPOINT.unlink()
+    tablas = [t for t in TABLAS if not args.tablas or t["nombre"] in args.tablas]
+    migrar_datos(tablas, paralelo=args.paralelo, solo_verificar=args.solo_verificar)
@@ -1,6 +1,13 @@
 # migrar_imagenes_v2.py
 
+import argparse
+import hashlib
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pyodbc
 import cloudinary
 import cloudinary.uploader
@@ -18,84 +25,223 @@ cloudinary.config(
     secure=True
 )
 # Ahora la ruta apunta a tu carpeta principal "Imagenes"
-RUTA_IMAGENES_PRINCIPAL = "Imagenes" 
+RUTA_IMAGENES_PRINCIPAL = "Imagenes"
+# Manifiesto de avance: permite reanudar la migración sin re-subir ni duplicar filas.
+RUTA_MANIFIESTO = "migracion_imagenes.json"
+SUBIDAS_CONCURRENTES = 4
+
+
+# --- MANIFIESTO (CHECKPOINT) ---
+
+class Manifiesto:
+    """
+    Registro persistente de los archivos ya procesados, indexado por producto
+    y hash SHA-256 del contenido: la misma foto en las carpetas de dos
+    productos son dos entradas. Cada entrada guarda la URL de Cloudinary y si
+    la fila en ImagenesProducto ya fue confirmada, así una re-ejecución salta
+    lo hecho.
+    """
 
-def migrar_imagenes_recursivo():
+    def __init__(self, ruta):
+        self._ruta = ruta
+        self._lock = threading.Lock()
+        self._entradas = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                self._entradas = json.load(f)
+
+    @staticmethod
+    def _clave(producto_id, hash_archivo):
+        return f"{producto_id}:{hash_archivo}"
+
+    def obtener(self, producto_id, hash_archivo):
+        with self._lock:
+            return self._entradas.get(self._clave(producto_id, hash_archivo))
+
+    def registrar_subida(self, producto_id, hash_archivo, archivo, url):
+        with self._lock:
+            self._entradas[self._clave(producto_id, hash_archivo)] = {
+                "archivo": archivo, "producto_id": producto_id, "url": url, "registrado": False
+            }
+            self._guardar()
+
+    def marcar_registrados(self, producto_id, hashes):
+        with self._lock:
+            for hash_archivo in hashes:
+                self._entradas[self._clave(producto_id, hash_archivo)]["registrado"] = True
+            self._guardar()
+
+    def _guardar(self):
+        # Escritura atómica: un corte a mitad de camino no deja el JSON corrupto.
+        temporal = f"{self._ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._entradas, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self._ruta)
+
+
+def hash_de_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+# --- MIGRACIÓN ---
+
+def _subir(ruta_completa_archivo, public_id):
+    """Sube un archivo a Cloudinary y devuelve su secure_url."""
+    upload_result = cloudinary.uploader.upload(
+        ruta_completa_archivo,
+        # Creamos un ID público único para evitar sobreescrituras y organizar en Cloudinary.
+        public_id=public_id
+    )
+    secure_url = upload_result.get('secure_url')
+    if not secure_url:
+        raise RuntimeError("La subida no devolvió una URL.")
+    return secure_url
+
+
+def migrar_imagenes_recursivo(ruta_imagenes=RUTA_IMAGENES_PRINCIPAL, ruta_manifiesto=RUTA_MANIFIESTO,
+                              subidas_concurrentes=SUBIDAS_CONCURRENTES, dry_run=False):
     """
     Este script camina recursivamente por la carpeta de Imágenes, usa el nombre
     de cada subcarpeta para encontrar el producto en la DB, sube las imágenes
     de esa carpeta a Cloudinary y las asocia con el producto correcto.
+
+    Las subidas corren en paralelo (hasta `subidas_concurrentes` a la vez)
+    mientras las carpetas se confirman en orden: una vez que terminan todas
+    las subidas de una carpeta, sus filas se insertan con un único
+    executemany y un único commit.
     """
     print("--- Iniciando migración de imágenes desde subcarpetas ---")
+    if dry_run:
+        print("(modo dry-run: no se sube nada ni se escribe en la base de datos)")
+
+    manifiesto = Manifiesto(ruta_manifiesto)
+    stats = {"subidas": 0, "bytes": 0, "registradas": 0, "salteadas": 0, "errores": 0}
+    inicio = time.perf_counter()
 
     try:
         conn = pyodbc.connect(DB_CONNECTION_STRING)
         cursor = conn.cursor()
 
-        # 1. os.walk() recorre el árbol de directorios de arriba hacia abajo.
-        for dirpath, _, filenames in os.walk(RUTA_IMAGENES_PRINCIPAL):
-            if not filenames:
-                continue # Si no hay archivos en la carpeta, la saltamos.
-
-            # 2. El nombre del producto es el nombre de la subcarpeta.
-            nombre_producto = os.path.basename(dirpath)
-            print(f"\nProcesando carpeta para el producto: '{nombre_producto}'")
-
-            try:
-                # 3. Buscamos el ProductoID en la base de datos usando el nombre de la carpeta.
-                cursor.execute("SELECT ProductoID FROM Productos WHERE Nombre = ?", nombre_producto)
-                producto_row = cursor.fetchone()
-
-                if not producto_row:
+        # 1. Leemos de una sola vez el mapa nombre -> ProductoID y las URLs ya registradas.
+        cursor.execute("SELECT ProductoID, Nombre FROM Productos")
+        ids_por_nombre = {fila.Nombre: fila.ProductoID for fila in cursor.fetchall()}
+        cursor.execute("SELECT ProductoID, URL FROM ImagenesProducto")
+        urls_registradas = {(fila.ProductoID, fila.URL) for fila in cursor.fetchall()}
+
+        with ThreadPoolExecutor(max_workers=subidas_concurrentes) as pool:
+            # 2. Recorremos el árbol y encolamos todas las subidas pendientes.
+            carpetas = []
+            for dirpath, _, filenames in os.walk(ruta_imagenes):
+                if not filenames:
+                    continue # Si no hay archivos en la carpeta, la saltamos.
+
+                # El nombre del producto es el nombre de la subcarpeta.
+                nombre_producto = os.path.basename(dirpath)
+                producto_id = ids_por_nombre.get(nombre_producto)
+                if producto_id is None:
                     print(f"AVISO: No se encontró un producto llamado '{nombre_producto}' en la DB. Saltando esta carpeta.")
                     continue
-                
-                producto_id = producto_row.ProductoID
 
-                # 4. Recorremos cada imagen encontrada en la carpeta.
-                for filename in filenames:
+                trabajos = []
+                for filename in sorted(filenames):
                     ruta_completa_archivo = os.path.join(dirpath, filename)
-                    
-                    # Extraemos el nombre del archivo sin extensión para usarlo como parte del public_id
-                    nombre_base_archivo = os.path.splitext(filename)[0]
+                    hash_archivo = hash_de_archivo(ruta_completa_archivo)
+                    entrada = manifiesto.obtener(producto_id, hash_archivo)
 
-                    print(f"  - Subiendo '{filename}'...")
-                    
-                    # 5. Subimos la imagen a Cloudinary.
-                    upload_result = cloudinary.uploader.upload(
-                        ruta_completa_archivo,
-                        # Creamos un ID público único para evitar sobreescrituras y organizar en Cloudinary.
-                        public_id=f"{nombre_producto.lower().replace(' ', '-')}/{nombre_base_archivo}"
-                    )
-                    
-                    secure_url = upload_result.get('secure_url')
-
-                    if not secure_url:
-                        print(f"  - ERROR: La subida para '{filename}' no devolvió una URL.")
+                    if entrada and entrada["registrado"]:
+                        stats["salteadas"] += 1
+                        continue
+                    if entrada and entrada["url"]:
+                        # Se subió en una corrida anterior pero no llegó a registrarse.
+                        trabajos.append((filename, hash_archivo, None, entrada["url"]))
+                        continue
+                    if dry_run:
+                        print(f"  - [dry-run] Subiría '{ruta_completa_archivo}' para ProductoID {producto_id}")
+                        stats["subidas"] += 1
+                        stats["bytes"] += os.path.getsize(ruta_completa_archivo)
                         continue
 
-                    # 6. Insertamos la nueva URL en la tabla ImagenesProducto.
-                    print(f"  - URL: {secure_url}")
-                    sql_insert = "INSERT INTO ImagenesProducto (ProductoID, URL) VALUES (?, ?)"
-                    cursor.execute(sql_insert, producto_id, secure_url)
-                    conn.commit()
-                    print(f"  - ¡Base de datos actualizada para ProductoID {producto_id}!")
+                    # Extraemos el nombre del archivo sin extensión para usarlo como parte del public_id
+                    nombre_base_archivo = os.path.splitext(filename)[0]
+                    public_id = f"{nombre_producto.lower().replace(' ', '-')}/{nombre_base_archivo}"
+                    futuro = pool.submit(_subir, ruta_completa_archivo, public_id)
+                    trabajos.append((filename, hash_archivo, futuro, None))
+                carpetas.append((nombre_producto, dirpath, producto_id, trabajos))
+
+            # 3. Confirmamos carpeta por carpeta, a medida que terminan sus subidas.
+            for nombre_producto, dirpath, producto_id, trabajos in carpetas:
+                if not trabajos:
+                    continue
+                print(f"\nProcesando carpeta para el producto: '{nombre_producto}'")
+                filas = []
+                for filename, hash_archivo, futuro, url in trabajos:
+                    if futuro is not None:
+                        try:
+                            url = futuro.result()
+                        except Exception as e:
+                            print(f"  - ERROR: La subida de '{filename}' falló: {e}")
+                            stats["errores"] += 1
+                            continue
+                        ruta_completa_archivo = os.path.join(dirpath, filename)
+                        stats["subidas"] += 1
+                        stats["bytes"] += os.path.getsize(ruta_completa_archivo)
+                        manifiesto.registrar_subida(producto_id, hash_archivo, ruta_completa_archivo, url)
+                        print(f"  - Subido '{filename}': {url}")
+                    filas.append((hash_archivo, url))
+
+                if dry_run:
+                    print(f"  - [dry-run] Registraría {len(filas)} imágenes ya subidas.")
+                    continue
 
-            except Exception as e_inner:
-                print(f"!! ERROR procesando la carpeta '{nombre_producto}': {e_inner}")
+                # 4. Insertamos todas las URLs nuevas de la carpeta en un solo commit.
+                nuevas = [(producto_id, url) for _, url in filas if (producto_id, url) not in urls_registradas]
+                try:
+                    if nuevas:
+                        cursor.executemany("INSERT INTO ImagenesProducto (ProductoID, URL) VALUES (?, ?)", nuevas)
+                        conn.commit()
+                except Exception as e_inner:
+                    conn.rollback()
+                    print(f"!! ERROR procesando la carpeta '{nombre_producto}': {e_inner}")
+                    stats["errores"] += len(nuevas)
+                    continue
+                urls_registradas.update(nuevas)
+                manifiesto.marcar_registrados(producto_id, [hash_archivo for hash_archivo, _ in filas])
+                stats["registradas"] += len(nuevas)
+                print(f"  - ¡Base de datos actualizada para ProductoID {producto_id}! ({len(nuevas)} imágenes)")
 
     except Exception as e_outer:
         print(f"!! ERROR FATAL durante la conexión o el recorrido de archivos: {e_outer}")
     finally:
         if 'conn' in locals() and conn:
             conn.close()
+
+        duracion = time.perf_counter() - inicio
+        megabytes = stats["bytes"] / (1024 * 1024)
         print("\n--- Migración finalizada ---")
+        print(f"Archivos {'a subir' if dry_run else 'subidos'}: {stats['subidas']} ({megabytes:.1f} MB)")
+        print(f"Filas insertadas: {stats['registradas']} | Salteados (ya migrados): {stats['salteadas']} | Errores: {stats['errores']}")
+        if duracion > 0 and not dry_run:
+            print(f"Duración: {duracion:.1f} s | {stats['subidas'] / duracion:.2f} archivos/s | {megabytes / duracion:.2f} MB/s")
 
 
 if __name__ == "__main__":
-    # ¡IMPORTANTE! Haz una copia de seguridad de tu base de datos antes de ejecutar.
-    respuesta = input("¿Estás seguro de que quieres iniciar la migración desde subcarpetas? (s/n): ")
-    if respuesta.lower() == 's':
-        migrar_imagenes_recursivo()
+    parser = argparse.ArgumentParser(description="Migra las imágenes de 'Imagenes/' a Cloudinary y las registra en ImagenesProducto.")
+    parser.add_argument("--ruta", default=RUTA_IMAGENES_PRINCIPAL, help="Carpeta raíz con una subcarpeta por producto.")
+    parser.add_argument("--manifiesto", default=RUTA_MANIFIESTO, help="Archivo de checkpoint para reanudar la migración.")
+    parser.add_argument("--concurrencia", type=int, default=SUBIDAS_CONCURRENTES, help="Cantidad máxima de subidas simultáneas.")
+    parser.add_argument("--dry-run", action="store_true", help="Muestra qué se haría sin subir ni escribir nada.")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        migrar_imagenes_recursivo(args.ruta, args.manifiesto, args.concurrencia, dry_run=True)
     else:
-        print("Migración cancelada.")
\ No newline at end of file
+        # ¡IMPORTANTE! Haz una copia de seguridad de tu base de datos antes de ejecutar.
+        respuesta = input("¿Estás seguro de que quieres iniciar la migración desde subcarpetas? (s/n): ")
+        if respuesta.lower() == 's':
+            migrar_imagenes_recursivo(args.ruta, args.manifiesto, args.concurrencia)
+        else:
+            print("Migración cancelada.")
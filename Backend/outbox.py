@@ -0,0 +1,179 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from cola_persistente import ColaPersistente, TrabajadorCola
+from metricas import medir_upstream
+
+TAMANO_LOTE = 20
+CIERRE_POR_INACTIVIDAD = 120  # segundos sin enviar antes de cerrar la sesión SMTP
+
+
+class OutboxEmail(TrabajadorCola):
+    """
+    Bandeja de salida de correos.
+
+    `encolar` guarda el mensaje en una cola SQLite y vuelve enseguida; un hilo
+    en segundo plano lo envía reutilizando una única sesión SMTP autenticada,
+    en lotes, y reintenta con backoff exponencial si el envío falla.
+    """
+
+    nombre_hilo = "outbox-email"
+
+    def __init__(self, ruta_db, servidor, puerto, usuario=None, password=None,
+                 starttls=True, remitente=None, timeout=30):
+        super().__init__()
+        self._cola = ColaPersistente(ruta_db, 'outbox_email')
+        self._servidor = servidor
+        self._puerto = puerto
+        self._usuario = usuario
+        self._password = password
+        self._starttls = starttls
+        self._remitente = remitente or usuario
+        self._timeout = timeout
+
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self._lock_stats = threading.Lock()
+        self._latencias = deque(maxlen=200)
+        self._enviados = 0
+        self._errores = 0
+        self._ultimo_error = None
+
+    # --- API pública ---
+
+    def encolar(self, asunto, cuerpo, destinatarios, nombre_remitente=None):
+        """Guarda un correo de texto plano para envío asíncrono y devuelve su id."""
+        id_ = self._cola.encolar({
+            "asunto": asunto,
+            "cuerpo": cuerpo,
+            "destinatarios": list(destinatarios),
+            "nombre_remitente": nombre_remitente,
+        })
+        self.despertar()
+        return id_
+
+    def detener(self, timeout=10):
+        super().detener(timeout)
+        self._cerrar_smtp()
+
+    def estadisticas(self):
+        """Profundidad de la cola y latencias de envío de este proceso."""
+        conteo = self._cola.contar()
+        with self._lock_stats:
+            latencias = sorted(self._latencias)
+            enviados, errores, ultimo_error = self._enviados, self._errores, self._ultimo_error
+
+        def percentil(p):
+            if not latencias:
+                return None
+            return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 1)
+
+        return {
+            "pendientes": conteo['pendiente'],
+            "fallidos": conteo['fallido'],
+            "enviados": enviados,
+            "errores": errores,
+            "ultimo_error": ultimo_error,
+            "latencia_ms": {"p50": percentil(0.5), "p95": percentil(0.95), "max": percentil(1.0)},
+        }
+
+    def procesar_pendientes(self):
+        """Envía un lote de la cola. Devuelve cuántos mensajes se procesaron."""
+        # El reclamo cubre un solo envío y se renueva antes de cada uno: un
+        # lote lento (SMTP al límite del timeout) no vence a mitad de camino y
+        # otro worker no vuelve a mandar los mismos correos.
+        lease = self._lease_por_envio()
+        trabajos = self._cola.reclamar(TAMANO_LOTE, lease=lease)
+        if not trabajos:
+            return 0
+
+        enviados = []
+        for i, (id_, datos, intentos) in enumerate(trabajos):
+            if i:
+                self._cola.renovar([t[0] for t in trabajos[i:]], lease)
+            inicio = time.perf_counter()
+            try:
+                self._enviar(datos)
+            except Exception as e:
+                print(f"Error al enviar correo (intento {intentos + 1}): {e}")
+                # La sesión puede haber quedado en mal estado; se reabre en el próximo envío.
+                self._cerrar_smtp()
+                self._cola.reintentar(id_, e, intentos)
+                with self._lock_stats:
+                    self._errores += 1
+                    self._ultimo_error = str(e)
+                continue
+            enviados.append(id_)
+            with self._lock_stats:
+                self._latencias.append(time.perf_counter() - inicio)
+                self._enviados += 1
+
+        self._cola.completar(enviados)
+        return len(trabajos)
+
+    # --- Internos ---
+
+    def _lease_por_envio(self):
+        # Peor caso de un envío: connect, STARTTLS, login y sendmail agotando
+        # cada uno el timeout del socket, más margen.
+        return 4 * self._timeout + 30
+
+    def _en_reposo(self):
+        if self._smtp is not None and time.monotonic() - self._ultimo_uso > CIERRE_POR_INACTIVIDAD:
+            self._cerrar_smtp()
+
+    def _conexion(self):
+        """Devuelve la sesión SMTP abierta, creándola (y autenticándola) si hace falta."""
+        if self._smtp is not None:
+            # Dentro de un lote la sesión se usó hace instantes; solo verificamos
+            # con NOOP si estuvo quieta un rato (el servidor pudo haberla cerrado).
+            if time.monotonic() - self._ultimo_uso < 30:
+                return self._smtp
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._cerrar_smtp()
+
+        with medir_upstream('smtp', 'connect'):
+            smtp = smtplib.SMTP(self._servidor, self._puerto, timeout=self._timeout)
+            try:
+                if self._starttls:
+                    smtp.starttls()
+                if self._usuario and self._password:
+                    smtp.login(self._usuario, self._password)
+            except Exception:
+                smtp.close()
+                raise
+        self._smtp = smtp
+        self._ultimo_uso = time.monotonic()
+        return smtp
+
+    def _enviar(self, datos):
+        msg = MIMEText(datos["cuerpo"], "plain", "utf-8")
+        msg["Subject"] = Header(datos["asunto"], "utf-8")
+        if datos.get("nombre_remitente"):
+            msg["From"] = formataddr((Header(datos["nombre_remitente"], "utf-8").encode(), self._remitente))
+        else:
+            msg["From"] = self._remitente
+        msg["To"] = ", ".join(datos["destinatarios"])
+
+        smtp = self._conexion()
+        with medir_upstream('smtp', 'sendmail'):
+            smtp.sendmail(self._remitente, datos["destinatarios"], msg.as_string())
+        self._ultimo_uso = time.monotonic()
+
+    def _cerrar_smtp(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
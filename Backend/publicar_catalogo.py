@@ -0,0 +1,200 @@
+"""
+Instantánea estática del catálogo, para servir las lecturas públicas desde el CDN.
+
+Genera en un directorio:
+  manifest.json                       versión y rutas de los archivos (sin hash: revalidar siempre)
+  catalogo.<hash>.json                catálogo completo (mismo formato que GET /api/productos)
+  categorias/<categoria>.<hash>.json  productos de cada categoría
+  productos/<id>.<hash>.json          detalle (mismo formato que GET /api/productos/<id>)
+
+Cada archivo va también precomprimido (.gz y, si está instalado `brotli`,
+.br) para servidores con gzip_static / brotli_static. Los nombres llevan el
+hash del contenido, así pueden cachearse como inmutables; solo manifest.json
+cambia en cada publicación. Se conservan los archivos de la publicación
+anterior para las páginas que ya habían leído el manifest viejo.
+
+servidor.py republica (con demora, juntando modificaciones seguidas) después
+de cada escritura del catálogo: en CATALOGO_ESTATICO_DIR y/o llamando al
+build hook CATALOGO_HOOK_PUBLICACION. A mano, o desde el build del frontend:
+
+    python Backend/publicar_catalogo.py --salida catalogo
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+
+from cache_catalogo import serializar_catalogo
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo se generan los .gz
+    brotli = None
+
+MANIFEST = "manifest.json"
+SUBDIRECTORIOS = ("categorias", "productos")
+
+
+def _slug(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or 'sin-categoria')
+    ascii_ = descompuesto.encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_).strip('-') or 'sin-categoria'
+
+
+def _escribir_atomico(ruta, datos):
+    temporal = f"{ruta}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def _escribir_versionado(directorio, relativa, datos):
+    """Escribe `datos` (y sus versiones comprimidas) con el hash en el nombre. Devuelve la ruta relativa."""
+    huella = hashlib.sha256(datos).hexdigest()[:12]
+    relativa = f"{relativa}.{huella}.json"
+    ruta = os.path.join(directorio, relativa)
+    if not os.path.exists(ruta):  # mismo contenido, mismo nombre: ya está publicado
+        _escribir_atomico(f"{ruta}.gz", gzip.compress(datos, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _escribir_atomico(f"{ruta}.br", brotli.compress(datos, quality=11))
+        _escribir_atomico(ruta, datos)
+    return relativa
+
+
+def _rutas_de(manifest):
+    rutas = {manifest['catalogo']}
+    rutas.update(manifest.get('categorias', {}).values())
+    rutas.update(manifest.get('productos', {}).values())
+    return rutas
+
+
+def leer_manifest(directorio):
+    try:
+        with open(os.path.join(directorio, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def escribir_instantanea(directorio, productos, detalles):
+    """
+    Publica `productos` (formato del listado) y `detalles` ({id: producto en
+    formato de detalle}) en `directorio`. Devuelve el manifest escrito.
+    """
+    for subdirectorio in SUBDIRECTORIOS:
+        os.makedirs(os.path.join(directorio, subdirectorio), exist_ok=True)
+    anterior = leer_manifest(directorio)
+
+    por_categoria = {}
+    for producto in productos:
+        por_categoria.setdefault(producto['categoria'] or 'Sin Categoría', []).append(producto)
+
+    catalogo = _escribir_versionado(directorio, "catalogo", serializar_catalogo(productos))
+    manifest = {
+        "version": catalogo.split('.')[-2],
+        "generado": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "total": len(productos),
+        "catalogo": catalogo,
+        "categorias": {
+            categoria: _escribir_versionado(directorio, f"categorias/{_slug(categoria)}", serializar_catalogo(lista))
+            for categoria, lista in por_categoria.items()
+        },
+        "productos": {
+            str(producto_id): _escribir_versionado(
+                directorio, f"productos/{producto_id}", serializar_catalogo({"success": True, "producto": detalle})
+            )
+            for producto_id, detalle in detalles.items()
+        },
+    }
+    datos = json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8')
+    _escribir_atomico(os.path.join(directorio, MANIFEST), datos)
+    _escribir_atomico(os.path.join(directorio, f"{MANIFEST}.gz"), gzip.compress(datos, mtime=0))
+
+    conservar = _rutas_de(manifest) | (_rutas_de(anterior) if anterior else set())
+    _podar(directorio, conservar)
+    return manifest
+
+
+def _podar(directorio, conservar):
+    """Borra los archivos versionados que no usa ni esta publicación ni la anterior."""
+    candidatos = [(None, n) for n in os.listdir(directorio) if n.startswith("catalogo.")]
+    for subdirectorio in SUBDIRECTORIOS:
+        candidatos += [(subdirectorio, n) for n in os.listdir(os.path.join(directorio, subdirectorio))]
+    for subdirectorio, nombre in candidatos:
+        relativa = f"{subdirectorio}/{nombre}" if subdirectorio else nombre
+        base = relativa.removesuffix('.gz').removesuffix('.br')
+        if base.endswith('.json') and base not in conservar:
+            try:
+                os.remove(os.path.join(directorio, relativa))
+            except OSError:
+                pass
+
+
+class PublicacionDiferida:
+    """
+    Corre `publicar` en segundo plano `demora` segundos después de la última
+    llamada a `programar()`, así una tanda de ediciones genera una sola
+    publicación. Con cambios continuos (p. ej. muchas ventas) publica al
+    menos cada `demora_maxima` segundos. `descripcion` se usa en el nombre
+    del hilo y en los mensajes de error.
+    """
+
+    def __init__(self, publicar, demora=5, demora_maxima=60, descripcion="publicar-catalogo"):
+        self._publicar = publicar
+        self._descripcion = descripcion
+        self._demora = demora
+        self._demora_maxima = demora_maxima
+        self._lock = threading.Lock()
+        self._lock_publicacion = threading.Lock()
+        self._vence = None
+        self._limite = None
+        self._hilo = None
+
+    def programar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            self._vence = ahora + self._demora
+            if self._limite is None:
+                self._limite = ahora + self._demora_maxima
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._esperar_y_publicar, name=self._descripcion, daemon=True)
+                self._hilo.start()
+
+    def _esperar_y_publicar(self):
+        while True:
+            with self._lock:
+                espera = min(self._vence, self._limite) - time.monotonic()
+                if espera <= 0:
+                    # Lo que se programe desde acá en adelante arranca otra espera.
+                    self._vence = self._limite = self._hilo = None
+                    break
+            time.sleep(espera)
+
+        with self._lock_publicacion:
+            try:
+                self._publicar()
+            except Exception as e:
+                print(f"Error en {self._descripcion}: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publica la instantánea estática del catálogo.")
+    parser.add_argument("--salida", required=True, help="Directorio destino (p. ej. 'catalogo' junto al frontend).")
+    args = parser.parse_args()
+
+    # Misma configuración (.env) y mismo formato que la API.
+    import servidor
+
+    productos, detalles = servidor._instantanea_catalogo()
+    manifest = escribir_instantanea(args.salida, productos, detalles)
+    print(f"Catálogo {manifest['version']} publicado en {args.salida}: "
+          f"{manifest['total']} productos, {len(manifest['categorias'])} categorías.")
+    servidor.outbox.detener()
+    servidor.limpieza_cloudinary.detener()
@@ -0,0 +1,41 @@
+"""
+Serialización JSON de las respuestas.
+
+Con `orjson` instalado se usa para todo (bastante más rápido que `json` para
+el catálogo completo); sin él, `json` de la biblioteca estándar con la misma
+salida compacta en UTF-8.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Opcional
+    orjson = None
+
+
+def serializar(datos):
+    """JSON compacto en UTF-8 (bytes), sin escapar los caracteres no ASCII."""
+    if orjson is not None:
+        return orjson.dumps(datos, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    """Proveedor de Flask (app.json) que usa orjson en jsonify si está disponible."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        datos = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson(datos), mimetype=self.mimetype)
+
+    def _orjson(self, obj):
+        opciones = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=opciones)
@@ -1,5 +1,6 @@
+import atexit
 import os
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, g, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from functools import wraps
@@ -7,16 +8,34 @@ import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 from supabase import create_client, Client
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
-from email.utils import formataddr
+import hashlib
+import hmac
+import httpx
+from cache_catalogo import CacheCatalogo, CAMPOS_PRODUCTO, proyectar, serializar_catalogo
+from compresion import MINIMO_BYTES, comprimir, elegir_codificacion
+from serializacion import ProveedorJSON
+from indice_catalogo import ORDENES_VALIDOS, LIMITE_POR_DEFECTO, LIMITE_MAXIMO
+from indice_sugerencias import IndiceSugerencias
+from auth_local import VerificadorJWT, CacheRoles
+from outbox import OutboxEmail
+from carga_masiva import ImportadorProductos, leer_csv, leer_ndjson, recorrer_productos, exportar_csv, exportar_ndjson
+from limpieza_cloudinary import LimpiezaCloudinary, extraer_public_id_de_url, urls_registradas_en_supabase
+from subida_imagenes import SubidorImagenes, MAX_ARCHIVOS_POR_LOTE
+from variantes_imagen import calcular_variantes, variantes_de_fila, fila_imagen
+from checkout_agrupado import AgrupadorCheckout, FuncionLoteNoDisponible, validar_carrito
+from idempotencia import RegistroIdempotencia
+from lectura_pg import LectorPostgres, CONSULTAS as CONSULTAS_PG
+from publicar_catalogo import PublicacionDiferida, escribir_instantanea
+from eventos_stock import DifusorStock, SuscripcionRealtime
+from limitador import Limitador, Regla, Cuota, Rechazo
+import metricas
 
 # Cargar variables de entorno del archivo .env
 load_dotenv()
 
 app = Flask(__name__, template_folder='../templates')
 app.secret_key = os.getenv("SECRET_KEY")
+app.json = ProveedorJSON(app)  # jsonify con orjson si está instalado
 
 # --- CONFIGURACIÓN DE CORS ---
 # Asegúrate de que los orígenes coincidan con tu frontend en desarrollo y producción
@@ -27,12 +46,104 @@ origins = [
 CORS(app, resources={r"/api/*": {"origins": origins}, r"/*": {"origins": origins}}, supports_credentials=True)
 
 
+# --- MÉTRICAS ---
+# Latencia por ruta y por upstream en /metrics (formato Prometheus). Los
+# pedidos que superan LENTO_MS se imprimen con su desglose por upstream.
+# /metrics exige "Authorization: Bearer <METRICAS_TOKEN>"; sin token
+# configurado el endpoint no existe (404).
+UMBRAL_LENTO = float(os.getenv("LENTO_MS", "1000")) / 1000
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")
+
+@app.before_request
+def _iniciar_metricas():
+    g.metricas = metricas.iniciar_solicitud()
+
+@app.after_request
+def _codigo_metricas(response):
+    g.codigo = response.status_code
+    return response
+
+@app.teardown_request
+def _terminar_metricas(error):
+    token = g.pop('metricas', None)
+    if token is None:
+        return
+    # La regla (/api/productos/<int:producto_id>) y no la URL, para no crear una serie por ID.
+    ruta = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    codigo = g.pop('codigo', 500 if error else 200)
+    metricas.terminar_solicitud(token, ruta, request.method, codigo, UMBRAL_LENTO)
+
+# --- COMPRESIÓN ---
+# Las respuestas JSON se comprimen con br o gzip según Accept-Encoding
+# (COMPRIMIR_RESPUESTAS=0 lo desactiva, p. ej. si ya comprime un proxy).
+COMPRIMIR_RESPUESTAS = os.getenv("COMPRIMIR_RESPUESTAS", "1") == "1"
+
+@app.after_request
+def _comprimir_respuesta(response):
+    if (not COMPRIMIR_RESPUESTAS or response.status_code != 200 or response.mimetype != 'application/json'
+            or response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.headers.get('Accept-Encoding'))
+    if codificacion is None:
+        return response
+
+    # Cuerpos en caché (el catálogo) traen su versión ya comprimida.
+    comprimible = g.pop('cuerpo_comprimible', None)
+    if comprimible is not None:
+        datos = comprimible.en(codificacion)
+    else:
+        cuerpo = response.get_data()
+        if len(cuerpo) < MINIMO_BYTES:
+            return response
+        datos = comprimir(cuerpo, codificacion)
+    response.set_data(datos)
+    response.headers['Content-Encoding'] = codificacion
+    # Los bytes cambian con la codificación: el ETag pasa a ser débil (como hace nginx).
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/metrics')
+def exponer_metricas():
+    if not METRICAS_TOKEN:
+        return jsonify({"success": False, "error": "No encontrado"}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICAS_TOKEN}"):
+        return jsonify({"success": False, "error": "No autorizado"}), 401
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
+
 # --- INICIALIZACIÓN DE CLIENTES EXTERNOS ---
 
 # Cliente de Supabase
 url: str = os.getenv("SUPABASE_URL")
 key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+# Cada subcliente usa su propio httpx medido: cada llamada a PostgREST y Auth
+# queda registrada (ver metricas.py). Los clientes se cierran al salir.
+opciones_supabase = metricas.OpcionesSupabaseMedidas()
+supabase: Client = create_client(url, key, options=opciones_supabase)
+atexit.register(opciones_supabase.cerrar)
+
+# Lecturas calientes directo contra Postgres. LECTURA_PG elige qué consultas
+# van por ahí (p. ej. "catalogo,producto,lote,rol"); vacía = todo por PostgREST.
+LECTURA_PG = {c.strip() for c in os.getenv("LECTURA_PG", "").split(",") if c.strip()}
+for consulta in LECTURA_PG - set(CONSULTAS_PG):
+    print(f"AVISO: LECTURA_PG incluye '{consulta}', que no es una consulta conocida ({', '.join(CONSULTAS_PG)}).")
+lector_pg = LectorPostgres(
+    os.getenv("LECTURA_PG_DSN") or os.getenv("SUPABASE_CONNECTION_STRING"),
+    maximo=int(os.getenv("LECTURA_PG_MAX_CONEXIONES", "10")),
+    preparadas=os.getenv("LECTURA_PG_PREPARADAS", "1") == "1"
+) if LECTURA_PG else None
+
+# Validación local de los JWT de Supabase y caché de roles de usuario. Los
+# cambios de rol hechos fuera de esta app (p. ej. en el panel de Supabase)
+# tardan hasta ROL_CACHE_TTL segundos en verse en cada worker.
+verificador_jwt = VerificadorJWT(url, secreto=os.getenv("SUPABASE_JWT_SECRET"))
+cache_roles = CacheRoles(
+    ttl=float(os.getenv("ROL_CACHE_TTL", "30")),
+    max_entradas=int(os.getenv("ROL_CACHE_MAX", "1024"))
+)
 
 # Configuración de Cloudinary (sin cambios)
 cloudinary.config(
@@ -42,19 +153,89 @@ cloudinary.config(
   secure = True
 )
 
-# Configuración de Email (sin cambios)
+# Configuración de Email
 EMAIL_FROM = os.getenv("EMAIL_FROM")
 EMAIL_TO = os.getenv("EMAIL_TO")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+
+# Bandeja de salida: los correos se guardan en SQLite y un hilo los envía
+# reutilizando una sola sesión SMTP.
+outbox = OutboxEmail(
+    os.getenv("OUTBOX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox.db")),
+    SMTP_SERVER, SMTP_PORT,
+    usuario=EMAIL_FROM, password=EMAIL_PASS,
+    starttls=os.getenv("SMTP_STARTTLS", "1") == "1",
+    remitente=EMAIL_FROM
+)
+outbox.iniciar()
+
+# Borrado diferido de imágenes en Cloudinary y barrido periódico de huérfanas
+# (BARRIDO_HUERFANOS_HORAS=0 lo desactiva).
+limpieza_cloudinary = LimpiezaCloudinary(
+    os.getenv("LIMPIEZA_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "limpieza.db")),
+    lambda: urls_registradas_en_supabase(supabase),
+    intervalo_barrido=float(os.getenv("BARRIDO_HUERFANOS_HORAS", "0")) * 3600,
+    prefijo=os.getenv("CLOUDINARY_PREFIJO_BARRIDO")
+)
+limpieza_cloudinary.iniciar()
+
+# Subidas de imágenes en lote: pool acotado compartido por todo el worker.
+subidor_imagenes = SubidorImagenes(
+    concurrencia=int(os.getenv("SUBIDAS_CONCURRENTES", "4")),
+    max_bytes=int(float(os.getenv("SUBIDA_MAX_MB_ARCHIVO", "10")) * 1024 * 1024)
+)
+# Tope del cuerpo de las rutas de subida de imágenes. Va por ruta y no en
+# MAX_CONTENT_LENGTH: la importación masiva se procesa en streaming y no
+# tiene por qué caber en este límite.
+SUBIDA_MAX_BYTES_TOTAL = int(float(os.getenv("SUBIDA_MAX_MB_TOTAL", "60")) * 1024 * 1024)
+
+
+def limite_cuerpo(max_bytes):
+    """Rechaza con 413 los cuerpos de más de `max_bytes` en la ruta decorada."""
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Werkzeug lanza el 413 al leer el cuerpo (form, files o stream).
+            request.max_content_length = max_bytes
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorador
 
 
 # --- DECORADOR DE AUTENTICACIÓN PARA ADMINS ---
+def _identificar_usuario(jwt_token):
+    """
+    Valida el token y devuelve {'id', 'email', 'claims'}. Si la firma puede
+    verificarse localmente no hay ninguna llamada de red; si no (por ejemplo
+    un token HS256 sin SUPABASE_JWT_SECRET configurado) se consulta a Supabase.
+    """
+    if verificador_jwt.puede_verificar(jwt_token):
+        claims = verificador_jwt.verificar(jwt_token)
+        return {"id": claims['sub'], "email": claims.get('email'), "claims": claims}
+
+    user_res = supabase.auth.get_user(jwt_token)
+    return {"id": user_res.user.id, "email": user_res.user.email, "claims": None}
+
+def _obtener_rol(user_id):
+    """Devuelve el rol del usuario, consultando 'profiles' solo si no está en caché."""
+    rol = cache_roles.obtener(user_id)
+    if rol is None:
+        if 'rol' in LECTURA_PG:
+            rol = lector_pg.rol(user_id)
+        else:
+            profile_res = supabase.table('profiles').select('role').eq('id', user_id).single().execute()
+            rol = profile_res.data['role'] if profile_res.data else None
+        if rol is not None:
+            cache_roles.guardar(user_id, rol)
+    return rol
+
 def admin_required(f):
     """
     Verifica que se provea un JWT válido en el header 'Authorization',
     y que el usuario asociado a ese token tenga el rol 'admin'.
+    La identidad validada queda disponible para la ruta en `g.usuario`.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -65,92 +246,434 @@ def admin_required(f):
         jwt_token = auth_header.split(" ")[1]
         
         try:
-            # 1. Valida el token y obtiene el usuario de Supabase
-            user_res = supabase.auth.get_user(jwt_token)
-            user_id = user_res.user.id
+            # 1. Valida el token (localmente si es posible)
+            usuario = _identificar_usuario(jwt_token)
 
-            # 2. Verifica el rol en nuestra tabla 'profiles'
-            profile_res = supabase.table('profiles').select('role').eq('id', user_id).single().execute()
-            
-            if profile_res.data and profile_res.data['role'] == 'admin':
-                # Si es admin, permite el acceso a la ruta
-                return f(*args, **kwargs)
-            else:
-                # Si no es admin, prohíbe el acceso
-                return jsonify({"success": False, "error": "Acceso denegado. Se requieren permisos de administrador."}), 403
-        
+            # 2. Verifica el rol en nuestra tabla 'profiles' (con caché)
+            usuario['role'] = _obtener_rol(usuario['id'])
         except Exception:
             return jsonify({"success": False, "error": "Token inválido o expirado."}), 401
+
+        if usuario['role'] != 'admin':
+            # Si no es admin, prohíbe el acceso
+            return jsonify({"success": False, "error": "Acceso denegado. Se requieren permisos de administrador."}), 403
+
+        # Si es admin, permite el acceso a la ruta
+        g.usuario = usuario
+        return f(*args, **kwargs)
             
     return decorated_function
 
 
+# --- LIMITADOR DE RUTAS COSTOSAS ---
+# Cuotas ("pedidos/segundos"; vacío o 0 = sin límite) de las rutas públicas
+# que disparan trabajo caro, y cupos de pedidos en curso por upstream
+# compartidos entre workers (ver limitador.py). Las lecturas del catálogo no
+# pasan por acá. LIMITADOR=0 lo desactiva.
+REGLAS_LIMITE = {
+    'login': Regla(
+        Cuota.leer(os.getenv("LIMITE_LOGIN_IP", "10/60")), Cuota.leer(os.getenv("LIMITE_LOGIN", "300/60")), 'auth'
+    ),
+    'registro': Regla(
+        Cuota.leer(os.getenv("LIMITE_REGISTRO_IP", "3/600")), Cuota.leer(os.getenv("LIMITE_REGISTRO", "30/60")), 'auth'
+    ),
+    'contacto': Regla(
+        Cuota.leer(os.getenv("LIMITE_CONTACTO_IP", "3/600")), Cuota.leer(os.getenv("LIMITE_CONTACTO", "30/60"))
+    ),
+    'checkout': Regla(
+        Cuota.leer(os.getenv("LIMITE_CHECKOUT_IP", "20/60")), Cuota.leer(os.getenv("LIMITE_CHECKOUT", "600/60")), 'stock'
+    ),
+}
+# Detrás de cuántos proxies propios estamos (Render agrega uno): la IP del
+# cliente es la que agregó el último de ellos a X-Forwarded-For.
+PROXIES_CONFIABLES = int(os.getenv("PROXIES_CONFIABLES", "1"))
+
+limitador = Limitador(
+    os.getenv("LIMITADOR_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "limitador.db")),
+    cupos={
+        'auth': int(os.getenv("LIMITE_CUPO_AUTH", "8")),
+        'stock': int(os.getenv("LIMITE_CUPO_STOCK", "16")),
+    },
+    # Con gunicorn --threads 8 quedan al menos 2 hilos por worker para el
+    # catálogo.
+    max_por_proceso=int(os.getenv("LIMITE_COSTOSAS_POR_PROCESO", "6"))
+) if os.getenv("LIMITADOR", "1") == "1" else None
+
+def _ip_cliente():
+    saltos = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+    if PROXIES_CONFIABLES and len(saltos) >= PROXIES_CONFIABLES:
+        return saltos[-PROXIES_CONFIABLES]
+    return request.remote_addr or 'desconocida'
+
+def limitado(nombre):
+    """Decorador: aplica la regla `nombre` de REGLAS_LIMITE (429/503 con Retry-After si no hay lugar)."""
+    regla = REGLAS_LIMITE[nombre]
+
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if limitador is None:
+                return f(*args, **kwargs)
+            pase = limitador.entrar(nombre, regla, _ip_cliente())
+            if isinstance(pase, Rechazo):
+                metricas.rechazos_limitador.sumar(nombre, pase.motivo)
+                error = ("Demasiados intentos. Intenta de nuevo en unos minutos." if pase.codigo == 429
+                         else "El servidor está ocupado. Intenta de nuevo en unos segundos.")
+                return jsonify({"success": False, "error": error}), pase.codigo, {'Retry-After': str(pase.reintentar)}
+            try:
+                return f(*args, **kwargs)
+            finally:
+                limitador.salir(pase)
+        return decorated_function
+    return decorador
+
 # --- FUNCIONES AUXILIARES ---
-def extraer_public_id_de_url(url):
-    """Extrae el public_id de una URL de Cloudinary para poder eliminar la imagen."""
-    try:
-        parte_esencial = url.split('/upload/')[1]
-        sin_version = parte_esencial.split('/', 1)[1]
-        public_id = os.path.splitext(sin_version)[0]
-        return public_id
-    except IndexError:
-        return None
+def _leer_filas_catalogo():
+    """Todas las filas de Productos con sus ImagenesProducto."""
+    if 'catalogo' in LECTURA_PG:
+        return lector_pg.catalogo()
+    return supabase.table('Productos').select('*, ImagenesProducto(*)').execute().data
+
+def _formatear_para_listado(prod):
+    """Formato de la API para una fila de Productos en el listado."""
+    return {
+        "id": prod['ProductoID'],
+        "nombre": prod['Nombre'],
+        "descripcion": prod['Descripcion'],
+        "precio": float(prod['Precio']),
+        "stock": prod['Stock'],
+        "categoria": prod['Categoria'],
+        "imagenes": [img['URL'] for img in prod.get('ImagenesProducto', [])],
+        # Misma posición que en 'imagenes': {'thumb', 'card', 'full', 'srcset'}
+        "variantes": [variantes_de_fila(img) for img in prod.get('ImagenesProducto', [])]
+    }
+
+def _consultar_productos():
+    """Consulta y formatea todos los productos y sus imágenes desde Supabase."""
+    return [_formatear_para_listado(prod) for prod in _leer_filas_catalogo()]
+
+# --- CATÁLOGO ESTÁTICO ---
+# Tras cada escritura (con CATALOGO_PUBLICAR_DEMORA segundos de demora para
+# juntar ediciones seguidas) se republica la instantánea estática del catálogo
+# en CATALOGO_ESTATICO_DIR y/o se llama al build hook CATALOGO_HOOK_PUBLICACION
+# (p. ej. el de Netlify, cuyo build corre publicar_catalogo.py).
+CATALOGO_ESTATICO_DIR = os.getenv("CATALOGO_ESTATICO_DIR")
+CATALOGO_HOOK_PUBLICACION = os.getenv("CATALOGO_HOOK_PUBLICACION")
+
+def _instantanea_catalogo():
+    """(productos en formato de listado, {id: producto en formato de detalle}) con una sola lectura."""
+    filas = _leer_filas_catalogo()
+    productos = [_formatear_para_listado(prod) for prod in filas]
+    detalles = {prod['ProductoID']: _formatear_producto(prod) for prod in filas}
+    return productos, detalles
+
+def _publicar_catalogo_estatico():
+    if CATALOGO_ESTATICO_DIR:
+        manifest = escribir_instantanea(CATALOGO_ESTATICO_DIR, *_instantanea_catalogo())
+        print(f"Catálogo estático {manifest['version']} publicado en {CATALOGO_ESTATICO_DIR}.")
+    if CATALOGO_HOOK_PUBLICACION:
+        with metricas.medir_upstream('hook', 'publicar_catalogo'):
+            httpx.post(CATALOGO_HOOK_PUBLICACION, timeout=10).raise_for_status()
+
+publicacion_catalogo = PublicacionDiferida(
+    _publicar_catalogo_estatico,
+    demora=float(os.getenv("CATALOGO_PUBLICAR_DEMORA", "5"))
+) if CATALOGO_ESTATICO_DIR or CATALOGO_HOOK_PUBLICACION else None
+
+# --- STOCK EN VIVO ---
+# GET /api/stream/stock transmite por SSE los cambios de stock y precio (ver
+# eventos_stock.py). Cada recarga de la caché del catálogo alimenta al
+# difusor; tras una escritura propia se adelanta la recarga si hay clientes
+# conectados. Con STOCK_REALTIME=1 además se escuchan los cambios de la
+# tabla Productos por Supabase Realtime (también los de otros procesos).
+difusor_stock = DifusorStock(
+    capacidad=int(os.getenv("STOCK_STREAM_BUFFER", "1000")),
+    latido=float(os.getenv("STOCK_STREAM_LATIDO", "15"))
+)
+# El stream solo se sirve en modo asgi, por el event loop (ver asgi.py), hasta
+# STOCK_STREAM_MAX_CLIENTES por proceso; a los que sobran se les pide
+# reintentar en STOCK_STREAM_REINTENTO segundos. En modo wsgi cada conexión
+# ocuparía un hilo de gunicorn mientras la página está abierta: la ruta
+# responde 204 y el navegador consulta el stock cada tanto.
+STOCK_STREAM_MAX_CLIENTES = int(os.getenv("STOCK_STREAM_MAX_CLIENTES", "1000"))
+STOCK_STREAM_REINTENTO = float(os.getenv("STOCK_STREAM_REINTENTO", "300"))
+
+def _refrescar_stock():
+    cache_catalogo.obtener()  # la recarga publica los cambios (ver _al_cargar_catalogo)
+
+refresco_stock = PublicacionDiferida(_refrescar_stock, demora=0.2, demora_maxima=2, descripcion="refrescar-stock")
+
+def _cambio_realtime(tipo, fila):
+    if tipo == 'DELETE':
+        difusor_stock.eliminar(fila['ProductoID'])
+    elif 'Stock' in fila and 'Precio' in fila:
+        difusor_stock.actualizar(
+            [{"id": fila['ProductoID'], "stock": fila['Stock'], "precio": float(fila['Precio'])}], completo=False
+        )
+
+suscripcion_stock = SuscripcionRealtime(
+    url, key, _cambio_realtime, al_conectar=_refrescar_stock
+).iniciar() if os.getenv("STOCK_REALTIME") == "1" else None
+
+# Índice de autocompletado. Las rutas de escritura lo actualizan de a un
+# producto; cada recarga de la caché lo re-sincroniza con el catálogo.
+indice_sugerencias = IndiceSugerencias()
+
+def _al_cargar_catalogo(productos):
+    indice_sugerencias.sincronizar(productos)
+    difusor_stock.actualizar(productos)
+
+def _al_invalidar_catalogo():
+    if publicacion_catalogo is not None:
+        publicacion_catalogo.programar()
+    if difusor_stock.clientes:
+        refresco_stock.programar()
+
+# Caché del catálogo: se renueva cada CATALOGO_CACHE_TTL segundos o cuando
+# una ruta de escritura la invalida.
+cache_catalogo = CacheCatalogo(
+    _consultar_productos,
+    ttl=float(os.getenv("CATALOGO_CACHE_TTL", "60")),
+    al_cargar=_al_cargar_catalogo,
+    al_invalidar=_al_invalidar_catalogo
+)
 
 def _get_all_products():
-    """Obtiene y formatea todos los productos y sus imágenes desde Supabase."""
+    """Obtiene todos los productos (desde la caché si está vigente)."""
     try:
-        response = supabase.table('Productos').select('*, ImagenesProducto(*)').execute()
-        productos_formateados = []
-        for prod in response.data:
-            producto = {
-                "id": prod['ProductoID'],
-                "nombre": prod['Nombre'],
-                "descripcion": prod['Descripcion'],
-                "precio": float(prod['Precio']),
-                "stock": prod['Stock'],
-                "categoria": prod['Categoria'],
-                "imagenes": [img['URL'] for img in prod.get('ImagenesProducto', [])]
-            }
-            productos_formateados.append(producto)
-        return productos_formateados
+        return cache_catalogo.obtener().productos
     except Exception as e:
         print(f"Error al consultar productos en Supabase: {e}")
         return []
 
+# Parámetros de /api/productos que activan el modo filtrado/paginado.
+PARAMETROS_LISTADO = ('categoria', 'precio_min', 'precio_max', 'q', 'sort', 'cursor', 'limit')
+
+def _leer_filtros_listado(args):
+    """Valida los parámetros de filtrado del listado. Lanza ValueError si alguno es inválido."""
+    def numero(nombre, tipo):
+        valor = args.get(nombre)
+        if valor is None or valor == '':
+            return None
+        try:
+            return tipo(valor)
+        except ValueError:
+            raise ValueError(f"El parámetro '{nombre}' debe ser numérico.")
+
+    sort = args.get('sort') or None
+    if sort is not None and sort not in ORDENES_VALIDOS:
+        raise ValueError(f"El parámetro 'sort' debe ser uno de: {', '.join(ORDENES_VALIDOS)}.")
+
+    cursor = numero('cursor', int)
+    cursor = 0 if cursor is None else cursor
+    limit = numero('limit', int)
+    limit = LIMITE_POR_DEFECTO if limit is None else limit
+    if cursor < 0 or limit < 1:
+        raise ValueError("Los parámetros 'cursor' y 'limit' deben ser positivos.")
+
+    return {
+        'categoria': args.get('categoria') or None,
+        'precio_min': numero('precio_min', float),
+        'precio_max': numero('precio_max', float),
+        'q': args.get('q') or None,
+        'sort': sort,
+        'cursor': cursor,
+        'limit': min(limit, LIMITE_MAXIMO),
+    }
+
+def _leer_campos(args):
+    """
+    Lee `fields` (p. ej. "id,nombre,precio,imagenes"). Devuelve una tupla en el
+    orden de CAMPOS_PRODUCTO, o None si no se pidió. Lanza ValueError si hay
+    campos desconocidos.
+    """
+    valor = args.get('fields')
+    if not valor:
+        return None
+    pedidos = {campo.strip() for campo in valor.split(',') if campo.strip()}
+    desconocidos = pedidos - set(CAMPOS_PRODUCTO)
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos en 'fields': {', '.join(sorted(desconocidos))}. "
+                         f"Válidos: {', '.join(CAMPOS_PRODUCTO)}.")
+    return tuple(campo for campo in CAMPOS_PRODUCTO if campo in pedidos)
+
+def _pagina_listado(entrada, filtros, query_string, campos=None):
+    """Devuelve (cuerpo, etag) de una página filtrada del listado."""
+    productos, total, siguiente = entrada.indice.consultar(**filtros)
+    cuerpo = serializar_catalogo({
+        "productos": [proyectar(p, campos) for p in productos],
+        "total": total,
+        "siguiente_cursor": None if siguiente is None else str(siguiente)
+    })
+    # La página depende solo de la versión del catálogo y de la consulta.
+    etag = hashlib.sha256(f"{entrada.etag}?{query_string}".encode()).hexdigest()[:32]
+    return cuerpo, etag
+
+def _formatear_producto(prod):
+    """Formato de la API para una fila de Productos con sus ImagenesProducto (vista de detalle)."""
+    return {
+        "id": prod['ProductoID'],
+        "nombre": prod['Nombre'],
+        "descripcion": prod['Descripcion'],
+        "precio": float(prod['Precio']),
+        "stock": prod['Stock'],
+        "categoria": prod['Categoria'],
+        "imagenes": [
+            {"id": img['ImagenID'], "url": img['URL'], "variantes": variantes_de_fila(img)}
+            for img in prod.get('ImagenesProducto', [])
+        ]
+    }
+
+# Máximo de IDs por consulta de /api/productos?ids= y /api/productos/lote.
+LOTE_MAXIMO = 100
+
+def _leer_ids(valores):
+    """Valida los IDs pedidos (números o texto numérico). Devuelve la lista sin repetidos. Lanza ValueError."""
+    ids = []
+    for valor in valores:
+        try:
+            producto_id = int(str(valor).strip())
+        except ValueError:
+            raise ValueError(f"ID de producto inválido: '{valor}'.")
+        if producto_id not in ids:
+            ids.append(producto_id)
+    if not ids:
+        raise ValueError("No se recibieron IDs de productos.")
+    if len(ids) > LOTE_MAXIMO:
+        raise ValueError(f"Se pueden consultar hasta {LOTE_MAXIMO} productos por vez.")
+    return ids
+
+def _leer_filas_lote(ids):
+    """Filas de Productos (con sus imágenes) de los `ids` que existen, en una sola consulta."""
+    if 'lote' in LECTURA_PG:
+        return lector_pg.productos(ids)
+    return supabase.table('Productos').select('ProductoID, Precio, Stock, ImagenesProducto(*)') \
+        .in_('ProductoID', ids).execute().data
+
+def _respuesta_lote(ids, filas):
+    """Precio, stock e imagen principal actuales de cada ID, y los IDs que ya no existen."""
+    encontrados = {}
+    for prod in filas:
+        imagen = (prod.get('ImagenesProducto') or [None])[0]
+        encontrados[prod['ProductoID']] = {
+            "id": prod['ProductoID'],
+            "precio": float(prod['Precio']),
+            "stock": prod['Stock'],
+            "imagen": imagen['URL'] if imagen else None,
+            "variantes": variantes_de_fila(imagen) if imagen else None
+        }
+    return {
+        "success": True,
+        "productos": [encontrados[i] for i in ids if i in encontrados],
+        "faltantes": [i for i in ids if i not in encontrados]
+    }
+
+def _responder_lote(valores):
+    try:
+        ids = _leer_ids(valores)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        respuesta = _respuesta_lote(ids, _leer_filas_lote(ids))
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    response = jsonify(respuesta)
+    response.headers['Cache-Control'] = 'no-store'  # es para revalidar: siempre el dato actual
+    return response
+
 # --- RUTAS DE LA API ---
 
 # --- RUTAS DE PRODUCTOS (CRUD) ---
 
 @app.route("/api/productos", methods=["GET"])
 def obtener_productos():
-    """Endpoint público para obtener todos los productos."""
-    lista_productos = _get_all_products()
-    if not lista_productos:
-        return jsonify([]) # Devolver lista vacía si no hay productos o hay error
-    return jsonify(lista_productos)
+    """
+    Endpoint público para obtener los productos.
+    Sin parámetros devuelve el catálogo completo. Con alguno de `categoria`,
+    `precio_min`, `precio_max`, `q`, `sort`, `cursor` o `limit` devuelve una
+    página filtrada: {"productos": [...], "total": n, "siguiente_cursor": c}.
+    `fields` (p. ej. "id,nombre,precio,imagenes") limita los campos de cada producto.
+    Con `ids` (p. ej. "1,5,9") devuelve precio, stock e imagen actuales de esos
+    productos, como /api/productos/lote.
+    """
+    if 'ids' in request.args:
+        return _responder_lote(request.args['ids'].split(','))
+
+    filtrado = any(param in request.args for param in PARAMETROS_LISTADO)
+    try:
+        campos = _leer_campos(request.args)
+        if filtrado:
+            filtros = _leer_filtros_listado(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        entrada = cache_catalogo.obtener()
+    except Exception as e:
+        print(f"Error al consultar productos en Supabase: {e}")
+        return jsonify([]) # Devolver lista vacía si hay error
+
+    if filtrado:
+        cuerpo, etag = _pagina_listado(entrada, filtros, request.query_string.decode(), campos)
+        response = Response(cuerpo, mimetype='application/json')
+        response.set_etag(etag)
+    else:
+        # El cuerpo ya viene serializado (y se comprime una vez por versión);
+        # si el navegador tiene la misma versión (If-None-Match) respondemos 304 sin cuerpo.
+        vista = entrada.vista(campos)
+        response = Response(vista.cuerpo.cuerpo, mimetype='application/json')
+        response.set_etag(vista.etag)
+        g.cuerpo_comprimible = vista.cuerpo
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route("/api/sugerencias", methods=["GET"])
+def obtener_sugerencias():
+    """Endpoint público de autocompletado: hasta 5 productos que coinciden con `q`."""
+    q = (request.args.get('q') or '').strip()
+    if len(q) < 2:
+        return jsonify([])
+    try:
+        # Garantiza que el índice esté cargado y al día con la caché vigente.
+        cache_catalogo.obtener()
+    except Exception as e:
+        print(f"Error al consultar productos en Supabase: {e}")
+    response = jsonify(indice_sugerencias.buscar(q))
+    response.headers['Cache-Control'] = 'public, max-age=30'
+    return response
 
 @app.route('/api/productos/<int:producto_id>', methods=['GET'])
 def obtener_producto(producto_id):
-    """Endpoint protegido para obtener un solo producto por su ID."""
+    """Endpoint público para obtener un solo producto por su ID (admite `fields` como el listado)."""
     try:
-        response = supabase.table('Productos').select('*, ImagenesProducto(*)').eq('ProductoID', producto_id).single().execute()
-        if not response.data:
+        campos = _leer_campos(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        if 'producto' in LECTURA_PG:
+            prod = lector_pg.producto(producto_id)
+        else:
+            prod = supabase.table('Productos').select('*, ImagenesProducto(*)').eq('ProductoID', producto_id).single().execute().data
+        if not prod:
             return jsonify({"success": False, "error": "Producto no encontrado"}), 404
         
-        prod = response.data
-        producto_formateado = {
-            "id": prod['ProductoID'],
-            "nombre": prod['Nombre'],
-            "descripcion": prod['Descripcion'],
-            "precio": float(prod['Precio']),
-            "stock": prod['Stock'],
-            "categoria": prod['Categoria'],
-            "imagenes": [{"id": img['ImagenID'], "url": img['URL']} for img in prod.get('ImagenesProducto', [])]
-        }
-        return jsonify({"success": True, "producto": producto_formateado})
+        return jsonify({"success": True, "producto": proyectar(_formatear_producto(prod), campos)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/productos/lote', methods=['POST'])
+def obtener_productos_lote():
+    """
+    Endpoint público para revalidar el carrito en una sola consulta.
+    Recibe {"ids": [1, 5, 9]} y devuelve {"productos": [{"id", "precio",
+    "stock", "imagen", "variantes"}], "faltantes": [IDs que ya no existen]}.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list):
+        return jsonify({"success": False, "error": "Se esperaba {\"ids\": [...]}."}), 400
+    return _responder_lote(ids)
+
 @app.route('/api/productos', methods=['POST'])
 @admin_required
 def crear_producto():
@@ -169,9 +692,14 @@ def crear_producto():
         nuevo_producto_id = response_prod.data[0]['ProductoID']
 
         if nuevo_producto_id and data['imagenes_urls']:
-            imagenes_data = [{'ProductoID': nuevo_producto_id, 'URL': url} for url in data['imagenes_urls']]
+            imagenes_data = [fila_imagen(nuevo_producto_id, url) for url in data['imagenes_urls']]
             supabase.table('ImagenesProducto').insert(imagenes_data).execute()
         
+        cache_catalogo.invalidar()
+        indice_sugerencias.actualizar({
+            'id': nuevo_producto_id, 'nombre': producto_data['Nombre'],
+            'descripcion': producto_data['Descripcion'], 'imagenes': data['imagenes_urls']
+        })
         return jsonify({"success": True, "message": "Producto creado con éxito", "producto_id": nuevo_producto_id}), 201
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -187,6 +715,10 @@ def actualizar_producto(producto_id):
             'Precio': float(data['precio']), 'Stock': int(data['stock']), 'Categoria': data['categoria']
         }
         supabase.table('Productos').update(update_data).eq('ProductoID', producto_id).execute()
+        cache_catalogo.invalidar()
+        indice_sugerencias.actualizar({
+            'id': producto_id, 'nombre': update_data['Nombre'], 'descripcion': update_data['Descripcion']
+        })
         return jsonify({"success": True, "message": "Producto actualizado con éxito."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -199,27 +731,69 @@ def eliminar_producto(producto_id):
         response_imgs = supabase.table('ImagenesProducto').select('URL').eq('ProductoID', producto_id).execute()
         urls_a_borrar = [img['URL'] for img in response_imgs.data]
 
-        for url in urls_a_borrar:
-            public_id = extraer_public_id_de_url(url)
-            if public_id:
-                cloudinary.uploader.destroy(public_id)
-
         supabase.table('Productos').delete().eq('ProductoID', producto_id).execute()
+        # Las imágenes se borran de Cloudinary en segundo plano.
+        limpieza_cloudinary.programar([extraer_public_id_de_url(url) for url in urls_a_borrar])
+        cache_catalogo.invalidar()
+        indice_sugerencias.eliminar(producto_id)
         return jsonify({"success": True, "message": "Producto y sus imágenes eliminados con éxito."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/productos/bulk', methods=['POST'])
+@admin_required
+def importar_productos():
+    """
+    Endpoint protegido para crear/actualizar productos en masa.
+    Acepta NDJSON (por defecto) o CSV (Content-Type: text/csv) y lo procesa
+    a medida que llega. Las filas con 'id' actualizan solo los campos que
+    traen; las filas sin 'id' crean productos. Los errores se informan por fila.
+    """
+    if request.mimetype == 'text/csv':
+        filas = leer_csv(request.stream)
+    else:
+        filas = leer_ndjson(request.stream)
+
+    try:
+        resumen = ImportadorProductos(supabase).importar(filas)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        cache_catalogo.invalidar()
+
+    return jsonify({"success": not resumen["errores"], **resumen})
+
+@app.route('/api/productos/bulk', methods=['GET'])
+@admin_required
+def exportar_productos():
+    """Endpoint protegido que exporta el catálogo en streaming (?formato=ndjson|csv)."""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in ('ndjson', 'csv'):
+        return jsonify({"success": False, "error": "Formato no soportado. Use 'ndjson' o 'csv'."}), 400
+
+    productos = recorrer_productos(supabase)
+    if formato == 'csv':
+        cuerpo, mimetype = exportar_csv(productos), 'text/csv'
+    else:
+        cuerpo, mimetype = exportar_ndjson(productos), 'application/x-ndjson'
+    response = Response(stream_with_context(cuerpo), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="productos.{formato}"'
+    return response
+
 # --- RUTAS DE IMÁGENES ---
 
 @app.route('/api/upload-image', methods=['POST'])
+@limite_cuerpo(SUBIDA_MAX_BYTES_TOTAL)
 @admin_required
 def upload_image():
     """Endpoint protegido para subir una imagen a Cloudinary."""
     if 'file' not in request.files:
         return jsonify({"success": False, "error": "No se encontró el archivo"}), 400
     try:
-        upload_result = cloudinary.uploader.upload(request.files['file'])
-        return jsonify({"success": True, "image_url": upload_result.get('secure_url')})
+        with metricas.medir_upstream('cloudinary', 'uploader.upload'):
+            upload_result = cloudinary.uploader.upload(request.files['file'])
+        secure_url = upload_result.get('secure_url')
+        return jsonify({"success": True, "image_url": secure_url, "variantes": calcular_variantes(secure_url)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -232,26 +806,88 @@ def agregar_imagenes_a_producto(producto_id):
     if not urls or not isinstance(urls, list):
         return jsonify({"success": False, "error": "Se requiere una lista de URLs de imágenes."}), 400
     try:
-        imagenes_data = [{'ProductoID': producto_id, 'URL': url} for url in urls]
+        imagenes_data = [fila_imagen(producto_id, url) for url in urls]
         supabase.table('ImagenesProducto').insert(imagenes_data).execute()
+        cache_catalogo.invalidar()
         return jsonify({"success": True, "message": "Imágenes agregadas con éxito."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/productos/<int:producto_id>/imagenes/lote', methods=['POST'])
+@limite_cuerpo(SUBIDA_MAX_BYTES_TOTAL)
+@admin_required
+def subir_imagenes_a_producto(producto_id):
+    """
+    Endpoint protegido que recibe varias imágenes (campo multipart 'files'),
+    las sube a Cloudinary en paralelo y las asocia al producto con un solo
+    insert. Devuelve el resultado de cada archivo.
+    """
+    archivos = request.files.getlist('files')
+    if not archivos:
+        return jsonify({"success": False, "error": "No se encontraron archivos."}), 400
+    if len(archivos) > MAX_ARCHIVOS_POR_LOTE:
+        return jsonify({"success": False, "error": f"Se admiten hasta {MAX_ARCHIVOS_POR_LOTE} archivos por lote."}), 400
+
+    try:
+        existe = supabase.table('Productos').select('ProductoID').eq('ProductoID', producto_id).execute()
+        if not existe.data:
+            return jsonify({"success": False, "error": "Producto no encontrado"}), 404
+
+        resultados = subidor_imagenes.subir(archivos)
+        subidas = [r for r in resultados if r["success"]]
+        imagenes = []
+        if subidas:
+            try:
+                imagenes = supabase.table('ImagenesProducto').insert(
+                    [fila_imagen(producto_id, r["url"]) for r in subidas]
+                ).execute().data
+            except Exception:
+                # Sin filas que las referencien, las imágenes subidas quedarían huérfanas.
+                limpieza_cloudinary.programar([r["public_id"] for r in subidas])
+                raise
+            cache_catalogo.invalidar()
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    for r in resultados:
+        r.pop("public_id", None)
+    return jsonify({
+        "success": len(subidas) == len(resultados),
+        "resultados": resultados,
+        "imagenes": [{"id": img['ImagenID'], "url": img['URL'], "variantes": variantes_de_fila(img)} for img in imagenes]
+    })
+
+@app.errorhandler(413)
+def peticion_demasiado_grande(e):
+    limite_mb = (request.max_content_length or 0) // (1024 * 1024)
+    return jsonify({"success": False, "error": f"La petición supera el máximo de {limite_mb} MB."}), 413
+
+@app.route('/api/imagenes/barrido', methods=['POST'])
+@admin_required
+def barrer_imagenes_huerfanas():
+    """
+    Endpoint protegido que compara Cloudinary con ImagenesProducto.
+    Con {"aplicar": true} encola los huérfanos para borrarlos; si no, solo los lista.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        huerfanos = limpieza_cloudinary.barrer(aplicar=bool(data.get('aplicar')))
+        return jsonify({"success": True, "huerfanos": huerfanos, "pendientes": limpieza_cloudinary.pendientes()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/imagenes/<int:imagen_id>', methods=['DELETE'])
 @admin_required
 def eliminar_imagen(imagen_id):
     """Endpoint protegido para eliminar una imagen específica por su ID."""
     try:
-        response_img = supabase.table('ImagenesProducto').select('URL').eq('ImagenID', imagen_id).single().execute()
+        # El DELETE devuelve la fila borrada, así que no hace falta leerla antes.
+        response_img = supabase.table('ImagenesProducto').delete().eq('ImagenID', imagen_id).execute()
         if not response_img.data:
             return jsonify({"success": False, "error": "Imagen no encontrada."}), 404
-        
-        public_id = extraer_public_id_de_url(response_img.data['URL'])
-        if public_id:
-            cloudinary.uploader.destroy(public_id)
 
-        supabase.table('ImagenesProducto').delete().eq('ImagenID', imagen_id).execute()
+        limpieza_cloudinary.programar([extraer_public_id_de_url(response_img.data[0]['URL'])])
+        cache_catalogo.invalidar()
         return jsonify({"success": True, "message": "Imagen eliminada con éxito."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -260,6 +896,7 @@ def eliminar_imagen(imagen_id):
 # --- RUTAS DE AUTENTICACIÓN ---
 
 @app.route('/api/register', methods=['POST'])
+@limitado('registro')
 def registrar_usuario():
     """Endpoint público para el registro de nuevos usuarios."""
     data = request.get_json()
@@ -276,6 +913,7 @@ def registrar_usuario():
         return jsonify({"success": False, "error": str(e)}), 409
 
 @app.route('/login', methods=['POST'])
+@limitado('login')
 def login():
     """Endpoint público para el inicio de sesión."""
     data = request.form if request.form else request.get_json()
@@ -283,6 +921,8 @@ def login():
     try:
         res = supabase.auth.sign_in_with_password({"email": email, "password": password})
         user_profile = supabase.table('profiles').select('nombre, role').eq('id', res.user.id).single().execute()
+        # Refrescamos la caché con el rol recién leído (por si cambió desde la última vez).
+        cache_roles.guardar(res.user.id, user_profile.data.get('role', 'cliente'))
         return jsonify({
             "success": True,
             "access_token": res.session.access_token,
@@ -301,64 +941,161 @@ def logout():
     """Endpoint para invalidar un token en el servidor."""
     # El frontend es responsable de eliminar el token del localStorage.
     # Esta ruta es opcional pero recomendada para invalidar el token en Supabase.
+    auth_header = request.headers.get('Authorization') or ''
+    if auth_header.startswith('Bearer '):
+        try:
+            # El próximo login vuelve a leer el rol de 'profiles'.
+            cache_roles.invalidar(_identificar_usuario(auth_header.split(" ")[1])['id'])
+        except Exception:
+            pass  # Token ya vencido o inválido: no hay nada que olvidar
     return jsonify({"success": True, "message": "Sesión cerrada en el frontend."})
 
 @app.route('/api/me')
 @admin_required # Re-usamos el decorador para validar el token
 def get_current_user_profile():
     """Endpoint protegido para obtener el perfil del usuario actual basado en su token."""
-    # El decorador ya validó el token y el rol de admin, aquí solo devolvemos los datos.
+    # El decorador ya validó el token y el rol de admin y dejó la identidad en g.usuario.
     # Esta ruta puede ser expandida para devolver datos del usuario al propio usuario (no solo al admin).
-    auth_header = request.headers.get('Authorization')
-    jwt_token = auth_header.split(" ")[1]
-    user_res = supabase.auth.get_user(jwt_token)
-    profile_res = supabase.table('profiles').select('*').eq('id', user_res.user.id).single().execute()
+    profile_res = supabase.table('profiles').select('*').eq('id', g.usuario['id']).single().execute()
+    # Acabamos de leer el perfil completo: el rol cacheado queda al día.
+    if profile_res.data and profile_res.data.get('role'):
+        cache_roles.guardar(g.usuario['id'], profile_res.data['role'])
+    else:
+        cache_roles.invalidar(g.usuario['id'])
     return jsonify({"success": True, "user": profile_res.data})
 
 
-# --- OTRAS RUTAS DE LA API ---
+# --- CHECKOUT ---
+
+# Con CHECKOUT_PREVALIDAR=1 los carritos imposibles según la caché del
+# catálogo se rechazan sin llamar a la base, pero solo si la foto tiene menos
+# de CHECKOUT_PREVALIDAR_FRESCURA segundos: una reposición hecha desde otro
+# worker no se ve hasta la próxima recarga. Con una foto más vieja decide la RPC.
+CHECKOUT_PREVALIDAR = os.getenv("CHECKOUT_PREVALIDAR", "1") == "1"
+CHECKOUT_PREVALIDAR_FRESCURA = float(os.getenv("CHECKOUT_PREVALIDAR_FRESCURA", "5"))
+# Función SQL por lotes (ver sql/actualizar_stock_venta_lote.sql). Vacía
+# desactiva el agrupamiento; si no existe en la base, se vuelve a una
+# llamada por carrito.
+CHECKOUT_RPC_LOTE = os.getenv("CHECKOUT_RPC_LOTE", "actualizar_stock_venta_lote")
+
+def _confirmar_carrito(carrito):
+    """Descuenta el stock de un carrito con la función de PostgreSQL. Devuelve (ok, mensaje)."""
+    result = supabase.rpc('actualizar_stock_venta', {'items_json': carrito}).execute()
+    if 'Error' in result.data:
+        return False, result.data
+    return True, result.data
+
+def _confirmar_carritos(carritos):
+    """Descuenta el stock de varios carritos con una sola llamada. Devuelve [(ok, mensaje)]."""
+    try:
+        result = supabase.rpc(CHECKOUT_RPC_LOTE, {'carritos_json': carritos}).execute()
+    except Exception as e:
+        if 'PGRST202' in str(e):  # PostgREST no encuentra la función
+            print(f"La función {CHECKOUT_RPC_LOTE} no existe; se confirma carrito por carrito.")
+            raise FuncionLoteNoDisponible() from e
+        raise
+    return [(r['ok'], r['mensaje']) for r in result.data]
+
+agrupador_checkout = AgrupadorCheckout(
+    _confirmar_carritos, _confirmar_carrito,
+    ventana=float(os.getenv("CHECKOUT_VENTANA_MS", "5")) / 1000
+) if CHECKOUT_RPC_LOTE else None
+
+idempotencia = RegistroIdempotencia(
+    os.getenv("IDEMPOTENCIA_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "idempotencia.db"))
+)
+
+def _procesar_checkout(carrito):
+    """Devuelve (respuesta, código, definitiva). Solo las respuestas definitivas se recuerdan por clave."""
+    if CHECKOUT_PREVALIDAR:
+        entrada = cache_catalogo.vigente(max_edad=CHECKOUT_PREVALIDAR_FRESCURA)
+        # Sin una foto reciente solo se valida el formato; el stock lo decide la base.
+        error = validar_carrito(carrito, entrada.productos if entrada is not None else [])
+        if error:
+            return {"success": False, "error": error}, 400, False
+
+    try:
+        if agrupador_checkout is not None and agrupador_checkout.activo:
+            ok, mensaje = agrupador_checkout.confirmar(carrito)
+        else:
+            ok, mensaje = _confirmar_carrito(carrito)
+    except Exception as e:
+        return {"success": False, "error": f"Error en la base de datos: {e}"}, 500, False
+
+    if not ok:
+        return {"success": False, "error": mensaje}, 400, True
+    cache_catalogo.invalidar()
+    return {"success": True, "message": "Stock actualizado correctamente."}, 200, True
 
 @app.route("/api/actualizar-stock", methods=["POST"])
+@limitado('checkout')
 def actualizar_stock_ruta():
-    """Endpoint que usa una función de base de datos para actualizar el stock de forma segura."""
-    carrito = request.get_json()
+    """
+    Endpoint que usa una función de base de datos para actualizar el stock de forma segura.
+    Con el header 'Idempotency-Key', un reintento del mismo pedido devuelve la
+    respuesta original en lugar de descontar el stock dos veces. Reusar la
+    clave con otro carrito devuelve 422.
+    """
+    carrito = request.get_json(silent=True)
     if not carrito:
         return jsonify({"success": False, "error": "No se recibió el carrito."}), 400
-    try:
-        # Llamamos a la función de PostgreSQL que creamos
-        result = supabase.rpc('actualizar_stock_venta', {'items_json': carrito}).execute()
-        
-        if 'Error' in result.data:
-            return jsonify({"success": False, "error": result.data}), 400
-        
-        return jsonify({"success": True, "message": "Stock actualizado correctamente."})
-    except Exception as e:
-        return jsonify({"success": False, "error": f"Error en la base de datos: {e}"}), 500
+
+    clave = request.headers.get('Idempotency-Key')
+    if clave:
+        if len(clave) > 200:
+            return jsonify({"success": False, "error": "Idempotency-Key demasiado larga."}), 400
+        estado, guardada = idempotencia.reservar(clave, hashlib.sha256(request.get_data()).hexdigest())
+        if estado == 'distinta':
+            return jsonify({"success": False, "error": "La Idempotency-Key ya se usó con otro carrito."}), 422
+        if estado == 'completa':
+            respuesta, codigo = guardada
+            return jsonify(respuesta), codigo
+        if estado == 'en_curso':
+            return jsonify({"success": False, "error": "Este pedido ya se está procesando."}), 409
+
+    respuesta, codigo, definitiva = _procesar_checkout(carrito)
+    if clave:
+        if definitiva:
+            idempotencia.guardar(clave, respuesta, codigo)
+        else:
+            idempotencia.liberar(clave)
+    return jsonify(respuesta), codigo
+
+@app.route("/api/stream/stock", methods=["GET"])
+def stream_stock():
+    """
+    Server-Sent Events con los cambios de stock y precio. Solo en modo asgi
+    (asgi.py atiende la ruta antes de llegar a Flask); acá 204 le indica a
+    EventSource que no se reconecte, y js/common.js pasa a consultar el stock
+    periódicamente.
+    """
+    return '', 204
+
+# --- OTRAS RUTAS DE LA API ---
 
 @app.route("/contacto", methods=["POST"])
+@limitado('contacto')
 def contacto():
-    """Endpoint para el formulario de contacto (sin cambios)."""
+    """Endpoint para el formulario de contacto. El correo se envía en segundo plano."""
     data = request.get_json()
     nombre, email, mensaje = data.get("nombre", ""), data.get("email", ""), data.get("mensaje", "")
     if not all([nombre, email, mensaje]):
         return jsonify({"success": False, "error": "Todos los campos son obligatorios."}), 400
     
     body = f"Nombre: {nombre}\nEmail: {email}\nMensaje: {mensaje}"
-    msg = MIMEText(body, "plain", "utf-8")
-    msg["Subject"] = Header("Nuevo mensaje de contacto", "utf-8")
-    msg["From"] = formataddr((Header("Formulario Web", "utf-8").encode(), EMAIL_FROM))
-    msg["To"] = EMAIL_TO
-
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_FROM, EMAIL_PASS)
-            server.sendmail(EMAIL_FROM, [EMAIL_TO], msg.as_string())
-        return jsonify({"success": True})
+        outbox.encolar("Nuevo mensaje de contacto", body, [EMAIL_TO], nombre_remitente="Formulario Web")
+        return jsonify({"success": True}), 202
     except Exception as e:
-        print(f"Error al enviar correo: {e}")
+        print(f"Error al encolar correo: {e}")
         return jsonify({"success": False, "error": "No se pudo enviar el correo"}), 500
 
+@app.route("/api/outbox/estado", methods=["GET"])
+@admin_required
+def estado_outbox():
+    """Endpoint protegido con la profundidad de la cola de correos y latencias de envío."""
+    return jsonify({"success": True, "outbox": outbox.estadisticas()})
+
 
 # --- EJECUCIÓN DE LA APLICACIÓN (PARA DESARROLLO LOCAL) ---
 if __name__ == "__main__":
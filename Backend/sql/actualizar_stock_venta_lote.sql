@@ -0,0 +1,32 @@
+-- Confirma varios carritos en una sola llamada (usada por /api/actualizar-stock
+-- para agrupar checkouts concurrentes). Cada carrito corre en su propio bloque
+-- con EXCEPTION, así el rechazo de uno no deshace a los demás.
+-- Devuelve un arreglo con un {"ok", "mensaje"} por carrito, en el mismo orden.
+--
+-- Si actualizar_stock_venta recibe `json` en lugar de `jsonb`, cambiar la
+-- llamada por actualizar_stock_venta(carrito::json).
+
+CREATE OR REPLACE FUNCTION actualizar_stock_venta_lote(carritos_json jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    carrito jsonb;
+    resultado text;
+    resultados jsonb := '[]'::jsonb;
+BEGIN
+    FOR carrito IN SELECT value FROM jsonb_array_elements(carritos_json) LOOP
+        BEGIN
+            resultado := actualizar_stock_venta(carrito);
+            IF resultado LIKE '%Error%' THEN
+                -- Deshace lo que la función haya alcanzado a descontar.
+                RAISE EXCEPTION USING MESSAGE = resultado;
+            END IF;
+            resultados := resultados || jsonb_build_array(jsonb_build_object('ok', true, 'mensaje', resultado));
+        EXCEPTION WHEN OTHERS THEN
+            resultados := resultados || jsonb_build_array(jsonb_build_object('ok', false, 'mensaje', SQLERRM));
+        END;
+    END LOOP;
+    RETURN resultados;
+END;
+$$;
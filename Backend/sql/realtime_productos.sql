@@ -0,0 +1,8 @@
+-- Publica los cambios de Productos por Supabase Realtime, para el stock en
+-- vivo de /api/stream/stock con STOCK_REALTIME=1 (ver eventos_stock.py).
+-- Los DELETE traen solo la clave primaria, que es lo único que se usa.
+
+ALTER PUBLICATION supabase_realtime ADD TABLE "Productos";
+
+-- Si la tabla tiene RLS, la clave del servidor necesita poder leerla para recibir los cambios:
+-- CREATE POLICY "lectura publica de productos" ON "Productos" FOR SELECT USING (true);
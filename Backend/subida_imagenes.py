@@ -0,0 +1,79 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudinary.uploader
+
+from metricas import medir_upstream
+
+SUBIDAS_CONCURRENTES = 4
+MAX_BYTES_POR_ARCHIVO = 10 * 1024 * 1024
+MAX_ARCHIVOS_POR_LOTE = 20
+
+
+def tamano_de(archivo):
+    """Tamaño en bytes de un FileStorage, midiendo su stream sin leerlo entero."""
+    stream = archivo.stream
+    posicion = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    tamano = stream.tell()
+    stream.seek(posicion)
+    return tamano
+
+
+def _subir(stream):
+    with medir_upstream('cloudinary', 'uploader.upload'):
+        return cloudinary.uploader.upload(stream)
+
+
+class SubidorImagenes:
+    """
+    Sube lotes de imágenes a Cloudinary en paralelo.
+
+    El pool es compartido por todas las peticiones del proceso, así que
+    `concurrencia` acota el total de subidas simultáneas del worker y no
+    solo las de un lote. Werkzeug ya vuelca a disco temporal los archivos
+    grandes del multipart; aquí solo se pasan esos streams a Cloudinary,
+    sin cargarlos en memoria.
+    """
+
+    def __init__(self, concurrencia=SUBIDAS_CONCURRENTES, max_bytes=MAX_BYTES_POR_ARCHIVO):
+        self._pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="subida-imagenes")
+        self.max_bytes = max_bytes
+
+    def subir(self, archivos):
+        """
+        Sube una lista de FileStorage y devuelve un resultado por archivo, en
+        el mismo orden: {'archivo', 'success', 'url', 'public_id'} o
+        {'archivo', 'success': False, 'error'}.
+        """
+        resultados = []
+        futuros = []
+        for archivo in archivos:
+            resultado = {"archivo": archivo.filename}
+            resultados.append(resultado)
+            if not archivo.filename:
+                resultado.update(success=False, error="Archivo sin nombre.")
+                continue
+            tamano = tamano_de(archivo)
+            if tamano == 0:
+                resultado.update(success=False, error="El archivo está vacío.")
+                continue
+            if tamano > self.max_bytes:
+                resultado.update(success=False, error=f"Supera el máximo de {self.max_bytes / (1024 * 1024):g} MB por archivo.")
+                continue
+            archivo.stream.seek(0)
+            # Copiamos el contexto para que la subida cuente en el desglose del pedido.
+            futuros.append((resultado, self._pool.submit(contextvars.copy_context().run, _subir, archivo.stream)))
+
+        for resultado, futuro in futuros:
+            try:
+                respuesta = futuro.result()
+            except Exception as e:
+                resultado.update(success=False, error=str(e))
+                continue
+            if respuesta.get('secure_url'):
+                resultado.update(success=True, url=respuesta['secure_url'], public_id=respuesta.get('public_id'))
+            else:
+                resultado.update(success=False, error="Cloudinary no devolvió una URL.")
+        return resultados
@@ -0,0 +1,92 @@
+import threading
+
+from cache_catalogo import CacheCatalogo
+
+
+def _producto(producto_id, stock):
+    return {"id": producto_id, "nombre": f"Cuchillo {producto_id}", "descripcion": "", "precio": 100.0,
+            "stock": stock, "categoria": "cuchillos", "imagenes": [], "variantes": []}
+
+
+def test_reutiliza_la_entrada_vigente():
+    llamadas = []
+    cache = CacheCatalogo(lambda: llamadas.append(1) or [_producto(1, 5)], ttl=60)
+    assert cache.obtener() is cache.obtener()
+    assert len(llamadas) == 1
+
+
+def test_invalidar_fuerza_la_recarga_y_avisa():
+    stock = {"valor": 5}
+    avisos = []
+    cache = CacheCatalogo(lambda: [_producto(1, stock["valor"])], al_invalidar=lambda: avisos.append(1))
+    assert cache.obtener().productos[0]["stock"] == 5
+    stock["valor"] = 2
+    cache.invalidar()
+    assert avisos == [1]
+    assert cache.vigente() is None
+    assert cache.obtener().productos[0]["stock"] == 2
+
+
+def test_invalidacion_durante_la_carga_no_guarda_ni_publica_lo_viejo():
+    cargados = []
+    lecturas = iter([5, 2])
+
+    def cargador():
+        stock = next(lecturas)
+        if stock == 5:
+            cache.invalidar()  # una escritura termina mientras se leía
+        return [_producto(1, stock)]
+
+    cache = CacheCatalogo(cargador, al_cargar=cargados.append)
+    entrada = cache.obtener()
+    assert entrada.productos[0]["stock"] == 2
+    assert cache.vigente() is entrada
+    assert [p[0]["stock"] for p in cargados] == [2]
+
+
+def test_invalidaciones_continuas_no_guardan_nada():
+    cargados = []
+
+    def cargador():
+        cache.invalidar()
+        return [_producto(1, 1)]
+
+    cache = CacheCatalogo(cargador, al_cargar=cargados.append)
+    assert cache.obtener().productos[0]["stock"] == 1
+    assert cache.vigente() is None
+    assert cargados == []
+
+
+def test_si_el_origen_falla_sirve_la_ultima_copia():
+    fallar = {"valor": False}
+
+    def cargador():
+        if fallar["valor"]:
+            raise RuntimeError("PostgREST caído")
+        return [_producto(1, 3)]
+
+    cache = CacheCatalogo(cargador, ttl=0)
+    primera = cache.obtener()
+    fallar["valor"] = True
+    assert cache.obtener() is primera
+
+
+def test_una_sola_carga_con_lectores_concurrentes():
+    llamadas = []
+    liberar = threading.Event()
+
+    def cargador():
+        llamadas.append(1)
+        liberar.wait(1)
+        return [_producto(1, 3)]
+
+    cache = CacheCatalogo(cargador)
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(cache.obtener())) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+    assert len(llamadas) == 1
+    assert len({id(r) for r in resultados}) == 1
@@ -0,0 +1,151 @@
+import io
+
+from carga_masiva import ErrorDeLectura, ImportadorProductos, leer_csv, leer_ndjson
+
+
+class _Respuesta:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Consulta:
+    def __init__(self, base, tabla):
+        self._base = base
+        self._tabla = tabla
+        self._operacion = None
+        self._filtro = None
+        self._filas = None
+
+    def select(self, columnas):
+        self._operacion = 'select'
+        return self
+
+    def in_(self, columna, valores):
+        self._filtro = (columna, set(valores))
+        return self
+
+    def update(self, valores):
+        self._operacion, self._valores = 'update', valores
+        return self
+
+    def insert(self, filas):
+        self._operacion, self._filas = 'insert', filas
+        return self
+
+    def execute(self):
+        tabla = self._base.tablas[self._tabla]
+        if self._operacion == 'update':
+            columna, valores = self._filtro
+            self._filas = [{**self._valores, 'ProductoID': f['ProductoID']} for f in tabla if f[columna] in valores]
+        self._base.sentencias.append((self._tabla, self._operacion, len(self._filas or [])))
+        falla = self._base.fallar.get((self._tabla, self._operacion))
+        if falla is not None and falla(self._filas or []):
+            raise RuntimeError(f"{self._operacion} rechazado")
+        if self._operacion == 'select':
+            columna, valores = self._filtro
+            return _Respuesta([dict(fila) for fila in tabla if fila[columna] in valores])
+        if self._operacion == 'update':
+            self._base.actualizaciones.append(self._valores)
+            for fila in self._filas:
+                next(f for f in tabla if f['ProductoID'] == fila['ProductoID']).update(self._valores)
+            return _Respuesta(self._filas)
+        creadas = []
+        for fila in self._filas:
+            if self._tabla == 'Productos':
+                fila = {**fila, 'ProductoID': max([f['ProductoID'] for f in tabla] or [0]) + 1}
+            tabla.append(fila)
+            creadas.append(fila)
+        return _Respuesta(creadas)
+
+
+class _SupabaseFalso:
+    def __init__(self, productos=()):
+        self.tablas = {
+            'Productos': [{'ProductoID': i, 'Nombre': f"P{i}", 'Descripcion': '', 'Precio': 10, 'Stock': 1,
+                           'Categoria': 'cuchillos'} for i in productos],
+            'ImagenesProducto': [],
+        }
+        self.fallar = {}
+        self.sentencias = []
+        self.actualizaciones = []
+
+    def table(self, nombre):
+        return _Consulta(self, nombre)
+
+
+def _errores(resumen):
+    return [(error["fila"], error["error"]) for error in resumen["errores"]]
+
+
+def test_id_inexistente_se_informa_una_sola_vez_aunque_el_update_se_reintente():
+    supabase = _SupabaseFalso(productos=[1, 2])
+    # El update del lote falla; de a una fila, solo falla la del producto 2.
+    supabase.fallar[('Productos', 'update')] = lambda filas: any(f['ProductoID'] == 2 for f in filas)
+    filas = [(1, {"id": 1, "stock": 5}), (2, {"id": 2, "stock": 5}), (3, {"id": 99, "stock": 7})]
+
+    resumen = ImportadorProductos(supabase).importar(filas)
+
+    assert sorted(_errores(resumen)) == [(2, "update rechazado"), (3, "No existe un producto con id 99.")]
+    assert resumen["actualizadas"] == 1
+    assert supabase.tablas['Productos'][0]['Stock'] == 5
+
+
+def test_id_inexistente_sin_otras_filas():
+    supabase = _SupabaseFalso(productos=[1])
+    resumen = ImportadorProductos(supabase).importar([(1, {"id": 7, "precio": 3})])
+    assert _errores(resumen) == [(1, "No existe un producto con id 7.")]
+    assert not supabase.actualizaciones
+
+
+def test_actualiza_solo_las_columnas_que_trae_la_fila():
+    supabase = _SupabaseFalso(productos=[1, 2, 3])
+    filas = [(1, {"id": 1, "precio": 20}), (2, {"id": 2, "precio": 20}), (3, {"id": 3, "nombre": "Nueva"}),
+             (4, {"id": 3, "categoria": "navajas"})]
+
+    resumen = ImportadorProductos(supabase).importar(filas)
+
+    # El Stock nunca se reescribe: una compra concurrente no se pierde.
+    assert sorted(supabase.actualizaciones, key=len) == [
+        {'Precio': 20}, {'Nombre': "Nueva", 'Categoria': "navajas"}]
+    assert resumen["actualizadas"] == 3
+    assert supabase.tablas['Productos'][2]['Nombre'] == "Nueva"
+
+
+def test_filas_invalidas_no_frenan_el_resto():
+    supabase = _SupabaseFalso()
+    filas = leer_ndjson(io.BytesIO(
+        b'{"nombre": "A", "precio": 1, "stock": 1, "categoria": "cuchillos"}\n'
+        b'\xff\xfe\n'
+        b'{"nombre": "B", "precio": -1, "stock": 1, "categoria": "cuchillos"}\n'
+        b'no es json\n'
+        b'{"nombre": "C", "precio": 2, "stock": 1, "categoria": "navajas"}\n'
+    ))
+    resumen = ImportadorProductos(supabase).importar(filas)
+    assert [fila for fila, _ in _errores(resumen)] == [2, 3, 4]
+    assert resumen["creadas"] == 2
+    assert resumen["procesadas"] == 5
+
+
+def test_csv_con_bytes_invalidos_aplica_lo_leido_y_corta(monkeypatch):
+    supabase = _SupabaseFalso()
+    cuerpo = (
+        b"nombre,precio,stock,categoria\n"
+        b"A,1,1,cuchillos\n"
+        b"B,2,1,cuchillos\n"
+        b"C\xff,3,1,cuchillos\n"
+        b"D,4,1,cuchillos\n"
+    )
+    resumen = ImportadorProductos(supabase, tamano_lote=1).importar(leer_csv(io.BytesIO(cuerpo)))
+    assert [fila for fila, _ in _errores(resumen)] == [4]
+    assert resumen["creadas"] == 2
+    assert [p['Nombre'] for p in supabase.tablas['Productos']] == ['A', 'B']
+
+
+def test_csv_mal_formado_corta_sin_excepcion():
+    supabase = _SupabaseFalso()
+    cuerpo = b"nombre,precio,stock,categoria\nA,1,1,cuchillos\n" + b"x" * 200_000 + b",1,1,cuchillos\nB,2,1,cuchillos\n"
+    filas = list(leer_csv(io.BytesIO(cuerpo)))
+    assert isinstance(filas[-1][1], ErrorDeLectura)
+    resumen = ImportadorProductos(supabase).importar(filas)
+    assert _errores(resumen)[0][0] == 3
+    assert [p['Nombre'] for p in supabase.tablas['Productos']] == ['A']
@@ -0,0 +1,53 @@
+import idempotencia
+from idempotencia import RegistroIdempotencia
+
+
+def _registro(tmp_path):
+    return RegistroIdempotencia(str(tmp_path / "idempotencia.db"))
+
+
+def test_reintento_devuelve_la_respuesta_guardada(tmp_path):
+    registro = _registro(tmp_path)
+    assert registro.reservar("k", "h1") == ('nueva', None)
+    registro.guardar("k", {"success": True}, 200)
+    assert registro.reservar("k", "h1") == ('completa', ({"success": True}, 200))
+
+
+def test_clave_en_curso(tmp_path):
+    registro = _registro(tmp_path)
+    registro.reservar("k", "h1")
+    assert registro.reservar("k", "h1") == ('en_curso', None)
+
+
+def test_misma_clave_con_otro_cuerpo(tmp_path):
+    registro = _registro(tmp_path)
+    registro.reservar("k", "h1")
+    assert registro.reservar("k", "h2") == ('distinta', None)
+    registro.guardar("k", {"success": True}, 200)
+    assert registro.reservar("k", "h2") == ('distinta', None)
+    assert registro.reservar("k", "h1")[0] == 'completa'
+
+
+def test_liberar_permite_reintentar(tmp_path):
+    registro = _registro(tmp_path)
+    registro.reservar("k", "h1")
+    registro.liberar("k")
+    assert registro.reservar("k", "h2") == ('nueva', None)
+
+
+def test_reserva_abandonada_se_reemplaza(tmp_path, monkeypatch):
+    registro = _registro(tmp_path)
+    registro.reservar("k", "h1")
+    ahora = idempotencia.time.time()
+    monkeypatch.setattr(idempotencia.time, "time", lambda: ahora + idempotencia.LEASE + 1)
+    assert registro.reservar("k", "h2") == ('nueva', None)
+
+
+def test_respuesta_vencida_se_olvida(tmp_path, monkeypatch):
+    registro = _registro(tmp_path)
+    registro.reservar("k", "h1")
+    registro.guardar("k", {"success": True}, 200)
+    ahora = idempotencia.time.time()
+    monkeypatch.setattr(idempotencia.time, "time", lambda: ahora + idempotencia.VIGENCIA + 1)
+    assert registro.reservar("k", "h2") == ('nueva', None)
+
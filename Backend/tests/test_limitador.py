@@ -0,0 +1,106 @@
+import sqlite3
+
+import limitador
+from limitador import Cuota, Limitador, Rechazo, Regla
+
+
+def _limitador(tmp_path, **opciones):
+    return Limitador(str(tmp_path / "limitador.db"), **opciones)
+
+
+def test_leer_cuota():
+    assert Cuota.leer("10/60") == Cuota(10, 60.0)
+    assert Cuota.leer("5") == Cuota(5, 1.0)
+    assert Cuota.leer("") is None
+    assert Cuota.leer("0") is None
+
+
+def test_cuota_por_ip_rechaza_con_429_y_no_afecta_otras_ips(tmp_path):
+    lim = _limitador(tmp_path)
+    regla = Regla(por_ip=Cuota(2, 60))
+    for _ in range(2):
+        lim.salir(lim.entrar('login', regla, '1.1.1.1'))
+    rechazo = lim.entrar('login', regla, '1.1.1.1')
+    assert rechazo == Rechazo(429, 'cuota', 30)
+    assert isinstance(lim.entrar('login', regla, '2.2.2.2'), str)
+
+
+def test_cuota_total_de_la_ruta(tmp_path):
+    lim = _limitador(tmp_path)
+    regla = Regla(total=Cuota(3, 60))
+    for ip in ('a', 'b', 'c'):
+        lim.salir(lim.entrar('contacto', regla, ip))
+    assert lim.entrar('contacto', regla, 'd').codigo == 429
+
+
+def test_la_cuota_se_recarga(tmp_path, monkeypatch):
+    lim = _limitador(tmp_path)
+    regla = Regla(por_ip=Cuota(1, 10))
+    ahora = limitador.time.time()
+    monkeypatch.setattr(limitador.time, "time", lambda: ahora)
+    lim.salir(lim.entrar('login', regla, 'ip'))
+    assert lim.entrar('login', regla, 'ip').codigo == 429
+    monkeypatch.setattr(limitador.time, "time", lambda: ahora + 10)
+    assert isinstance(lim.entrar('login', regla, 'ip'), str)
+
+
+def test_estado_compartido_entre_instancias(tmp_path):
+    # Dos workers = dos Limitador sobre el mismo archivo.
+    uno, otro = _limitador(tmp_path), _limitador(tmp_path)
+    regla = Regla(por_ip=Cuota(1, 60))
+    uno.salir(uno.entrar('login', regla, 'ip'))
+    assert otro.entrar('login', regla, 'ip').codigo == 429
+
+
+def test_cupo_de_upstream_se_libera_al_salir(tmp_path):
+    uno = _limitador(tmp_path, cupos={'auth': 2})
+    otro = _limitador(tmp_path, cupos={'auth': 2})
+    regla = Regla(upstream='auth')
+    pases = [uno.entrar('login', regla, 'a'), otro.entrar('login', regla, 'b')]
+    assert otro.entrar('login', regla, 'c') == Rechazo(503, 'auth', 1)
+    uno.salir(pases[0])
+    otro.salir(otro.entrar('login', regla, 'c'))
+
+
+def test_cupo_abandonado_vence(tmp_path, monkeypatch):
+    lim = _limitador(tmp_path, cupos={'stock': 1})
+    regla = Regla(upstream='stock')
+    ahora = limitador.time.time()
+    monkeypatch.setattr(limitador.time, "time", lambda: ahora)
+    lim.entrar('checkout', regla, 'a')  # nunca se devuelve
+    assert lim.entrar('checkout', regla, 'b').codigo == 503
+    monkeypatch.setattr(limitador.time, "time", lambda: ahora + limitador.LEASE + 1)
+    assert isinstance(lim.entrar('checkout', regla, 'b'), str)
+
+
+def test_un_rechazo_no_se_queda_con_el_hilo(tmp_path):
+    lim = _limitador(tmp_path, max_por_proceso=1)
+    regla = Regla(por_ip=Cuota(1, 60))
+    lim.salir(lim.entrar('login', regla, 'ip'))
+    assert lim.entrar('login', regla, 'ip').codigo == 429
+    assert isinstance(lim.entrar('login', regla, 'otra'), str)
+
+
+def test_archivo_bloqueado_responde_503_y_libera_el_hilo(tmp_path):
+    lim = _limitador(tmp_path, max_por_proceso=1, espera=0.05)
+    regla = Regla(por_ip=Cuota(10, 60))
+    otro_worker = sqlite3.connect(str(tmp_path / "limitador.db"), isolation_level=None)
+    otro_worker.execute("BEGIN IMMEDIATE")
+    try:
+        assert lim.entrar('login', regla, 'ip') == Rechazo(503, 'bloqueo', 1)
+    finally:
+        otro_worker.execute("ROLLBACK")
+        otro_worker.close()
+    assert isinstance(lim.entrar('login', regla, 'ip'), str)
+
+
+def test_otros_errores_del_archivo_dejan_pasar(tmp_path, monkeypatch):
+    lim = _limitador(tmp_path, cupos={'auth': 1}, max_por_proceso=1)
+
+    def roto(*args):
+        raise sqlite3.DatabaseError("file is not a database")
+    monkeypatch.setattr(lim, "_reservar", roto)
+    pase = lim.entrar('login', Regla(upstream='auth'), 'ip')
+    assert isinstance(pase, str)
+    lim.salir(pase)  # no hay cupo registrado que borrar
+    assert isinstance(lim.entrar('login', Regla(), 'ip'), str)
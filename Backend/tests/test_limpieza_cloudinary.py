@@ -0,0 +1,66 @@
+import pytest
+
+from limpieza_cloudinary import LimpiezaCloudinary, urls_registradas_en_supabase
+
+
+class _Respuesta:
+    def __init__(self, data, count):
+        self.data = data
+        self.count = count
+
+
+class _Consulta:
+    def __init__(self, tabla):
+        self._tabla = tabla
+        self._rango = None
+
+    def select(self, columnas, count=None):
+        assert count == 'exact'
+        return self
+
+    def order(self, columna):
+        return self
+
+    def range(self, desde, hasta):
+        self._rango = (desde, hasta)
+        return self
+
+    def execute(self):
+        desde, hasta = self._rango
+        hasta = min(hasta, desde + self._tabla.max_filas - 1)  # el max-rows de PostgREST
+        filas = self._tabla.filas[desde:hasta + 1]
+        return _Respuesta(filas, self._tabla.count if self._tabla.count is not None else len(self._tabla.filas))
+
+
+class _SupabaseFalso:
+    def __init__(self, cantidad, max_filas, count=None):
+        self.filas = [{"URL": f"https://res.cloudinary.com/x/image/upload/v1/img{i}.jpg"} for i in range(cantidad)]
+        self.max_filas = max_filas
+        self.count = count
+        self.consultas = 0
+
+    def table(self, nombre):
+        assert nombre == 'ImagenesProducto'
+        self.consultas += 1
+        return _Consulta(self)
+
+
+@pytest.mark.parametrize("cantidad, max_filas", [(0, 1000), (999, 1000), (1000, 1000), (2500, 1000), (2500, 500), (7, 3)])
+def test_lee_todas_las_filas_aunque_el_servidor_devuelva_paginas_cortas(cantidad, max_filas):
+    supabase = _SupabaseFalso(cantidad, max_filas)
+    urls = urls_registradas_en_supabase(supabase, tamano_pagina=1000)
+    assert urls == [fila["URL"] for fila in supabase.filas]
+
+
+def test_falla_si_no_coincide_con_el_conteo():
+    supabase = _SupabaseFalso(10, 1000, count=12)
+    with pytest.raises(RuntimeError):
+        urls_registradas_en_supabase(supabase)
+
+
+def test_no_encola_borrados_con_una_lista_incompleta(tmp_path):
+    supabase = _SupabaseFalso(10, 1000, count=12)
+    limpieza = LimpiezaCloudinary(str(tmp_path / "limpieza.db"), lambda: urls_registradas_en_supabase(supabase))
+    with pytest.raises(RuntimeError):
+        limpieza.barrer(aplicar=True)
+    assert limpieza.pendientes()['pendiente'] == 0
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+from cola_persistente import TrabajadorCola
+from outbox import OutboxEmail
+
+
+def test_trabajador_sin_procesar_pendientes_no_se_instancia():
+    class Incompleto(TrabajadorCola):
+        pass
+
+    with pytest.raises(TypeError):
+        Incompleto()
+
+
+def test_renueva_el_reclamo_de_los_correos_que_faltan_enviar(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "outbox.db")
+    reloj = [1000.0]
+    monkeypatch.setattr("cola_persistente.time.time", lambda: reloj[0])
+    outbox = OutboxEmail(ruta, "smtp.invalid", 25, timeout=30)
+    for i in range(3):
+        outbox._cola.encolar({"asunto": "a", "cuerpo": "b", "destinatarios": [f"c{i}@x"]})
+    vencidos = []
+
+    def enviar(datos):
+        # Cada envío tarda casi todo el lease; sin renovar, los últimos correos
+        # quedarían libres para otro worker antes de mandarse.
+        with sqlite3.connect(ruta) as conn:
+            vencidos.append(conn.execute(
+                "SELECT COUNT(*) FROM outbox_email WHERE id > ? AND reclamado_hasta <= ?",
+                (len(vencidos), reloj[0])).fetchone()[0])
+        reloj[0] += outbox._lease_por_envio() - 1
+
+    monkeypatch.setattr(outbox, "_enviar", enviar)
+    assert outbox.procesar_pendientes() == 3
+    assert vencidos == [0, 0, 0]
+    assert outbox._cola.contar() == {'pendiente': 0, 'fallido': 0}
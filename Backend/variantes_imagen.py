@@ -0,0 +1,106 @@
+import os
+from functools import lru_cache
+
+# Cada variante es una transformación de Cloudinary en función del ancho.
+# f_auto entrega WebP o AVIF según lo que acepte el navegador y q_auto ajusta
+# la compresión; los anchos extra arman el srcset.
+VARIANTES = {
+    "thumb": {"transformacion": "c_fill,g_auto,ar_1:1,w_{ancho}", "ancho": 80, "srcset": ()},
+    "card": {"transformacion": "c_fill,g_auto,ar_1:1,w_{ancho}", "ancho": 400, "srcset": (200, 400, 600, 800)},
+    "full": {"transformacion": "c_limit,w_{ancho}", "ancho": 1600, "srcset": (640, 1024, 1600)},
+}
+FORMATO = "f_auto,q_auto"
+MARCADOR_UPLOAD = "/upload/"
+
+# Con VARIANTES_EN_DB=1 las variantes se guardan en ImagenesProducto.Variantes
+# (jsonb) al registrar cada imagen. La columna se crea con:
+#   ALTER TABLE "ImagenesProducto" ADD COLUMN "Variantes" jsonb;
+GUARDAR_EN_DB = os.getenv("VARIANTES_EN_DB", "0") == "1"
+
+
+def es_de_cloudinary(url):
+    return "res.cloudinary.com" in url and MARCADOR_UPLOAD in url
+
+
+def url_transformada(url, transformacion):
+    """Inserta una transformación de Cloudinary en una URL de entrega. Otras URLs quedan igual."""
+    if not es_de_cloudinary(url):
+        return url
+    base, resto = url.split(MARCADOR_UPLOAD, 1)
+    return f"{base}{MARCADOR_UPLOAD}{transformacion},{FORMATO}/{resto}"
+
+
+@lru_cache(maxsize=8192)
+def _calcular(url):
+    variantes = {}
+    srcset = {}
+    for nombre, config in VARIANTES.items():
+        variantes[nombre] = url_transformada(url, config["transformacion"].format(ancho=config["ancho"]))
+        if config["srcset"] and es_de_cloudinary(url):
+            srcset[nombre] = ", ".join(
+                f"{url_transformada(url, config['transformacion'].format(ancho=ancho))} {ancho}w"
+                for ancho in config["srcset"]
+            )
+    variantes["srcset"] = srcset
+    return variantes
+
+
+def calcular_variantes(url):
+    """
+    Devuelve {'thumb', 'card', 'full', 'srcset': {'card', 'full'}} para una URL.
+    El resultado se memoriza por URL: se arma una sola vez por proceso.
+    """
+    resultado = _calcular(url)
+    return {**resultado, "srcset": dict(resultado["srcset"])}
+
+
+def variantes_de_fila(fila):
+    """Variantes de una fila de ImagenesProducto: las guardadas si existen, si no las calculadas."""
+    return fila.get('Variantes') or calcular_variantes(fila['URL'])
+
+
+def fila_imagen(producto_id, url):
+    """Fila lista para insertar en ImagenesProducto (con sus variantes si se guardan en la DB)."""
+    fila = {'ProductoID': producto_id, 'URL': url}
+    if GUARDAR_EN_DB:
+        fila['Variantes'] = calcular_variantes(url)
+    return fila
+
+
+def completar_variantes(supabase, tamano_pagina=500, aplicar=False):
+    """
+    Backfill: recorre ImagenesProducto por ImagenID y completa la columna
+    Variantes en las filas que no la tienen. Devuelve cuántas filas (se)
+    actualizaron.
+    """
+    ultimo_id = 0
+    total = 0
+    while True:
+        filas = supabase.table('ImagenesProducto').select('ImagenID, ProductoID, URL, Variantes') \
+            .gt('ImagenID', ultimo_id).order('ImagenID').limit(tamano_pagina).execute().data
+        pendientes = [
+            {'ImagenID': fila['ImagenID'], 'ProductoID': fila['ProductoID'], 'URL': fila['URL'],
+             'Variantes': calcular_variantes(fila['URL'])}
+            for fila in filas if not fila.get('Variantes')
+        ]
+        if pendientes and aplicar:
+            supabase.table('ImagenesProducto').upsert(pendientes, on_conflict='ImagenID').execute()
+        total += len(pendientes)
+        if len(filas) < tamano_pagina:
+            return total
+        ultimo_id = filas[-1]['ImagenID']
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Completa ImagenesProducto.Variantes en las filas existentes.")
+    parser.add_argument("--aplicar", action="store_true", help="Escribe los cambios en lugar de solo contarlos.")
+    args = parser.parse_args()
+
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    cantidad = completar_variantes(supabase, aplicar=args.aplicar)
+    print(f"{cantidad} imágenes {'actualizadas' if args.aplicar else 'sin variantes guardadas'}.")
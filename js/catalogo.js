@@ -127,90 +127,180 @@ function generarEnlaceCotizador(producto) {
     return `personalizar.html?${params.toString()}`;
 }
 
-function filtrarYRenderizar() {
-    const barraBusqueda = document.getElementById("barraBusqueda");
-    const texto = (barraBusqueda.value || "").toLowerCase();
+const PRODUCTOS_POR_PAGINA = 24;
+let siguienteCursor = null;
+let consultaEnCurso = 0; // Para descartar respuestas de búsquedas ya reemplazadas
+let temporizadorBusqueda = null;
+let catalogoLocal = null; // Instantánea estática del catálogo, ordenada como sort=categoria
+
+function normalizarTexto(texto) {
+    return (texto || '').normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+}
+
+/**
+ * Carga la instantánea estática del catálogo, si hay. Sin ella las páginas
+ * se piden a la API.
+ * @returns {Promise<void>}
+ */
+function cargarCatalogoLocal() {
+    return leerCatalogoEstatico(manifest => manifest.catalogo)
+        .then(productos => {
+            const clave = p => [normalizarTexto(p.categoria), normalizarTexto(p.nombre)];
+            catalogoLocal = productos.slice().sort((a, b) => {
+                const [ca, na] = clave(a), [cb, nb] = clave(b);
+                return ca < cb ? -1 : ca > cb ? 1 : na < nb ? -1 : na > nb ? 1 : 0;
+            });
+        })
+        .catch(() => { catalogoLocal = null; });
+}
+
+/**
+ * Misma respuesta que GET /api/productos?sort=categoria&q=...&cursor=... pero
+ * resuelta sobre la instantánea estática, sin ir al servidor.
+ */
+function consultarCatalogoLocal(texto, cursor) {
+    const termino = normalizarTexto(texto);
+    const filtrados = termino
+        ? catalogoLocal.filter(p => normalizarTexto(`${p.nombre} ${p.descripcion || ''}`).includes(termino))
+        : catalogoLocal;
+    const desde = cursor || 0;
+    const hasta = desde + PRODUCTOS_POR_PAGINA;
+    return {
+        productos: filtrados.slice(desde, hasta),
+        total: filtrados.length,
+        siguiente_cursor: hasta < filtrados.length ? hasta : null
+    };
+}
+
+/**
+ * Crea la tarjeta HTML de un producto del catálogo.
+ * @param {object} prod - Producto tal como lo devuelve la API.
+ * @returns {HTMLDivElement}
+ */
+function crearTarjetaProducto(prod) {
+    const productoDiv = document.createElement('div');
+    productoDiv.className = 'producto bg-white shadow-lg rounded p-4 flex flex-col justify-between';
+    productoDiv.dataset.productoId = prod.id;
+    const botonHTML = prod.stock > 0
+        ? `<button data-nombre-producto="${prod.nombre}" class="add-to-cart-btn bg-blue-600 text-white px-3 py-2 rounded mt-4 hover:bg-blue-700 w-full">Agregar al carrito</button>`
+        : `<a href="${generarEnlaceCotizador(prod)}" class="block text-center bg-gray-500 text-white px-3 py-2 rounded mt-4 hover:bg-gray-600 w-full">Cotizá el tuyo</a>`;
+    const carruselHTML = (prod.imagenes || []).slice(0, 4).map((imgSrc, i) => `<li>${imagenResponsive(imgSrc, prod.variantes && prod.variantes[i], 'card', '(max-width: 640px) 90vw, 300px', `alt="${prod.nombre}" loading="lazy"`)}</li>`).join('');
+
+    productoDiv.innerHTML = `
+        <div>
+            <a href="producto.html?id=${prod.id}" class="cursor-pointer">
+                ${prod.stock === 0 ? '<div class="sin-stock-banner">Sin Stock</div>' : ''}
+                <div class="slider-box rounded mb-4"><ul>${carruselHTML}</ul></div>
+                <h3 class="titulo-producto text-lg font-semibold hover:text-blue-600 transition-colors">${prod.nombre}</h3>
+            </a>
+            <p class="descripcion text-sm text-gray-600 my-2">${prod.descripcion || ''}</p>
+            ${prod.stock > 0 ? `<p class="text-xl font-bold text-green-600">$${prod.precio.toLocaleString()}</p><p class="text-sm text-gray-500">Stock: ${prod.stock}</p>` : `<p class="text-xl font-bold invisible">&nbsp;</p><p class="text-sm invisible">&nbsp;</p>`}
+        </div>
+        ${botonHTML}
+    `;
+
+    const boton = productoDiv.querySelector('.add-to-cart-btn');
+    if (boton) {
+        boton.addEventListener('click', () => agregarAlCarrito(prod));
+    }
+    return productoDiv;
+}
+
+/**
+ * Agrega una página de productos al final del catálogo. Como la API los
+ * devuelve ordenados por categoría, cada producto va a la última sección
+ * o abre una nueva.
+ * @param {object[]} productos
+ */
+function renderizarPagina(productos) {
     const contenedorPrincipal = document.getElementById("catalogoCompleto");
-    const mensajeSinResultados = document.getElementById("sinResultados");
 
-    contenedorPrincipal.innerHTML = '';
-    let totalProductosMostrados = 0;
+    productos.forEach(prod => {
+        const categoria = prod.categoria || 'Sin Categoría';
+        let grid = contenedorPrincipal.lastElementChild?.dataset.categoria === categoria
+            ? contenedorPrincipal.lastElementChild.querySelector('.grid')
+            : null;
 
-    const productosFiltrados = productosDB.filter(prod => {
-        const titulo = prod.nombre.toLowerCase();
-        const descripcion = (prod.descripcion || '').toLowerCase(); // Asegurarse que descripción no sea null
-        return titulo.includes(texto) || descripcion.includes(texto);
+        if (!grid) {
+            const divCategoria = document.createElement('div');
+            divCategoria.className = 'mb-10';
+            divCategoria.dataset.categoria = categoria;
+            divCategoria.innerHTML = `<h2 class="text-2xl font-bold mb-4">${capitalizarPrimeraLetra(categoria)}</h2>`;
+            grid = document.createElement('div');
+            grid.className = 'grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4';
+            divCategoria.appendChild(grid);
+            contenedorPrincipal.appendChild(divCategoria);
+        }
+        grid.appendChild(crearTarjetaProducto(prod));
     });
+}
 
-    const productosPorCategoria = productosFiltrados.reduce((acc, prod) => {
-        const categoria = prod.categoria || 'Sin Categoría';
-        (acc[categoria] = acc[categoria] || []).push(prod);
-        return acc;
-    }, {});
-
-    for (const categoria in productosPorCategoria) {
-        totalProductosMostrados += productosPorCategoria[categoria].length;
-        const divCategoria = document.createElement('div');
-        divCategoria.className = 'mb-10';
-        divCategoria.innerHTML = `<h2 class="text-2xl font-bold mb-4">${capitalizarPrimeraLetra(categoria)}</h2>`;
-        const grid = document.createElement('div');
-        grid.className = 'grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4';
-
-        productosPorCategoria[categoria].forEach(prod => {
-            const productoDiv = document.createElement('div');
-            productoDiv.className = 'producto bg-white shadow-lg rounded p-4 flex flex-col justify-between';
-            const botonHTML = prod.stock > 0
-                ? `<button data-nombre-producto="${prod.nombre}" class="add-to-cart-btn bg-blue-600 text-white px-3 py-2 rounded mt-4 hover:bg-blue-700 w-full">Agregar al carrito</button>`
-                : `<a href="${generarEnlaceCotizador(prod)}" class="block text-center bg-gray-500 text-white px-3 py-2 rounded mt-4 hover:bg-gray-600 w-full">Cotizá el tuyo</a>`;
-            const carruselHTML = (prod.imagenes || []).slice(0, 4).map(imgSrc => `<li><img src="${imgSrc}" alt="${prod.nombre}"></li>`).join('');
-
-            productoDiv.innerHTML = `
-                <div>
-                    <a href="producto.html?id=${prod.id}" class="cursor-pointer">
-                        ${prod.stock === 0 ? '<div class="sin-stock-banner">Sin Stock</div>' : ''}
-                        <div class="slider-box rounded mb-4"><ul>${carruselHTML}</ul></div>
-                        <h3 class="titulo-producto text-lg font-semibold hover:text-blue-600 transition-colors">${prod.nombre}</h3>
-                    </a>
-                    <p class="descripcion text-sm text-gray-600 my-2">${prod.descripcion || ''}</p>
-                    ${prod.stock > 0 ? `<p class="text-xl font-bold text-green-600">$${prod.precio.toLocaleString()}</p><p class="text-sm text-gray-500">Stock: ${prod.stock}</p>` : `<p class="text-xl font-bold invisible">&nbsp;</p><p class="text-sm invisible">&nbsp;</p>`}
-                </div>
-                ${botonHTML}
-            `;
-            grid.appendChild(productoDiv);
-        });
-        divCategoria.appendChild(grid);
-        contenedorPrincipal.appendChild(divCategoria);
+/**
+ * Muestra u oculta el botón "Ver más" según si quedan páginas por cargar.
+ */
+function actualizarBotonVerMas() {
+    let boton = document.getElementById('btnVerMas');
+    if (!boton) {
+        boton = document.createElement('button');
+        boton.id = 'btnVerMas';
+        boton.className = 'block mx-auto mb-10 bg-gray-800 text-white px-6 py-2 rounded hover:bg-gray-700';
+        boton.textContent = 'Ver más';
+        boton.addEventListener('click', () => cargarPaginaCatalogo(false));
+        document.getElementById("catalogoCompleto").after(boton);
     }
+    boton.classList.toggle('hidden', siguienteCursor === null);
+}
 
-    mensajeSinResultados.classList.toggle("hidden", totalProductosMostrados > 0);
-    
-    // Volvemos a asignar los listeners a los botones del carrito
-    document.querySelectorAll('.add-to-cart-btn').forEach(button => {
-        button.addEventListener('click', () => {
-            const nombreProd = button.getAttribute('data-nombre-producto');
-            const productoAAgregar = productosDB.find(p => p.nombre === nombreProd);
-            if (productoAAgregar) {
-                agregarAlCarrito(productoAAgregar);
+/**
+ * Pide una página del catálogo filtrada por el texto de búsqueda (a la
+ * instantánea estática si está cargada, si no al servidor).
+ * @param {boolean} reiniciar - true para una búsqueda nueva, false para "Ver más".
+ */
+function cargarPaginaCatalogo(reiniciar) {
+    const texto = (document.getElementById("barraBusqueda").value || "").trim();
+    const params = new URLSearchParams({ sort: 'categoria', limit: PRODUCTOS_POR_PAGINA });
+    if (texto) params.set('q', texto);
+    if (!reiniciar && siguienteCursor !== null) params.set('cursor', siguienteCursor);
+
+    const consulta = ++consultaEnCurso;
+    const pagina = catalogoLocal
+        ? Promise.resolve(consultarCatalogoLocal(texto, reiniciar ? 0 : siguienteCursor))
+        : fetch(`${API_BASE_URL}/api/productos?${params.toString()}`).then(response => response.json());
+    return pagina
+        .then(data => {
+            if (consulta !== consultaEnCurso) return; // Llegó una búsqueda más nueva
+
+            if (reiniciar) {
+                document.getElementById("catalogoCompleto").innerHTML = '';
+                productosDB = [];
             }
+            productosDB.push(...data.productos);
+            window.productosDB = productosDB;
+            siguienteCursor = data.siguiente_cursor;
+
+            renderizarPagina(data.productos);
+            document.getElementById("sinResultados").classList.toggle("hidden", data.total > 0);
+            actualizarBotonVerMas();
         });
-    });
+}
+
+function filtrarYRenderizar() {
+    // Esperamos a que el usuario deje de escribir antes de consultar al servidor.
+    clearTimeout(temporizadorBusqueda);
+    temporizadorBusqueda = setTimeout(() => cargarPaginaCatalogo(true), 250);
 }
 
 document.addEventListener("DOMContentLoaded", () => {
     if (document.getElementById("catalogoCompleto")) {
-        fetch(`${API_BASE_URL}/api/productos`)
-            .then(response => response.json())
-            .then(productos => {
-                productosDB = productos; // Guardamos todos los productos
-                
-                const terminoGuardado = localStorage.getItem('terminoBusqueda');
-                if (terminoGuardado) {
-                    document.getElementById("barraBusqueda").value = terminoGuardado;
-                    localStorage.removeItem('terminoBusqueda'); // Limpiamos para futuras visitas
-                }
-                
-                filtrarYRenderizar(); // Renderizamos con el filtro aplicado (o sin filtro si no hay término)
-                
+        const terminoGuardado = localStorage.getItem('terminoBusqueda');
+        if (terminoGuardado) {
+            document.getElementById("barraBusqueda").value = terminoGuardado;
+            localStorage.removeItem('terminoBusqueda'); // Limpiamos para futuras visitas
+        }
+
+        cargarCatalogoLocal()
+            .then(() => cargarPaginaCatalogo(true)) // Renderizamos con el filtro aplicado (o sin filtro si no hay término)
+            .then(() => {
                 // Añadimos el listener para búsquedas en tiempo real DENTRO de la página de catálogo
                 document.getElementById("barraBusqueda").addEventListener('input', filtrarYRenderizar);
             })
@@ -218,5 +308,15 @@ document.addEventListener("DOMContentLoaded", () => {
                 console.error('Error al cargar los productos:', error);
                 document.getElementById("catalogoCompleto").innerHTML = '<p class="text-center text-red-600">No se pudieron cargar los productos.</p>';
             });
+
+        // Stock y precio en vivo (ver escucharStock en common.js): se rehacen solo las tarjetas que cambiaron.
+        document.addEventListener('stock-actualizado', evento => {
+            aplicarCambiosStock(catalogoLocal, evento.detail);
+            aplicarCambiosStock(productosDB, evento.detail).forEach(prod => {
+                const tarjeta = document.querySelector(`.producto[data-producto-id="${prod.id}"]`);
+                if (tarjeta) tarjeta.replaceWith(crearTarjetaProducto(prod));
+            });
+        });
+        escucharStock();
     }
-});
\ No newline at end of file
+});
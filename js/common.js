@@ -1,5 +1,3 @@
-let todosLosProductos = []; 
-
 // =======================================================================
 //  NUEVO: FUNCIONES AUXILIARES PARA AUTENTICACIÓN (JWT)
 // =======================================================================
@@ -46,45 +44,45 @@ function getAuthHeaders() {
     return headers;
 }
 
-/*Carga todos los productos de la API y los almacena en la variable global.*/
-function precargarProductos() {
-    fetch(`${API_BASE_URL}/api/productos`)
-        .then(res => res.json())
-        .then(data => {
-            todosLosProductos = data;
-        })
-        .catch(error => console.error("Error al precargar productos para la búsqueda:", error));
-}
+let temporizadorSugerencias = null;
+let consultaSugerencias = 0; // Para descartar respuestas de búsquedas ya reemplazadas
 
-/*Muestra las sugerencias de búsqueda basadas en el texto introducido.*/
+/*Muestra las sugerencias de búsqueda que devuelve el servidor para el texto introducido.*/
 function mostrarSugerencias() {
     const barraBusqueda = document.getElementById("barraBusqueda");
     const contenedor = document.getElementById("contenedorSugerencias");
-    const texto = barraBusqueda.value.toLowerCase().trim();
+    const texto = barraBusqueda.value.trim();
 
+    clearTimeout(temporizadorSugerencias);
     if (texto.length < 2) { // Mostramos sugerencias a partir de 2 caracteres
+        consultaSugerencias++;
         contenedor.innerHTML = '';
         contenedor.classList.add('hidden');
         return;
     }
 
-    const sugerencias = todosLosProductos.filter(prod => 
-        prod.nombre.toLowerCase().includes(texto) ||
-        prod.descripcion.toLowerCase().includes(texto)
-    ).slice(0, 5); // Limitamos a 5 sugerencias
-
-    if (sugerencias.length > 0) {
-        contenedor.innerHTML = sugerencias.map(prod => `
-            <a href="producto.html?id=${prod.id}" class="flex items-center p-2 hover:bg-gray-100 border-b">
-                <img src="${prod.imagenes[0]}" alt="${prod.nombre}" class="w-10 h-10 object-cover mr-3">
-                <span class="font-semibold sugerencia-texto">${prod.nombre}</span>
-            </a>
-        `).join('');
-        contenedor.classList.remove('hidden');
-    } else {
-        contenedor.innerHTML = '<div class="p-2 text-gray-500">No se encontraron resultados.</div>';
-        contenedor.classList.remove('hidden');
-    }
+    // Esperamos a que el usuario deje de escribir antes de consultar al servidor.
+    temporizadorSugerencias = setTimeout(() => {
+        const consulta = ++consultaSugerencias;
+        fetch(`${API_BASE_URL}/api/sugerencias?q=${encodeURIComponent(texto)}`)
+            .then(res => res.json())
+            .then(sugerencias => {
+                if (consulta !== consultaSugerencias) return; // Llegó una búsqueda más nueva
+
+                if (sugerencias.length > 0) {
+                    contenedor.innerHTML = sugerencias.map(prod => `
+                        <a href="producto.html?id=${prod.id}" class="flex items-center p-2 hover:bg-gray-100 border-b">
+                            <img src="${prod.imagen || ''}" alt="${prod.nombre}" class="w-10 h-10 object-cover mr-3">
+                            <span class="font-semibold sugerencia-texto">${prod.nombre}</span>
+                        </a>
+                    `).join('');
+                } else {
+                    contenedor.innerHTML = '<div class="p-2 text-gray-500">No se encontraron resultados.</div>';
+                }
+                contenedor.classList.remove('hidden');
+            })
+            .catch(error => console.error("Error al obtener sugerencias de búsqueda:", error));
+    }, 150);
 }
 
 
@@ -134,6 +132,56 @@ function showNotification(message, type = 'success') {
     }, 3000);
 }
 
+/**
+ * Arma un <img> con la variante pedida ('thumb', 'card' o 'full') y su srcset.
+ * Si la API no trajo variantes (p. ej. un carrito guardado antes), usa la URL original.
+ * @param {string} url - URL original de la imagen.
+ * @param {object|undefined} variantes - Variantes de la imagen devueltas por la API.
+ * @param {string} tamano - Nombre de la variante.
+ * @param {string} sizes - Atributo sizes para el srcset.
+ * @param {string} [atributos] - Atributos extra (alt, class, id...).
+ * @returns {string}
+ */
+function imagenResponsive(url, variantes, tamano, sizes, atributos = '') {
+    if (!variantes) return `<img src="${url}" ${atributos}>`;
+    const srcset = variantes.srcset && variantes.srcset[tamano];
+    return `<img src="${variantes[tamano]}"${srcset ? ` srcset="${srcset}" sizes="${sizes}"` : ''} ${atributos}>`;
+}
+
+let manifestCatalogo = null;
+
+/**
+ * Lee un archivo de la instantánea estática del catálogo (servida por el CDN).
+ * Rechaza si no hay instantánea o no incluye lo pedido; quien llama vuelve a la API.
+ * @param {function} elegir - Recibe el manifest y devuelve la ruta del archivo.
+ * @returns {Promise<any>}
+ */
+function leerCatalogoEstatico(elegir) {
+    if (!CATALOGO_ESTATICO_URL) return Promise.reject(new Error('Sin catálogo estático.'));
+    const json = respuesta => {
+        if (!respuesta.ok) throw new Error(`Catálogo estático: HTTP ${respuesta.status}`);
+        return respuesta.json();
+    };
+    // El manifest se revalida en cada visita; los archivos versionados se cachean.
+    manifestCatalogo = manifestCatalogo || fetch(`${CATALOGO_ESTATICO_URL}/manifest.json`, { cache: 'no-cache' })
+        .then(json)
+        .catch(error => { manifestCatalogo = null; throw error; });
+    return manifestCatalogo.then(manifest => {
+        const ruta = elegir(manifest);
+        if (!ruta) throw new Error('No está en el catálogo estático.');
+        return fetch(`${CATALOGO_ESTATICO_URL}/${ruta}`).then(json);
+    });
+}
+
+/**
+ * Catálogo completo: primero la instantánea estática y, si falla, la API.
+ * @returns {Promise<object[]>}
+ */
+function obtenerCatalogoCompleto() {
+    return leerCatalogoEstatico(manifest => manifest.catalogo)
+        .catch(() => fetch(`${API_BASE_URL}/api/productos`).then(response => response.json()));
+}
+
 
 // =======================================================================
 //  2. LÓGICA DEL CARRITO DE COMPRAS - SIN CAMBIOS
@@ -151,6 +199,149 @@ function cargarCarrito() {
     actualizarCarrito();
 }
 
+/**
+ * Trae precio, stock e imagen actuales de todo el carrito en una sola consulta.
+ * Quita los productos que ya no existen o se quedaron sin stock y ajusta las
+ * cantidades al stock disponible.
+ * @returns {Promise<boolean>} true si cambió algún precio o cantidad.
+ */
+function revalidarCarrito() {
+    const ids = carrito.map(item => item.id);
+    if (ids.length === 0) return Promise.resolve(false);
+    return fetch(`${API_BASE_URL}/api/productos/lote`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ids })
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (!data.success) throw new Error(data.error);
+        const actuales = new Map(data.productos.map(p => [p.id, p]));
+        let cambio = false;
+        carrito = carrito.filter(item => {
+            const actual = actuales.get(item.id);
+            if (!actual || actual.stock <= 0) {
+                cambio = true;
+                return false;
+            }
+            if (item.precio !== actual.precio || item.cantidad > actual.stock) cambio = true;
+            item.precio = actual.precio;
+            item.stock = actual.stock;
+            item.cantidad = Math.min(item.cantidad, actual.stock);
+            if (actual.imagen) {
+                item.imagenes = [actual.imagen, ...(item.imagenes || []).slice(1)];
+                item.variantes = [actual.variantes, ...(item.variantes || []).slice(1)];
+            }
+            return true;
+        });
+        actualizarCarrito();
+        return cambio;
+    });
+}
+
+let fuenteStock = null;
+let sondeoStock = null;
+let stockConocido = null; // Map id -> {stock, precio} de la última consulta
+const INTERVALO_SONDEO_STOCK = 60000;
+
+/**
+ * Aplica cambios de stock y precio (los del stream) a una lista de productos.
+ * Un producto eliminado queda sin stock.
+ * @param {object[]} productos - Se modifican en el lugar.
+ * @param {object[]} cambios - [{id, stock, precio}] o [{id, eliminado: true}].
+ * @returns {object[]} Los productos de la lista que cambiaron.
+ */
+function aplicarCambiosStock(productos, cambios) {
+    const porId = new Map(cambios.map(cambio => [cambio.id, cambio]));
+    return (productos || []).filter(prod => {
+        const cambio = porId.get(prod.id);
+        if (!cambio) return false;
+        if (cambio.eliminado) {
+            prod.stock = 0;
+        } else {
+            prod.stock = cambio.stock;
+            prod.precio = cambio.precio;
+        }
+        return true;
+    });
+}
+
+function publicarCambiosStock(cambios) {
+    if (aplicarCambiosStock(carrito, cambios).length > 0) {
+        carrito = carrito.filter(item => item.stock > 0);
+        carrito.forEach(item => { item.cantidad = Math.min(item.cantidad, item.stock); });
+        actualizarCarrito();
+    }
+    document.dispatchEvent(new CustomEvent('stock-actualizado', { detail: cambios }));
+}
+
+/**
+ * Escucha los cambios de stock y precio (GET /api/stream/stock, Server-Sent
+ * Events): actualiza el carrito y avisa a la página con el evento
+ * 'stock-actualizado' (detail: los cambios) para que actualice lo que muestra.
+ * La llaman solo las páginas que muestran stock (inicio, catálogo y producto),
+ * así el resto no mantiene una conexión abierta con el servidor.
+ * Si el servidor no ofrece el stream (en modo wsgi responde 204) o el
+ * navegador no soporta EventSource, consulta el stock cada tanto.
+ */
+function escucharStock() {
+    if (fuenteStock || sondeoStock) return;
+    if (!window.EventSource) {
+        sondearStock();
+        return;
+    }
+    fuenteStock = new EventSource(`${API_BASE_URL}/api/stream/stock`);
+    fuenteStock.addEventListener('stock', evento => publicarCambiosStock(JSON.parse(evento.data)));
+    fuenteStock.addEventListener('error', () => {
+        // Un corte de red se reintenta solo (CONNECTING); CLOSED es definitivo.
+        if (fuenteStock.readyState === EventSource.CLOSED) {
+            fuenteStock = null;
+            sondearStock();
+        }
+    });
+}
+
+/**
+ * Alternativa al stream: cada INTERVALO_SONDEO_STOCK consulta id, stock y
+ * precio del catálogo (revalidado con ETag, casi siempre un 304) y publica lo
+ * que cambió desde la consulta anterior. No consulta con la pestaña oculta.
+ */
+function sondearStock() {
+    const consultar = () => {
+        if (document.hidden) return;
+        fetch(`${API_BASE_URL}/api/productos?fields=id,stock,precio`, { cache: 'no-cache' })
+            .then(res => res.json())
+            .then(productos => {
+                if (!Array.isArray(productos)) return;
+                const actuales = new Map(productos.map(p => [p.id, p]));
+                if (stockConocido) {
+                    const cambios = [];
+                    actuales.forEach((p, id) => {
+                        const antes = stockConocido.get(id);
+                        if (!antes || antes.stock !== p.stock || antes.precio !== p.precio) {
+                            cambios.push({ id, stock: p.stock, precio: p.precio });
+                        }
+                    });
+                    stockConocido.forEach((_, id) => {
+                        if (!actuales.has(id)) cambios.push({ id, eliminado: true });
+                    });
+                    if (cambios.length > 0) publicarCambiosStock(cambios);
+                }
+                stockConocido = actuales;
+            })
+            .catch(() => {});
+    };
+    consultar();
+    sondeoStock = setInterval(consultar, INTERVALO_SONDEO_STOCK);
+}
+
+/**
+ * @returns {boolean} true si el stream de stock está conectado.
+ */
+function stockEnVivo() {
+    return fuenteStock !== null && fuenteStock.readyState === EventSource.OPEN;
+}
+
 function agregarAlCarrito(producto) {
     const itemEnCarrito = carrito.find(item => item.nombre === producto.nombre);
     if (itemEnCarrito) {
@@ -186,7 +377,7 @@ function actualizarCarrito() {
         const li = document.createElement("li");
         li.className = "flex justify-between items-center py-4 border-b border-gray-300";
         li.innerHTML = `
-            <div class="flex items-center space-x-4 w-1/2"><img src="${item.imagenes[0]}" alt="${item.nombre}" class="w-16 h-16 object-contain rounded"><span class="font-medium">${item.nombre}</span></div>
+            <div class="flex items-center space-x-4 w-1/2">${imagenResponsive(item.imagenes[0], item.variantes && item.variantes[0], 'card', '64px', `alt="${item.nombre}" class="w-16 h-16 object-contain rounded"`)}<span class="font-medium">${item.nombre}</span></div>
             <div class="flex items-center space-x-2"><button class="bg-gray-300 px-2 py-1 rounded" onclick="restarCantidad(${idx})">−</button><span class="mx-2">${item.cantidad}</span><button class="bg-gray-300 px-2 py-1 rounded" onclick="sumarCantidad(${idx})">+</button></div>
             <div class="text-right min-w-[100px]"><span class="block font-bold text-green-600">$${subtotal.toLocaleString()}</span><button class="text-red-600 text-sm mt-1" onclick="eliminarDelCarrito(${idx})">Eliminar</button></div>`;
         lista.appendChild(li);
@@ -299,9 +490,11 @@ function buscarEnCatalogo(termino) {
 
 document.addEventListener("DOMContentLoaded", () => {
     // Carga inicial del estado del header y del carrito
-    precargarProductos();
     actualizarEstadoHeader();
     cargarCarrito();
+    revalidarCarrito()
+        .then(cambio => { if (cambio) showNotification('Actualizamos los precios y el stock de tu carrito.'); })
+        .catch(error => console.error('No se pudo revalidar el carrito:', error));
 
     // --- REFACTORIZADO: LÓGICA PARA CERRAR SESIÓN ---
     const btnCerrarSesion = document.getElementById('btnCerrarSesion');
@@ -309,11 +502,12 @@ document.addEventListener("DOMContentLoaded", () => {
         btnCerrarSesion.addEventListener('click', (e) => {
             e.preventDefault();
             
+            // Avisa al backend (olvida el rol cacheado) antes de borrar el token
+            fetch(`${API_BASE_URL}/logout`, { method: 'POST', headers: getAuthHeaders(), keepalive: true })
+                .catch(() => {});
+
             // Elimina los datos de sesión del frontend
             eliminarSesion();
-            
-            // Opcional: Notificar al backend para invalidar el token si se implementa
-            // fetch(`${API_BASE_URL}/logout`, { method: 'POST', headers: getAuthHeaders() });
 
             // Recarga la página para reflejar el estado de "no logueado"
             location.reload();
@@ -414,32 +608,57 @@ document.addEventListener("DOMContentLoaded", () => {
 
     
 
-    // --- LÓGICA DE FINALIZAR COMPRA POR WHATSAPP - SIN CAMBIOS ---
+    // --- LÓGICA DE FINALIZAR COMPRA POR WHATSAPP ---
     const btnFinalizar = document.getElementById('btnFinalizarWhatsapp');
+    // Clave de idempotencia: se reutiliza mientras el carrito no cambie, así un
+    // reintento tras un error de red no descuenta el stock dos veces.
+    let claveCheckout = null;
+    let firmaCheckout = null;
     if (btnFinalizar) {
         btnFinalizar.addEventListener('click', (e) => {
             e.preventDefault();
-            if (carrito.length > 0) {
-                // Este endpoint es público y no requiere token de autenticación
-                fetch(`${API_BASE_URL}/api/actualizar-stock`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(carrito)
-                })
-                .then(res => res.json())
-                .then(data => {
-                    if (data.success) {
-                        window.open(generarEnlaceWhatsapp(), '_blank');
-                        carrito = [];
-                        actualizarCarrito();
-                        // alert("¡Pedido enviado! La página se recargará.");
-                        showNotification("¡Pedido enviado por WhatsApp! La página se recargará.");
-                        setTimeout(() => location.reload(), 2000);
-                    } else {
-                        alert(`Error: ${data.error}`);
+            if (carrito.length > 0 && !btnFinalizar.disabled) {
+                btnFinalizar.disabled = true;
+                // Antes de confirmar, precios y stock actuales (si falla, decide el servidor).
+                revalidarCarrito()
+                .catch(() => false)
+                .then(cambio => {
+                    if (cambio) {
+                        showNotification('Cambiaron precios o stock de tu carrito. Revisalo antes de confirmar.', 'error');
+                        return;
+                    }
+                    const firma = JSON.stringify(carrito.map(item => [item.id, item.cantidad]));
+                    if (firma !== firmaCheckout) {
+                        firmaCheckout = firma;
+                        claveCheckout = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
                     }
+                    // Este endpoint es público y no requiere token de autenticación
+                    return fetch(`${API_BASE_URL}/api/actualizar-stock`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': claveCheckout },
+                        body: JSON.stringify(carrito)
+                    })
+                    .then(res => res.json())
+                    .then(data => {
+                        firmaCheckout = null; // Respuesta definitiva: el próximo intento usa otra clave
+                        if (data.success) {
+                            window.open(generarEnlaceWhatsapp(), '_blank');
+                            carrito = [];
+                            actualizarCarrito();
+                            if (stockEnVivo()) {
+                                // El nuevo stock llega por el stream y cada página lo actualiza.
+                                showNotification("¡Pedido enviado por WhatsApp!");
+                            } else {
+                                showNotification("¡Pedido enviado por WhatsApp! La página se recargará.");
+                                setTimeout(() => location.reload(), 2000);
+                            }
+                        } else {
+                            alert(`Error: ${data.error}`);
+                        }
+                    })
+                    .catch(() => alert('Error de conexión al actualizar stock.'));
                 })
-                .catch(() => alert('Error de conexión al actualizar stock.'));
+                .finally(() => { btnFinalizar.disabled = false; });
             }
         });
     }
@@ -4,4 +4,9 @@ const esEntornoLocal = ['127.0.0.1', 'localhost'].includes(window.location.hostn
 // Definimos la URL del backend según el entorno
 const API_BASE_URL = esEntornoLocal 
     ? 'http://127.0.0.1:5000' // URL para desarrollo local
-    : 'https://magknives-backend.onrender.com'; 
\ No newline at end of file
+    : 'https://magknives-backend.onrender.com';
+
+// Instantánea estática del catálogo (Backend/publicar_catalogo.py). Apuntarla
+// a donde se publique (p. ej. '/catalogo') solo cuando el deploy la incluya;
+// null = leer siempre de la API.
+const CATALOGO_ESTATICO_URL = null; 
\ No newline at end of file
@@ -161,7 +161,7 @@ function renderizarDisponibles(productos) {
             ? `<button data-nombre-producto="${prod.nombre}" class="add-to-cart-btn bg-blue-600 text-white px-3 py-2 rounded mt-4 hover:bg-blue-700 w-full">Agregar al carrito</button>`
             : `<a href="${generarEnlaceCotizador(prod)}" class="block text-center bg-gray-500 text-white px-3 py-2 rounded mt-4 hover:bg-gray-600 w-full">Cotizá el tuyo</a>`;
 
-        const carruselHTML = prod.imagenes.slice(0, 4).map(imgSrc => `<li><img src="${imgSrc}" alt="${prod.nombre}"></li>`).join('');
+        const carruselHTML = prod.imagenes.slice(0, 4).map((imgSrc, i) => `<li>${imagenResponsive(imgSrc, prod.variantes && prod.variantes[i], 'card', '(max-width: 640px) 90vw, 300px', `alt="${prod.nombre}" loading="lazy"`)}</li>`).join('');
 
         // --- INICIO DEL CAMBIO ---
         productoDiv.innerHTML = `
@@ -203,8 +203,7 @@ function renderizarDisponibles(productos) {
 
 document.addEventListener("DOMContentLoaded", () => {
     if (document.getElementById("disponiblesCompleto")) {
-        fetch(`${API_BASE_URL}/api/productos`)
-            .then(response => response.json())
+        obtenerCatalogoCompleto()
             .then(productos => {
                 renderizarDisponibles(productos);
             })
@@ -212,5 +211,13 @@ document.addEventListener("DOMContentLoaded", () => {
                 console.error('Error al cargar los productos:', error);
                 document.getElementById("disponiblesCompleto").innerHTML = '<p class="text-center text-red-600">No se pudieron cargar los productos. Asegúrate de que el servidor esté funcionando.</p>';
             });
+
+        // Stock y precio en vivo (ver escucharStock en common.js)
+        document.addEventListener('stock-actualizado', evento => {
+            if (aplicarCambiosStock(window.productosDB, evento.detail).length > 0) {
+                renderizarDisponibles(window.productosDB);
+            }
+        });
+        escucharStock();
     }
 });
\ No newline at end of file
@@ -115,7 +115,7 @@ function renderizarDetalle(producto) {
     // Galería de imágenes
     const galeriaHTML = producto.imagenes.map((img, index) => `
         <div class="w-1/4 p-1">
-            <img src="${img.url}" alt="Vista ${index + 1}" class="cursor-pointer border-2 border-transparent hover:border-blue-500 rounded-lg" onclick="cambiarImagenPrincipal('${img.url}')">
+            ${imagenResponsive(img.url, img.variantes, 'card', '120px', `alt="Vista ${index + 1}" class="cursor-pointer border-2 border-transparent hover:border-blue-500 rounded-lg" onclick="cambiarImagenPrincipal(${index})"`)}
         </div>
     `).join('');
 
@@ -123,7 +123,7 @@ function renderizarDetalle(producto) {
         <div class="grid grid-cols-1 md:grid-cols-2 gap-8">
             <div>
                 <div class="mb-4">
-                    <img id="imagen-principal" src="${producto.imagenes[0]?.url || 'placeholder.jpg'}" alt="${producto.nombre}" class="w-full h-auto object-cover rounded-lg shadow-md">
+                    ${imagenResponsive(producto.imagenes[0]?.url || 'placeholder.jpg', producto.imagenes[0]?.variantes, 'full', '(max-width: 768px) 100vw, 50vw', `id="imagen-principal" alt="${producto.nombre}" class="w-full h-auto object-cover rounded-lg shadow-md"`)}
                 </div>
                 <div class="flex flex-wrap -mx-1">
                     ${galeriaHTML}
@@ -165,6 +165,7 @@ if (btnAgregar) {
 
             // Convertimos el array de objetos de imágenes a un simple array de URLs
             productoParaCarrito.imagenes = productoActual.imagenes.map(img => img.url);
+            productoParaCarrito.variantes = productoActual.imagenes.map(img => img.variantes);
 
             // Ahora sí, lo pasamos al carrito con el formato correcto
             agregarAlCarrito(productoParaCarrito);
@@ -175,10 +176,17 @@ if (btnAgregar) {
 
 /**
  * Cambia la imagen principal en la galería.
- * @param {string} nuevaSrc - La URL de la nueva imagen a mostrar.
+ * @param {number} indice - Posición de la imagen a mostrar en productoActual.imagenes.
  */
-function cambiarImagenPrincipal(nuevaSrc) {
-    document.getElementById('imagen-principal').src = nuevaSrc;
+function cambiarImagenPrincipal(indice) {
+    const imagen = productoActual.imagenes[indice];
+    const principal = document.getElementById('imagen-principal');
+    if (imagen.variantes) {
+        principal.srcset = imagen.variantes.srcset.full || '';
+        principal.src = imagen.variantes.full;
+    } else {
+        principal.src = imagen.url;
+    }
 }
 
 // --- Lógica principal al cargar la página ---
@@ -192,14 +200,14 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
     }
 
-    // 2. Hacer la petición a la API para obtener los datos del producto
-    fetch(`${API_BASE_URL}/api/productos/${productoId}`)
-        .then(response => {
+    // 2. Leer el producto de la instantánea estática o, si no está, de la API
+    leerCatalogoEstatico(manifest => manifest.productos[productoId])
+        .catch(() => fetch(`${API_BASE_URL}/api/productos/${productoId}`).then(response => {
             if (!response.ok) {
                 throw new Error('El producto no fue encontrado.');
             }
             return response.json();
-        })
+        }))
         .then(data => {
             if (data.success) {
                 renderizarDetalle(data.producto);
@@ -211,4 +219,12 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('Error:', error);
             document.getElementById('detalle-producto-contenedor').innerHTML = '<p class="text-red-500 text-center">Error: No se pudo cargar el producto.</p>';
         });
+
+    // 3. Stock y precio en vivo (ver escucharStock en common.js)
+    document.addEventListener('stock-actualizado', evento => {
+        if (productoActual && aplicarCambiosStock([productoActual], evento.detail).length > 0) {
+            renderizarDetalle(productoActual);
+        }
+    });
+    escucharStock();
 });
\ No newline at end of file